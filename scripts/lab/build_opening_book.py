@@ -0,0 +1,39 @@
+'''
+Build an opening book for the minimax agents.
+
+    python scripts/lab/build_opening_book.py --env ThreeDims --depth 3 --ply 2 --output books/three_dims_d3.npz
+
+Every position within `--ply` plies of the empty board is searched to `--depth`,
+up to symmetry. Agents use the book with the `opening_book` kwarg, and must
+search to the same depth.
+'''
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import src.environments
+from src.agents import AlphaBetaMinimaxAgent
+from src.agents.opening_book import build_opening_book
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--env", type=str, default="ThreeDims", choices=["TwoDims", "ThreeDims"])
+    parser.add_argument("--depth", type=int, required=True, help="search depth of the agents using the book")
+    parser.add_argument("--ply", type=int, default=2, help="plies from the empty board covered by the book")
+    parser.add_argument("--tt-size", type=int, default=1 << 20, help="transposition table entries used while building")
+    parser.add_argument("--output", type=str, required=True)
+    args = parser.parse_args()
+
+    env = getattr(src.environments, args.env)()
+    agent = AlphaBetaMinimaxAgent(search_depth=args.depth, tt_size=args.tt_size)
+    start = time.perf_counter()
+    book = build_opening_book(env, agent, args.ply)
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    book.save(args.output)
+    print(f"{len(book)} positions searched to depth {args.depth} in {time.perf_counter() - start:.1f}s")
+    print(f"Book saved to {args.output}")
@@ -1,5 +1,5 @@
 '''
-Linearly generate games based on two agent configs and a game config.
+Generate games based on two agent configs and a game config.
 Config of the script:
     - n       : (int)    : number of games
     - player0 : (string) : path to agent 1's config
@@ -7,6 +7,24 @@ Config of the script:
     - game    : (string) : path to the game config
     - log_dir : (string) : path to the logging directory
     - experiment_name : (string, optional) : name of the experiment.
+    - workers : (int, optional)    : number of processes generating games (default 1).
+    - seed    : (int, optional)    : base seed of the env and agents (default none).
+    - storage_profile  : (string, optional) : "raw" (default) or "compact" dtypes of the logged steps.
+    - compression      : (string, optional) : "gzip" or "lzf" chunk compression (default none).
+    - compression_opts : (int, optional)    : gzip compression level.
+    - shuffle          : (bool, optional)   : byte shuffle filter before compression (default false).
+    - async_logging    : (bool, optional)   : write episodes from a background thread (default false).
+
+Given a seed, the env and agents are seeded from it, replacing the seeds of the
+agent configs. Without one, the agents keep the seeds of their configs. The seed
+and the number of workers are stored in the experiment file with the configs
+(as "generation_config"), so that the stored configs describe the run.
+
+With more than one worker, the games are split into chunks played by worker
+processes, each with its own env and agents built from the configs. Every chunk
+gets its own seed derived from the base seed (from the seeds of the agent configs
+without one), so a run is reproducible whatever the scheduling. The episodes are
+sent back and written by the main process.
 
 Add path to config using the argument:
     --config "path/to/config"
@@ -14,54 +32,117 @@ Add path to config using the argument:
 
 import sys
 from pathlib import Path
-from tqdm import tqdm
 
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from argparse import ArgumentParser
-from typing import Any
-from src.config.factory import parse_config, build_env, build_agent
-from src.config.schemas import GenerationConfig
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+import numpy as np
+from src.config.factory import build_env, build_agent, make_env, make_agent
 from src.enums.game import RoleEnum
-from src.logging.logger import Logger
-import src.environments
+from src.simulation import play_game
 
-def generate_game(env: Any, p0: Any, p1: Any, logger: Logger) -> list:
+def seed_game(env: Any, p0: Any, p1: Any, seed_sequence: np.random.SeedSequence) -> None:
     '''
-    Simulate a game between two players.
-    Convention is p0 = X (first player), p1 = O
+    Seeds the env and both players from `seed_sequence`.
     '''
-
-    observation, _ = env.reset()
-    done, truncated = False, False
-
-    players = [p0, p1]
-    histories = [[observation], []]
-
-    while not (done or truncated):
-        current_player = env.get_current_player()
-        next_player = env.get_next_player()
-        action = players[current_player].choose_action(env, histories[current_player])
-        observation, reward, done, truncated, info = env.step(action)
-        # We add the observation about the new state to the history of the next player because moves alternate
-        histories[next_player].append(observation)
-
-        logger.log_step(env.get_board_state(), 
-                        current_player, 
-                        observation['board'], 
-                        action,
-                        reward)
-    
-    logger.end_episode()
-    env.close()
-
-    return histories
+    env_seed, p0_seed, p1_seed = seed_sequence.spawn(3)
+    env.reset(seed=int(env_seed.generate_state(1)[0]))
+    p0.rng = np.random.default_rng(p0_seed)
+    p1.rng = np.random.default_rng(p1_seed)
+
+def log_configs(logger: Any, config: Any, game_config: dict, player_configs: list[dict]) -> None:
+    logger.log_config(player_configs[0], "player0_config")
+    logger.log_config(player_configs[1], "player1_config")
+    logger.log_config(game_config, "game_config")
+    # With a seed, the random_seed of the agent configs is not used
+    logger.log_config({"seed": config.seed, "workers": config.workers}, "generation_config")
+
+def generate_games(config: Any, logger: Any, env: Any, p0: Any, p1: Any) -> list:
+    '''
+    Plays the `config.n` games in this process, seeded from `config.seed` if given.
+    '''
+    from tqdm import tqdm
+    if config.seed is not None:
+        seed_game(env, p0, p1, np.random.SeedSequence(config.seed))
+    return [play_game(env, p0, p1, logger) for _ in tqdm(range(config.n))]
 
 
+class EpisodeCollector:
+    '''
+    Stands in for the Logger in worker processes: keeps the episodes
+    in memory, in the format of Logger.log_episode, for the main process to write.
+    '''
+    def __init__(self) -> None:
+        self.episodes = []
+        self._steps = []
+        self._telemetry = []
+
+    def log_step(self, state: np.ndarray, player: int, observation: np.ndarray,
+                 action: np.ndarray, reward: float, telemetry: Optional[dict] = None) -> None:
+        # The env reuses its board array, so it is copied here
+        self._steps.append((np.array(state), player, np.array(observation), action, reward))
+        if telemetry is not None:
+            self._telemetry.append(telemetry)
+
+    def end_episode(self) -> None:
+        if not self._steps:
+            return
+        telemetry = None
+        if self._telemetry:
+            telemetry = {stat: np.array([step[stat] for step in self._telemetry]) for stat in self._telemetry[0]}
+        self.episodes.append((*(np.array(column) for column in zip(*self._steps)), telemetry))
+        self._steps = []
+        self._telemetry = []
+
+
+# Per-process env and agents, built once by the worker initializer
+_worker = {}
+
+def _init_worker(game_config: dict, player_configs: list[dict]) -> None:
+    # The configs are parsed by the main process, workers only build from them
+    _worker["env"] = make_env(game_config)
+    _worker["players"] = [make_agent(player_config) for player_config in player_configs]
+
+def _generate_chunk(seed_sequence: np.random.SeedSequence, num_games: int) -> list[tuple]:
+    env = _worker["env"]
+    p0, p1 = _worker["players"]
+    seed_game(env, p0, p1, seed_sequence)
+
+    collector = EpisodeCollector()
+    for _ in range(num_games):
+        play_game(env, p0, p1, collector)
+    return collector.episodes
+
+def generate_games_in_parallel(config: Any, logger: Any, game_config: dict, player_configs: list[dict]) -> None:
+    from tqdm import tqdm
+    # Several chunks per worker so that the load stays balanced
+    num_chunks = min(config.n, 4 * config.workers)
+    chunk_sizes = [len(chunk) for chunk in np.array_split(np.arange(config.n), num_chunks)]
+    if config.seed is not None:
+        base_seed = config.seed
+    else:
+        # The seeds of the agent configs, BaseAgent's default where there is none
+        base_seed = [player_config["kwargs"].get("random_seed", 42) for player_config in player_configs]
+    seed_sequences = np.random.SeedSequence(base_seed).spawn(num_chunks)
+
+    with ProcessPoolExecutor(max_workers=config.workers, initializer=_init_worker,
+                             initargs=(game_config, player_configs)) as executor:
+        with tqdm(total=config.n) as progress:
+            for episodes in executor.map(_generate_chunk, seed_sequences, chunk_sizes):
+                for episode in episodes:
+                    logger.log_episode(*episode)
+                progress.update(len(episodes))
 
 
 if __name__ == '__main__':
+    # Only the main process parses configs and writes the log
+    from src.config.factory import parse_config
+    from src.config.schemas import GenerationConfig
+    from src.logging.logger import Logger
+
     parser = ArgumentParser()
     parser.add_argument("--config", type=str, default="", required=True)
     args = parser.parse_args()
@@ -71,10 +152,15 @@ if __name__ == '__main__':
     player1 = build_agent(config.player1)
     game = build_env(config.game)
 
-    logger = Logger(config.log_dir, config.experiment_name)
-    logger.log_config(player0.config, "player0_config")
-    logger.log_config(player1.config, "player1_config")
-    logger.log_config(game.config, "game_config")
+    logger = Logger(config.log_dir, config.experiment_name,
+                    storage_profile=config.storage_profile, compression=config.compression,
+                    compression_opts=config.compression_opts, shuffle=config.shuffle,
+                    asynchronous=config.async_logging)
+    log_configs(logger, config, game.config, [player0.config, player1.config])
     logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
 
-    games = [generate_game(game, player0, player1, logger) for _ in tqdm(range(config.n))]
\ No newline at end of file
+    with logger:
+        if config.workers > 1:
+            generate_games_in_parallel(config, logger, game.config, [player0.config, player1.config])
+        else:
+            games = generate_games(config, logger, game, player0, player1)
@@ -1,7 +1,13 @@
+import sys
 import h5py
 from argparse import ArgumentParser
 from pathlib import Path
 
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.logging.reader import get_layout, get_telemetry_fields, num_episodes, episode_index
+
 
 if __name__ == "__main__":
 
@@ -17,17 +23,32 @@ if __name__ == "__main__":
     
         print("Experiment Name:", f.attrs['experiment_name'])
         print("Player IDs:", f.attrs['player_ids'])
+        print("Layout:", get_layout(f))
         print("\nConfigs:")
         for config_name, config_json in f['configs'].attrs.items():
             print(f"  {config_name}: {config_json}")
 
-        print("\nEpisodes:")
-        for episode_key in f['episodes'].keys():
-            episode_group = f['episodes'][episode_key]
-            print(f"\nContents of {episode_key}:")
-            for dataset_key in episode_group.keys():
-                data = episode_group[dataset_key][:]
-                print(f"  {dataset_key}: shape {data.shape}, dtype {data.dtype}")
-            print("  Attributes:")
-            for attr_key, attr_value in episode_group.attrs.items():
-                print(f"    {attr_key}: {attr_value}")
+        if get_layout(f) == 'columnar':
+            print("\nSteps:")
+            for dataset_key, dataset in f['steps'].items():
+                if isinstance(dataset, h5py.Dataset):
+                    print(f"  {dataset_key}: shape {dataset.shape}, dtype {dataset.dtype}, chunks {dataset.chunks}")
+            for field in get_telemetry_fields(f):
+                values = f['steps'][field][:]
+                print(f"  {field}: mean {values.mean():.4g}, max {values.max():.4g}")
+
+            _, lengths = episode_index(f)
+            print(f"\nEpisodes: {num_episodes(f)}")
+            if len(lengths) > 0:
+                print(f"  Steps per episode: min {lengths.min()}, mean {lengths.mean():.2f}, max {lengths.max()}")
+        else:
+            print("\nEpisodes:")
+            for episode_key in f['episodes'].keys():
+                episode_group = f['episodes'][episode_key]
+                print(f"\nContents of {episode_key}:")
+                for dataset_key in episode_group.keys():
+                    data = episode_group[dataset_key][:]
+                    print(f"  {dataset_key}: shape {data.shape}, dtype {data.dtype}")
+                print("  Attributes:")
+                for attr_key, attr_value in episode_group.attrs.items():
+                    print(f"    {attr_key}: {attr_value}")
@@ -0,0 +1,43 @@
+'''
+Run the performance benchmarks and save the results as JSON.
+
+    python scripts/lab/run_benchmarks.py --output benchmarks.json [--quick] [--filter env.]
+
+Compare against a saved baseline, exiting with status 1 on regressions:
+
+    python scripts/lab/run_benchmarks.py --output current.json --baseline baseline.json --tolerance 0.2
+'''
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.benchmark import run_benchmarks, compare_results, save_results, load_results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--output", type=str, default="benchmarks.json")
+    parser.add_argument("--baseline", type=str, default=None, help="results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads")
+    parser.add_argument("--filter", type=str, default=None, help="only run benchmark groups containing this")
+    args = parser.parse_args()
+
+    results = run_benchmarks(quick=args.quick, pattern=args.filter)
+    save_results(results, args.output)
+    for name, record in results["results"].items():
+        print(f"{name:<70} {record['value']:>14.4g} {record['unit']}")
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline is not None:
+        regressions = compare_results(results, load_results(args.baseline), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression['name']}: {regression['baseline']:.4g} -> {regression['current']:.4g} "
+                      f"{regression['unit']} ({regression['slowdown']:.2f}x slower)")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
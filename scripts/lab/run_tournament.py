@@ -0,0 +1,59 @@
+'''
+Play a round-robin tournament between agents and rate them.
+Config of the script:
+    - agents  : (list)   : paths to the agents' configs, named after their file
+    - game    : (string) : path to the game config
+    - results : (string) : path to the results store (JSON lines)
+    - games_per_pairing : (int, optional)   : games of each pair of agents with each colour assignment (default 10).
+    - workers : (int, optional)    : number of processes playing matches (default 1).
+    - seed    : (int, optional)    : base seed of the matches (default 42).
+    - num_bootstrap : (int, optional)   : resampled tournaments for the confidence intervals (default 200).
+    - confidence    : (float, optional) : level of the confidence intervals (default 0.95).
+
+Matches already in the results store are not played again, so adding an agent
+to the config and running the script again only plays the games of that agent.
+
+Add path to config using the argument:
+    --config "path/to/config"
+'''
+
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from argparse import ArgumentParser
+from src.tournament import run_tournament, tournament_ratings
+
+
+if __name__ == '__main__':
+    from tqdm import tqdm
+    from src.config.factory import parse_config
+    from src.config.schemas import AgentConfig, GameConfig, TournamentConfig
+
+    parser = ArgumentParser()
+    parser.add_argument("--config", type=str, default="", required=True)
+    args = parser.parse_args()
+
+    config = parse_config(path=args.config, config_schema=TournamentConfig)
+    agents = {}
+    for path in config.agents:
+        name = Path(path).stem
+        if name in agents:
+            raise ValueError(f"Agents are named after their config file, {name} appears twice")
+        agents[name] = dict(parse_config(path, AgentConfig))
+    game_config = dict(parse_config(config.game, GameConfig))
+
+    num_matches = len(agents) * (len(agents) - 1)
+    with tqdm(desc="games played") as progress:
+        played = run_tournament(agents, game_config, config.results, config.games_per_pairing,
+                                config.workers, config.seed, callback=lambda records: progress.update(len(records)))
+    print(f"{played} of {num_matches} matches played, {num_matches - played} found in {config.results}")
+
+    ratings = tournament_ratings(agents, game_config, config.results, config.games_per_pairing, config.seed,
+                                 num_bootstrap=config.num_bootstrap, confidence=config.confidence)
+    print(f"\n{'agent':<30} {'elo':>8} {'ci':>19} {'games':>7} {'score':>7}")
+    for rating in ratings:
+        print(f"{rating['agent']:<30} {rating['elo']:>8.1f} [{rating['ci_low']:>7.1f}, {rating['ci_high']:>7.1f}] "
+              f"{rating['games']:>7} {rating['score']:>7.3f}")
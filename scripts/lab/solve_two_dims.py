@@ -0,0 +1,27 @@
+'''
+Solve TwoDims exactly and save the solution table used by PerfectAgent.
+
+    python scripts/lab/solve_two_dims.py --output tables/two_dims.npy
+'''
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from src.agents.solver import UNREACHABLE, save_table, solve
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--output", type=str, default="tables/two_dims.npy")
+    args = parser.parse_args()
+
+    table = solve()
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    save_table(table, args.output)
+    print(f"Reachable boards: {np.sum(table[0] != UNREACHABLE)}")
+    print(f"Value of the empty board for X: {table[0, 0]}, best first move: cell {table[1, 0]}")
+    print(f"Table saved to {args.output}")
@@ -5,12 +5,27 @@ each having a unified interface to interact with the environment.
 List of Agents:
     1. Random Agent
     2. Minimax Agent
-    3. PPO Agent (?)
-    4. AC Agent (?)
-    5. ...
+    3. Perfect Agent (TwoDims, solution table lookup)
+    4. MCTS Agent
+    5. PPO Agent (?)
+    6. AC Agent (?)
+    7. ...
+
+The agent classes are imported from their modules on first access.
 '''
-from .random import RandomAgent
-from .minimax import MinimaxAgent
-from .alphabeta import AlphaBetaMinimaxAgent
+from importlib import import_module
+
+_AGENT_MODULES = {
+    'RandomAgent': '.random',
+    'MinimaxAgent': '.minimax',
+    'AlphaBetaMinimaxAgent': '.alphabeta',
+    'PerfectAgent': '.perfect',
+    'MCTSAgent': '.mcts'
+}
+
+def __getattr__(name: str) -> type:
+    if name in _AGENT_MODULES:
+        return getattr(import_module(_AGENT_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__} has no attribute {name}")
 
-__all__ = ['RandomAgent', 'MinimaxAgent', 'AlphaBetaMinimaxAgent']
\ No newline at end of file
+__all__ = list(_AGENT_MODULES)
\ No newline at end of file
@@ -2,25 +2,102 @@
 Minimax Agent with Alpha-Beta Pruning
 '''
 
-from typing import Any
+import time
+from pathlib import Path
+from typing import Any, Optional
 import numpy as np
+from src.enums.game import BoardEnum
 from .minimax import MinimaxAgent
+from .transposition import EXACT, LOWER, UPPER
+
+
+class SearchBudgetExceeded(Exception):
+    '''
+    Raised inside the search when the time or node budget of a move runs out.
+    '''
+    pass
 
 
 class AlphaBetaMinimaxAgent(MinimaxAgent):
-    def __init__(self, search_depth: int, epsilon: float = 0, random_seed: int = 42) -> None:
-        super().__init__(random_seed=random_seed, search_depth=search_depth, epsilon=epsilon)
+    def __init__(self, search_depth: int, epsilon: float = 0, random_seed: int = 42,
+                 tt_size: int = 0, tt_policy: str = "depth", tt_symmetry: bool = False,
+                 iterative_deepening: bool = False, move_ordering: bool = False,
+                 time_budget: Optional[float] = None, node_budget: Optional[int] = None,
+                 workers: int = 0, share_alpha: bool = True,
+                 opening_book: Optional[str | Path] = None, batch_leaves: bool = False,
+                 endgame_threshold: Optional[int] = None, endgame_cache_size: int = 1 << 20) -> None:
+        '''
+        With `iterative_deepening`, the root is searched to depth 1, 2, ..., search_depth,
+        each iteration trying the previous best move first, until `time_budget`
+        (seconds per move) or `node_budget` (nodes per move) runs out.
+        The move of the last completed iteration is played.
+
+        With `move_ordering` (implied by iterative deepening), moves are tried in order
+        of the points they score immediately, then of the points they deny the opponent.
+
+        With `workers` > 1 the root moves are split across worker processes.
+        With `share_alpha`, workers prune with the best root value found by any
+        of them so far. Among equally good moves, the one played may then differ
+        from the serial search, whose choice is reproduced with `share_alpha` off.
+
+        `batch_leaves` is described in MinimaxAgent. The values of the leaves
+        are then all computed, but cutoffs are counted as without it.
+
+        Positions in the `opening_book` are played as by the fixed-depth search
+        (the first of equally good moves in row-major order).
 
-        self.nodes_searched = 0
+        With an `endgame_threshold`, positions with at most that many empty squares
+        are solved exactly to the end of the game instead of being evaluated at the
+        depth limit, wherever they occur in the search. Their values are kept in a
+        cache of up to `endgame_cache_size` positions, which is cleared when full.
+        Values of endgame positions do not depend on the depth, so the cache is kept
+        across moves and games.
+        '''
+        super().__init__(random_seed=random_seed, search_depth=search_depth, epsilon=epsilon,
+                         tt_size=tt_size, tt_policy=tt_policy, tt_symmetry=tt_symmetry,
+                         workers=workers, opening_book=opening_book, batch_leaves=batch_leaves)
+        if iterative_deepening and workers > 1:
+            raise ValueError("iterative_deepening does not support parallel workers")
+        if (time_budget is not None or node_budget is not None) and not iterative_deepening:
+            raise ValueError("time_budget and node_budget require iterative_deepening")
+        if time_budget is not None and time_budget <= 0:
+            raise ValueError(f"time_budget must be > 0, got {time_budget}")
+        if node_budget is not None and node_budget < 1:
+            raise ValueError(f"node_budget must be >= 1, got {node_budget}")
+        if endgame_threshold is not None and endgame_threshold < 1:
+            raise ValueError(f"endgame_threshold must be >= 1, got {endgame_threshold}")
+        if endgame_cache_size < 1:
+            raise ValueError(f"endgame_cache_size must be >= 1, got {endgame_cache_size}")
+
+        self.share_alpha = share_alpha
+        self.iterative_deepening = iterative_deepening
+        self.move_ordering = move_ordering or iterative_deepening
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.endgame_threshold = endgame_threshold
+        self.endgame_cache_size = endgame_cache_size
+        # Exact values of endgame positions: (board, player to move) -> (value, flag)
+        self._endgame_cache = {}
+        self.endgame_nodes = 0
+        self.endgame_cache_hits = 0
+
+        self._deadline = None
+        self._node_limit = None
+
+        self.completed_depth = 0
 
-    def choose_action(self, env: Any, history: list[dict]) -> np.ndarray:
+    def _reset_counters(self) -> None:
+        super()._reset_counters()
+        self.endgame_nodes = 0
+        self.endgame_cache_hits = 0
+
+    def _choose_action(self, env: Any, history: list[dict]) -> np.ndarray:
         '''
         With probability epsilon:
             - choose a random action
         and probability (1 - epsilon):
             - choose the action that leads to the state with the greatest *minimax value*
         '''
-        self.nodes_searched = 0
         observation = history[-1]
         dim_indices = list(np.nonzero(observation["action_mask"])) # [rows, columns] in 2D, generalises for higher dimensions
         num_valid_actions = len(dim_indices[0])
@@ -28,62 +105,215 @@ class AlphaBetaMinimaxAgent(MinimaxAgent):
             action_idx = self.rng.integers(0, num_valid_actions, size=1)
             action = np.array([dim_indices[dim][action_idx] for dim in range(len(dim_indices))]).reshape(-1)
             return action
+        book_action = self._book_action(env, observation)
+        if book_action is not None:
+            # The book holds the moves of a fixed-depth search, without the endgame solver
+            self.solved_exactly = num_valid_actions <= self.search_depth
+            return book_action
+        elif self.iterative_deepening:
+            actions = np.stack(dim_indices).T # (num_valid_actions, num_dimensions)
+            return self._iterative_deepening(env, observation, actions)
         else:
             actions = np.stack(dim_indices).T # (num_valid_actions, num_dimensions)
             root_current_player = observation["current_player"]
             root_next_player = observation["next_player"]
 
-            next_players_observations = np.apply_along_axis(lambda a: env.simulate_step(observation["board"], root_current_player, a)[0], axis=1, arr=actions)
-            minimax_values = []
-            alpha, beta = -np.inf, np.inf
-            for o in next_players_observations:
-                # The next player will want to minimise the minimax value..
-                mm_value = self.get_minimax_value(env, o, current_player=root_next_player, next_player=root_current_player, current_role='min', next_role='max', depth=1, alpha=alpha, beta=beta)
-                minimax_values.append(mm_value)
-                # Update alpha based on what we know to be the best option for MAX so far
-                if mm_value > alpha:
-                    alpha = mm_value
-                
-            minimax_values = np.array(minimax_values)
+            if self.workers > 1:
+                results = self._search_root_actions_in_parallel(env, observation["board"], root_current_player, root_next_player, actions)
+            else:
+                results = self._search_root_actions(env, observation["board"], root_current_player, root_next_player, actions)
 
             # And we take the action that leads to the maximum of these.
-            action_idx = np.argmax(minimax_values) # (1)
+            action_idx = self._select_root_action(results) # (1)
             action = actions[action_idx]
+            self.completed_depth = self.search_depth
+            self.solved_exactly = self._searched_to_the_end(num_valid_actions, self.search_depth)
             return action
-        
+
+    def _search_root_actions(self, env: Any, board: np.ndarray, root_current_player: int, root_next_player: int,
+                             actions: np.ndarray, shared_alpha: Optional[Any] = None) -> list[tuple[float, bool]]:
+        '''
+        Value of each root action, along with whether it is exact or only
+        an upper bound (when it does not exceed the alpha it was searched with).
+        In a worker process, `shared_alpha` holds the best root value found
+        by all workers so far.
+        '''
+        board = self._start_search(env, board)
+        score_difference = env.get_score(board, root_current_player) - env.get_score(board, root_next_player)
+        share = shared_alpha is not None and self.share_alpha
+        results = []
+        alpha, beta = -np.inf, np.inf
+        for a in actions:
+            if share:
+                alpha = max(alpha, shared_alpha.value)
+            gain = self._make_move(env, board, root_current_player, a)
+            # The next player will want to minimise the minimax value..
+            mm_value = self.get_minimax_value(env, board, current_player=root_next_player, next_player=root_current_player, current_role='min', next_role='max', depth=1, alpha=alpha, beta=beta,
+                                              score_difference=score_difference + gain)
+            self._unmake_move(env, board, root_current_player, a)
+            results.append((mm_value, mm_value > alpha))
+            # Update alpha based on what we know to be the best option for MAX so far
+            if mm_value > alpha:
+                alpha = mm_value
+                if share:
+                    with shared_alpha.get_lock():
+                        if mm_value > shared_alpha.value:
+                            shared_alpha.value = mm_value
+        return results
+
+    def _iterative_deepening(self, env: Any, observation: dict, actions: np.ndarray) -> np.ndarray:
+        '''
+        Searches the root with increasing depth limits. Depth 1 is always
+        completed, deeper iterations are abandoned as soon as the budget runs out.
+        '''
+        root_current_player = observation["current_player"]
+        root_next_player = observation["next_player"]
+        start = time.perf_counter()
+        self.completed_depth = 0
+
+        board = self._start_search(env, observation["board"])
+        order = self._order_actions(env, board, root_current_player, root_next_player, actions)
+        best_idx = order[0]
+        try:
+            for depth_limit in range(1, self.search_depth + 1):
+                if depth_limit > 1:
+                    # Budgets only apply once a move is known
+                    if self.time_budget is not None:
+                        self._deadline = start + self.time_budget
+                    if self.node_budget is not None:
+                        self._node_limit = self.node_budget
+                self._depth_limit = depth_limit
+                best_idx = self._search_root(env, board, root_current_player, root_next_player, actions, order)
+                self.completed_depth = depth_limit
+
+                # Try the best move of this iteration first in the next one
+                order = np.concatenate(([best_idx], order[order != best_idx]))
+                if self._searched_to_the_end(len(actions), depth_limit):
+                    break # The whole remaining game tree has been searched
+        except SearchBudgetExceeded:
+            pass
+        finally:
+            self._depth_limit = self.search_depth
+            self._deadline = None
+            self._node_limit = None
+        self.solved_exactly = self._searched_to_the_end(len(actions), self.completed_depth)
+        return actions[best_idx]
+
+    def _searched_to_the_end(self, num_empty: int, depth_limit: int) -> bool:
+        '''
+        Whether a search of the root with `num_empty` empty squares to `depth_limit`
+        reaches the end of the game on every line, the endgame solver taking
+        over at the depth limit at the latest.
+        '''
+        if self.endgame_threshold is not None:
+            depth_limit += self.endgame_threshold
+        return num_empty <= depth_limit
+
+    def _search_root(self, env: Any, board: np.ndarray, root_current_player: int, root_next_player: int,
+                     actions: np.ndarray, order: np.ndarray) -> int:
+        '''
+        Searches the root children in `order`, returns the index of the best action.
+        '''
+        alpha, beta = -np.inf, np.inf
+        best_idx = order[0]
+        score_difference = env.get_score(board, root_current_player) - env.get_score(board, root_next_player)
+        for action_idx in order:
+            gain = self._make_move(env, board, root_current_player, actions[action_idx])
+            mm_value = self.get_minimax_value(env, board, current_player=root_next_player, next_player=root_current_player, current_role='min', next_role='max', depth=1, alpha=alpha, beta=beta,
+                                              score_difference=score_difference + gain)
+            self._unmake_move(env, board, root_current_player, actions[action_idx])
+            # Values not exceeding alpha are only upper bounds, so only a strict improvement changes the move
+            if mm_value > alpha:
+                alpha = mm_value
+                best_idx = action_idx
+        return best_idx
+
+    def _order_actions(self, env: Any, board: np.ndarray, player: int, opponent: int, actions: np.ndarray) -> np.ndarray:
+        '''
+        Indices sorting `actions` by the points they score for `player`,
+        then by the points they would deny `opponent`. Ties keep their order.
+        '''
+        cells = np.ravel_multi_index(tuple(actions.T), board.shape)
+        gains = env.get_move_gains(board, player)[cells]
+        denied = env.get_move_gains(board, opponent)[cells]
+        return np.lexsort((-denied, -gains))
+
+    def _check_budget(self) -> None:
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SearchBudgetExceeded()
+        if self._node_limit is not None and self.nodes_searched > self._node_limit:
+            raise SearchBudgetExceeded()
+
     def get_minimax_value(self, env: Any, 
-                          observation: dict, 
+                          board: np.ndarray, 
                           current_player: int, next_player: int, 
                           current_role: str, next_role: str, 
                           depth: int,
-                          alpha: float, beta: float) -> float:
+                          alpha: float, beta: float,
+                          score_difference: Optional[float] = None) -> float:
         
         '''
         Identical to MinimaxAgent.get_minimax_value but with alpha-beta pruning.
         alpha and beta represent the best already explored option for MAX and MIN respectively.
-        They are updated during the search and passed down the tree.
+        They are updated during the search and passed down the tree,
+        as is `score_difference`.
         '''
 
         self.nodes_searched += 1
-        if depth == self.search_depth or env.terminal_state(observation["board"]):
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self._check_budget()
+        if score_difference is None:
+            score_difference = self._root_score_difference(env, board, current_player, next_player, current_role)
+        if self._in_endgame(board):
+            return self._endgame_value(env, board, current_player, next_player, current_role, alpha, beta, score_difference)
+        if depth == self._depth_limit or env.terminal_state(board):
             root_current_player = current_player if current_role == 'max' else next_player
             root_next_player = current_player if current_role == 'min' else next_player
-            leaf_value = self.evaluate_leaf(env, observation, root_current_player, root_next_player)
+            leaf_value = self.evaluate_leaf(env, self._leaf_observation(board, current_player, next_player, score_difference),
+                                            root_current_player, root_next_player)
             return leaf_value
         else:
-            dim_indices = list(np.nonzero(observation["action_mask"])) # [rows, columns] in 2D, generalises for higher dimensions
-            actions = np.stack(dim_indices).T # (num_valid_actions, num_dimensions)
+            key = None
+            if self.transposition_table is not None:
+                key = self._position_key(env, board, current_player, current_role, depth)
+                entry = self._probe(key)
+                if entry is not None:
+                    tt_value, flag = entry
+                    if flag == EXACT:
+                        return tt_value
+                    elif flag == LOWER:
+                        alpha = max(alpha, tt_value)
+                    elif flag == UPPER:
+                        beta = min(beta, tt_value)
+                    if alpha >= beta:
+                        return tt_value
+            # Window the values of this node are searched with, bounds are relative to it
+            window_alpha, window_beta = alpha, beta
+
+            actions = np.argwhere(env.get_action_mask(board)) # (num_valid_actions, num_dimensions)
+            if self.move_ordering:
+                actions = actions[self._order_actions(env, board, current_player, next_player, actions)]
+            leaf_values = None
+            if self.batch_leaves and depth + 1 == self._depth_limit and not self._children_in_endgame(actions):
+                # The children are leaves, they are evaluated together and then visited in order as usual
+                leaf_values = self._leaf_child_values(env, board, current_player, next_player, current_role, actions, depth)
             minimax_values = []
-            for a in actions:
-                new_observation = env.simulate_step(observation["board"], current_player, a)[0]
-                # We directly update alpha and beta here so that information is "passed upwards" on the search tree
-                mm_value = self.get_minimax_value(
-                                                env, new_observation, 
-                                                current_player=next_player, next_player=current_player, 
-                                                current_role=next_role, next_role=current_role,
-                                                depth=depth + 1,
-                                                alpha=alpha, beta=beta
-                                            )
+            for i, a in enumerate(actions):
+                if leaf_values is not None:
+                    mm_value = leaf_values[i]
+                else:
+                    gain = self._make_move(env, board, current_player, a)
+                    # We directly update alpha and beta here so that information is "passed upwards" on the search tree
+                    mm_value = self.get_minimax_value(
+                                                    env, board, 
+                                                    current_player=next_player, next_player=current_player, 
+                                                    current_role=next_role, next_role=current_role,
+                                                    depth=depth + 1,
+                                                    alpha=alpha, beta=beta,
+                                                    score_difference=score_difference + (gain if current_role == 'max' else -gain)
+                                                )
+                    self._unmake_move(env, board, current_player, a)
                 minimax_values.append(mm_value)
 
                 if current_role == 'max': # you can only touch alpha
@@ -95,11 +325,107 @@ class AlphaBetaMinimaxAgent(MinimaxAgent):
 
                 # Prune the node if we know it is never going to be reached
                 if alpha >= beta:
+                    self.cutoffs += 1
                     break
 
             if current_role == 'max':
                 value = np.max(minimax_values)
-                return value
             elif current_role == 'min':
                 value = np.min(minimax_values)
-                return value
\ No newline at end of file
+
+            if key is not None:
+                if value <= window_alpha:
+                    flag = UPPER
+                elif value >= window_beta:
+                    flag = LOWER
+                else:
+                    flag = EXACT
+                self.transposition_table.store(key, value, flag, self._depth_limit - depth)
+            return value
+
+    def _in_endgame(self, board: np.ndarray) -> bool:
+        if self.endgame_threshold is None:
+            return False
+        num_empty = np.count_nonzero(board == BoardEnum.EMPTY.value)
+        return 0 < num_empty <= self.endgame_threshold
+
+    def _children_in_endgame(self, actions: np.ndarray) -> bool:
+        '''
+        Whether the children of a node with the empty squares `actions` are endgame positions.
+        '''
+        if self.endgame_threshold is None:
+            return False
+        return 0 < len(actions) - 1 <= self.endgame_threshold
+
+    def _endgame_value(self, env: Any, board: np.ndarray, current_player: int, next_player: int,
+                       current_role: str, alpha: float, beta: float, score_difference: float) -> float:
+        '''
+        Exact minimax value of an endgame position: the current score difference
+        of the root player plus the difference they secure until the end of the game.
+        The alpha-beta window is translated to the solver's, so that values outside
+        of it are bounds on the same side. `score_difference` is the current one,
+        as passed down by get_minimax_value.
+        '''
+        if current_role == 'max':
+            return score_difference + self._solve_endgame(env, board, current_player, next_player,
+                                                          alpha - score_difference, beta - score_difference)
+        else:
+            return score_difference - self._solve_endgame(env, board, current_player, next_player,
+                                                          score_difference - beta, score_difference - alpha)
+
+    def _solve_endgame(self, env: Any, board: np.ndarray, player: int, opponent: int,
+                       alpha: float, beta: float) -> float:
+        '''
+        Negamax value of `board` for `player`, to move: the score difference
+        (own points - opponent's points) they can still secure until the board is full.
+        Values not above alpha are upper bounds, values not below beta lower bounds.
+        '''
+        self.nodes_searched += 1
+        self.endgame_nodes += 1
+        self._check_budget()
+        actions = np.argwhere(board == BoardEnum.EMPTY.value)
+        if len(actions) == 0:
+            return 0
+
+        key = (board.astype(np.int8).tobytes(), player)
+        entry = self._endgame_cache.get(key)
+        if entry is not None:
+            self.endgame_cache_hits += 1
+            cached_value, flag = entry
+            if flag == EXACT:
+                return cached_value
+            elif flag == LOWER:
+                alpha = max(alpha, cached_value)
+            elif flag == UPPER:
+                beta = min(beta, cached_value)
+            if alpha >= beta:
+                return cached_value
+        window_alpha, window_beta = alpha, beta
+
+        # Scoring moves first, they are the most likely to be best
+        cells = np.ravel_multi_index(tuple(actions.T), board.shape)
+        actions = actions[np.argsort(-env.get_move_gains(board, player)[cells], kind='stable')]
+        value = -np.inf
+        for a in actions:
+            gain = self._make_move(env, board, player, a)
+            # The move is worth its gain minus the value of the board for the opponent
+            move_value = gain - self._solve_endgame(env, board, opponent, player, gain - beta, gain - alpha)
+            self._unmake_move(env, board, player, a)
+            if move_value > value:
+                value = move_value
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                self.cutoffs += 1
+                break
+
+        if value <= window_alpha:
+            flag = UPPER
+        elif value >= window_beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if len(self._endgame_cache) >= self.endgame_cache_size:
+            self._endgame_cache.clear()
+        self._endgame_cache[key] = (value, flag)
+        return value
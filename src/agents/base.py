@@ -3,11 +3,31 @@ Base parent class for each agent.
 '''
 import numpy as np
 
+# Statistics agents report about their last move, see BaseAgent.get_move_stats
+MOVE_STATS = ["wall_time", "nodes_searched", "max_depth", "cutoffs", "cache_hits", "solved_exactly"]
+
 class BaseAgent:
     def __init__(self, random_seed: int = 42) -> None:
         self.random_seed = random_seed
         self.rng = np.random.default_rng(random_seed)
         self.config = None
+        # Statistics of the last move, set by choose_action
+        self.move_stats = {}
 
     def set_config(self, config: dict) -> None:
-        self.config = config
\ No newline at end of file
+        self.config = config
+
+    def get_move_stats(self) -> dict:
+        '''
+        Telemetry of the last call to choose_action: wall time (seconds),
+        nodes searched, maximum search depth reached, cutoffs, cache hits and
+        whether the move was provably optimal (1) or not (0).
+        Statistics an agent does not record are 0.
+        '''
+        return {name: self.move_stats.get(name, 0) for name in MOVE_STATS}
+
+    def close(self) -> None:
+        '''
+        Releases what the agent holds besides memory, e.g. worker processes.
+        '''
+        pass
@@ -0,0 +1,315 @@
+'''
+Agent implementing Monte Carlo Tree Search (UCT) with batched random rollouts.
+
+The search tree is stored in preallocated numpy arrays (see SearchTree), the
+children of a node occupying a contiguous block. Each simulation descends the
+tree by the UCB1 rule, expands the leaf it reaches and plays a batch of random
+games from the new node at once. The subtree under the moves actually played
+is kept for the next move.
+'''
+import time
+from typing import Any, Optional
+import numpy as np
+from .base import BaseAgent
+from src.enums.game import BoardEnum
+
+# Outcomes of a game for a player
+WIN, DRAW, LOSS = 1.0, 0.5, 0.0
+
+
+class SearchTree:
+    '''
+    Array-backed search tree of at most `max_nodes` nodes, node 0 being the root.
+
+        visits[n]       : number of rollouts played through node n
+        value_sum[n]    : sum of their outcomes for the player who moved into n
+        cell[n]         : flat index of the square of that move (-1 for the root)
+        first_child[n]  : index of the first child of n, -1 if n is not expanded
+        num_children[n] : number of children of n, stored at
+                          first_child[n], ..., first_child[n] + num_children[n] - 1
+    '''
+    def __init__(self, max_nodes: int) -> None:
+        if max_nodes < 1:
+            raise ValueError(f"max_nodes must be >= 1, got {max_nodes}")
+        self.max_nodes = max_nodes
+        self.visits = np.zeros(max_nodes, dtype=np.int64)
+        self.value_sum = np.zeros(max_nodes, dtype=np.float64)
+        self.cell = np.full(max_nodes, -1, dtype=np.int64)
+        self.first_child = np.full(max_nodes, -1, dtype=np.int64)
+        self.num_children = np.zeros(max_nodes, dtype=np.int64)
+        self.clear()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def clear(self) -> None:
+        '''
+        Leaves the tree with a single, unvisited root.
+        '''
+        self.size = 1
+        self.visits[0] = 0
+        self.value_sum[0] = 0
+        self.cell[0] = -1
+        self.first_child[0] = -1
+        self.num_children[0] = 0
+
+    def expand(self, node: int, cells: np.ndarray) -> bool:
+        '''
+        Adds a child of `node` for each of `cells`.
+        Returns False, leaving the tree unchanged, if there is no room left.
+        '''
+        first, num_cells = self.size, len(cells)
+        if first + num_cells > self.max_nodes:
+            return False
+        children = slice(first, first + num_cells)
+        self.visits[children] = 0
+        self.value_sum[children] = 0
+        self.cell[children] = cells
+        self.first_child[children] = -1
+        self.num_children[children] = 0
+        self.first_child[node] = first
+        self.num_children[node] = num_cells
+        self.size += num_cells
+        return True
+
+    def find_child(self, node: int, cell: int) -> Optional[int]:
+        if self.first_child[node] < 0:
+            return None
+        children = np.arange(self.first_child[node], self.first_child[node] + self.num_children[node])
+        matches = children[self.cell[children] == cell]
+        return int(matches[0]) if len(matches) else None
+
+    def compact(self, root: int) -> None:
+        '''
+        Keeps only the subtree of `root`, which becomes node 0. Nodes are
+        renumbered breadth first, one level of the tree at a time.
+        '''
+        old = np.array([root])
+        new = np.array([0])
+        order = [old] # old index of each new node, level by level
+        size = 1
+        first_child = np.full(self.max_nodes, -1, dtype=np.int64)
+        num_children = np.zeros(self.max_nodes, dtype=np.int64)
+        while len(old):
+            expanded = self.first_child[old] >= 0
+            old, new = old[expanded], new[expanded]
+            counts = self.num_children[old]
+            total = int(counts.sum())
+            # New blocks of children follow each other in the order of their parents
+            first_child[new] = size + np.cumsum(counts) - counts
+            num_children[new] = counts
+            children_new = np.arange(size, size + total)
+            children_old = children_new + np.repeat(self.first_child[old] - first_child[new], counts)
+            order.append(children_old)
+            old, new = children_old, children_new
+            size += total
+
+        order = np.concatenate(order)
+        self.visits[:size] = self.visits[order]
+        self.value_sum[:size] = self.value_sum[order]
+        self.cell[:size] = self.cell[order]
+        self.first_child[:size] = first_child[:size]
+        self.num_children[:size] = num_children[:size]
+        self.cell[0] = -1
+        self.size = size
+
+
+class MCTSAgent(BaseAgent):
+    def __init__(self, num_simulations: int = 1000, exploration: float = 1.4, rollout_batch: int = 8,
+                 time_budget: Optional[float] = None, max_nodes: int = 1 << 18, reuse_tree: bool = True,
+                 epsilon: float = 0, random_seed: int = 42) -> None:
+        '''
+        Every move runs `num_simulations` simulations, or as many as fit in
+        `time_budget` seconds if one is given (at least one). Each simulation
+        plays `rollout_batch` random games from the node it expands, as a
+        single batch of numpy operations.
+
+        Nodes are valued by the outcome of the rollouts (win 1, draw 1/2, loss 0)
+        and selected by UCB1 with the `exploration` constant. The tree holds up
+        to `max_nodes` nodes, beyond which leaves are no longer expanded.
+        When it cannot even hold the moves of the root, a random move is played.
+        With `reuse_tree`, the subtree of the position after the moves
+        played since the last search is kept as the new tree.
+
+        The move played is the most visited one, the first in row-major
+        order among equally visited moves. The move statistics report
+        the simulations run as `nodes_searched`, the depth of the deepest
+        node reached as `max_depth` and the nodes reused as `cache_hits`.
+        '''
+        super().__init__(random_seed=random_seed)
+        if not (0 <= epsilon <= 1):
+            raise ValueError(f"epsilon must be in [0, 1], got {epsilon}")
+        if num_simulations < 1:
+            raise ValueError(f"num_simulations must be >= 1, got {num_simulations}")
+        if rollout_batch < 1:
+            raise ValueError(f"rollout_batch must be >= 1, got {rollout_batch}")
+        if time_budget is not None and time_budget <= 0:
+            raise ValueError(f"time_budget must be > 0, got {time_budget}")
+        if exploration < 0:
+            raise ValueError(f"exploration must be >= 0, got {exploration}")
+        self.num_simulations = num_simulations
+        self.exploration = exploration
+        self.rollout_batch = rollout_batch
+        self.time_budget = time_budget
+        self.reuse_tree = reuse_tree
+        self.epsilon = epsilon
+
+        self.tree = SearchTree(max_nodes)
+        # Position at the root of the tree: flat board, player to move and opponent
+        self._root_board = None
+        self._root_players = None
+
+        self.simulations = 0
+        self.reused_nodes = 0
+        self.max_depth = 0
+
+    def choose_action(self, env: Any, history: list[dict]) -> np.array:
+        '''
+        With probability epsilon:
+            - choose a random action
+        and probability (1 - epsilon):
+            - choose the most visited action of the search
+        '''
+        start = time.perf_counter()
+        observation = history[-1]
+        self.simulations = 0
+        self.reused_nodes = 0
+        self.max_depth = 0
+        if self.rng.random() < self.epsilon:
+            actions = np.argwhere(observation["action_mask"])
+            action = actions[self.rng.integers(0, len(actions))]
+        else:
+            action = self._search(env, observation, start)
+        self.move_stats = {
+            "wall_time": time.perf_counter() - start,
+            "nodes_searched": self.simulations,
+            "max_depth": self.max_depth,
+            "cache_hits": self.reused_nodes
+        }
+        return action
+
+    def _search(self, env: Any, observation: dict, start: float) -> np.ndarray:
+        board = np.asarray(observation["board"])
+        player, opponent = observation["current_player"], observation["next_player"]
+        self._set_root(board.reshape(-1), player, opponent)
+
+        deadline = start + self.time_budget if self.time_budget is not None else None
+        while True:
+            self._simulate(env, board.reshape(-1), player, opponent)
+            self.simulations += 1
+            if deadline is not None:
+                if time.perf_counter() > deadline:
+                    break
+            elif self.simulations >= self.num_simulations:
+                break
+
+        tree = self.tree
+        if tree.num_children[0] == 0:
+            # The root could not be expanded, max_nodes is below the number of moves
+            actions = np.argwhere(observation["action_mask"])
+            return actions[self.rng.integers(0, len(actions))]
+        children = np.arange(tree.first_child[0], tree.first_child[0] + tree.num_children[0])
+        best = children[np.argmax(tree.visits[children])]
+        return np.array(np.unravel_index(tree.cell[best], board.shape))
+
+    def _set_root(self, board: np.ndarray, player: int, opponent: int) -> None:
+        '''
+        Moves the root of the tree to the position `board`, keeping the subtree
+        of the moves played since the last search if possible, clearing the tree otherwise.
+        '''
+        node = self._find_position(board, player, opponent) if self.reuse_tree else None
+        if node is None:
+            self.tree.clear()
+        else:
+            self.tree.compact(node)
+            self.reused_nodes = len(self.tree)
+        self._root_board = board.copy()
+        self._root_players = (player, opponent)
+
+    def _find_position(self, board: np.ndarray, player: int, opponent: int) -> Optional[int]:
+        '''
+        Node of the tree holding `board` with `player` to move, None if there is none.
+        '''
+        if self._root_board is None or self._root_board.shape != board.shape:
+            return None
+        empty = BoardEnum.EMPTY.value
+        was_empty = self._root_board == empty
+        if np.any(self._root_board[~was_empty] != board[~was_empty]):
+            return None
+        new_cells = np.flatnonzero(was_empty & (board != empty))
+        players = self._root_players
+        if players[len(new_cells) % 2] != player or set(players) != {player, opponent}:
+            return None
+
+        # Any order of the new marks alternating between the players leads to the same position
+        node = 0
+        remaining = list(new_cells)
+        for ply in range(len(new_cells)):
+            mover = players[ply % 2]
+            cells = [cell for cell in remaining if board[cell] == mover]
+            if not cells:
+                return None
+            node = self.tree.find_child(node, cells[0])
+            if node is None:
+                return None
+            remaining.remove(cells[0])
+        return node
+
+    def _simulate(self, env: Any, root_board: np.ndarray, player: int, opponent: int) -> None:
+        '''
+        One simulation: selection, expansion, a batch of rollouts and backpropagation.
+        '''
+        tree = self.tree
+        board = root_board.copy()
+        movers = (player, opponent)
+        path = [0]
+        node = 0
+        # Selection
+        while tree.first_child[node] >= 0:
+            node = self._select_child(node)
+            board[tree.cell[node]] = movers[(len(path) - 1) % 2]
+            path.append(node)
+        # Expansion, unless the game is over or the tree full
+        empty_cells = np.flatnonzero(board == BoardEnum.EMPTY.value)
+        if len(empty_cells) and tree.expand(node, empty_cells):
+            node = self._select_child(node)
+            board[tree.cell[node]] = movers[(len(path) - 1) % 2]
+            path.append(node)
+        self.max_depth = max(self.max_depth, len(path) - 1)
+
+        # Rollouts, then each node is credited with the outcomes for the player who moved into it
+        root_outcomes = self._rollout(env, board, movers[(len(path) - 1) % 2], movers[len(path) % 2],
+                                      player, opponent).sum()
+        path = np.array(path)
+        tree.visits[path] += self.rollout_batch
+        tree.value_sum[path[1::2]] += root_outcomes
+        tree.value_sum[path[2::2]] += self.rollout_batch - root_outcomes
+
+    def _select_child(self, node: int) -> int:
+        '''
+        Child of `node` maximising UCB1, the first unvisited one if any.
+        '''
+        tree = self.tree
+        children = slice(tree.first_child[node], tree.first_child[node] + tree.num_children[node])
+        visits = tree.visits[children]
+        unvisited = np.flatnonzero(visits == 0)
+        if len(unvisited):
+            return tree.first_child[node] + unvisited[0]
+        ucb = tree.value_sum[children] / visits + self.exploration * np.sqrt(np.log(tree.visits[node]) / visits)
+        return tree.first_child[node] + int(np.argmax(ucb))
+
+    def _rollout(self, env: Any, board: np.ndarray, to_move: int, waiting: int, player: int, opponent: int) -> np.ndarray:
+        '''
+        Outcomes for `player` of `rollout_batch` random games played from the
+        flat `board`, `to_move` moving first. A random game fills the empty squares
+        in a random order, alternating between the players, so the final boards
+        are drawn at once.
+        '''
+        empty_cells = np.flatnonzero(board == BoardEnum.EMPTY.value)
+        boards = np.tile(board, (self.rollout_batch, 1))
+        if len(empty_cells):
+            order = self.rng.random((self.rollout_batch, len(empty_cells))).argsort(axis=1)
+            marks = np.where(np.arange(len(empty_cells)) % 2 == 0, to_move, waiting)
+            boards[np.arange(self.rollout_batch)[:, None], empty_cells[order]] = marks
+        own, other = env.get_scores(boards, player), env.get_scores(boards, opponent)
+        return np.where(own > other, WIN, np.where(own == other, DRAW, LOSS))
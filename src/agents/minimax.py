@@ -2,31 +2,104 @@
 Agent implementing an epsilon-greedy policy over minimax of depth d.
 Epsilon can be 0 and the policy therefore greedy.
 '''
-from typing import Any
+import copy
+import time
+from pathlib import Path
+from typing import Any, Optional
 import numpy as np
 from .base import BaseAgent
+from .opening_book import OpeningBook
+from .transposition import TranspositionTable, ZobristHasher, EXACT
+from .parallel import RootSplitPool
+from src.environments.symmetry import get_symmetry
 
 class MinimaxAgent(BaseAgent):
-    def __init__(self, search_depth: int, epsilon: float = 0, random_seed: int = 42) -> None:
+    def __init__(self, search_depth: int, epsilon: float = 0, random_seed: int = 42,
+                 tt_size: int = 0, tt_policy: str = "depth", tt_symmetry: bool = False,
+                 workers: int = 0, opening_book: Optional[str | Path] = None,
+                 batch_leaves: bool = False) -> None:
+        '''
+        A transposition table of `tt_size` entries is used if `tt_size` > 0.
+        `tt_policy` is its eviction policy, see TranspositionTable.
+        With `tt_symmetry`, symmetric positions share a single entry.
+
+        With `workers` > 1, the root moves are searched in parallel by a pool
+        of worker processes, started on the first move and kept until `close()`.
+
+        `opening_book` is a book built by scripts/lab/build_opening_book.py with
+        the same search depth. Positions in the book are played without searching.
+
+        With `batch_leaves`, the children of the nodes just above the depth limit
+        are scored together (see `evaluate_leaves`) instead of one at a time.
+        '''
         super().__init__(random_seed=random_seed)
         if not (0 <= epsilon <= 1):
             raise ValueError(f"epsilon must be in [0, 1], got {epsilon}")
         if search_depth < 1:
             raise ValueError(f"search_depth must be >= 1, got {search_depth}")
+        if workers < 0:
+            raise ValueError(f"workers must be >= 0, got {workers}")
         self.search_depth = search_depth
         self.epsilon = epsilon
+        self.workers = workers
+        self.batch_leaves = batch_leaves
+        self._pool = None
+
+        self.opening_book = OpeningBook.load(opening_book) if opening_book is not None else None
+        if self.opening_book is not None and self.opening_book.search_depth != search_depth:
+            raise ValueError(f"The opening book was built with search depth {self.opening_book.search_depth}, "
+                             f"the agent searches to depth {search_depth}")
+
+        # Depth at which the current search stops, search_depth unless deepening iteratively
+        self._depth_limit = search_depth
+
+        self.transposition_table = TranspositionTable(tt_size, tt_policy) if tt_size > 0 else None
+        self.tt_symmetry = tt_symmetry
+        self._hasher = None
+        # Zobrist hash of the search board, updated on every move made or unmade
+        self._board_hash = None
 
+        # Search counters of the current move
         self.nodes_searched = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cutoffs = 0
+        self.max_depth = 0
+        # Whether the last move was searched to the end of the game
+        self.solved_exactly = False
 
     def choose_action(self, env: Any, history: list[dict]) -> np.array:
+        '''
+        Chooses an action (see `_choose_action`) and records the statistics of the search.
+        '''
+        self._reset_counters()
+        start = time.perf_counter()
+        action = self._choose_action(env, history)
+        self.move_stats = {
+            "wall_time": time.perf_counter() - start,
+            "nodes_searched": self.nodes_searched,
+            "max_depth": self.max_depth,
+            "cutoffs": self.cutoffs,
+            "cache_hits": self.cache_hits,
+            "solved_exactly": int(self.solved_exactly)
+        }
+        return action
+
+    def _reset_counters(self) -> None:
+        self.nodes_searched = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cutoffs = 0
+        self.max_depth = 0
+        self.solved_exactly = False
+
+    def _choose_action(self, env: Any, history: list[dict]) -> np.array:
         '''
         With probability epsilon:
             - choose a random action
         and probability (1 - epsilon):
             - choose the action that leads to the state with the greatest *minimax value*
         '''
-        self.nodes_searched = 0
-
         observation = history[-1]
         dim_indices = list(np.nonzero(observation["action_mask"])) # [rows, columns] in 2D, generalises for higher dimensions
         num_valid_actions = len(dim_indices[0])
@@ -34,60 +107,258 @@ class MinimaxAgent(BaseAgent):
             action_idx = self.rng.integers(0, num_valid_actions, size=1)
             action = np.array([dim_indices[dim][action_idx] for dim in range(len(dim_indices))]).reshape(-1)
             return action
+        book_action = self._book_action(env, observation)
+        if book_action is not None:
+            # The book holds the moves of a search to the same depth
+            self.solved_exactly = num_valid_actions <= self.search_depth
+            return book_action
         else:
             actions = np.stack(dim_indices).T # (num_valid_actions, num_dimensions)
             root_current_player = observation["current_player"]
             root_next_player = observation["next_player"]
 
-            next_players_observations = np.apply_along_axis(lambda a: env.simulate_step(observation["board"], root_current_player, a)[0], axis=1, arr=actions)
-            # The next player will want to minimise the minimax value..
-            minimax_values = np.array([self.get_minimax_value(env, o, current_player=root_next_player, next_player=root_current_player, current_role='min', next_role='max', depth=1) for o in next_players_observations]) # (num_actions)
+            if self.workers > 1:
+                results = self._search_root_actions_in_parallel(env, observation["board"], root_current_player, root_next_player, actions)
+            else:
+                results = self._search_root_actions(env, observation["board"], root_current_player, root_next_player, actions)
 
             # And we take the action that leads to the maximum of these.
-            action_idx = np.argmax(minimax_values) # (1)
+            action_idx = self._select_root_action(results) # (1)
             action = actions[action_idx]
+            self.solved_exactly = num_valid_actions <= self.search_depth
             return action
+
+    def _book_action(self, env: Any, observation: dict) -> Optional[np.ndarray]:
+        '''
+        The move of the opening book for the observed position, None if it is not in the book.
+        '''
+        if self.opening_book is None:
+            return None
+        return self.opening_book.get_action(env, observation["board"], observation["current_player"])
+
+    def _search_root_actions(self, env: Any, board: np.ndarray, root_current_player: int, root_next_player: int,
+                             actions: np.ndarray, shared_alpha: Optional[Any] = None) -> list[tuple[float, bool]]:
+        '''
+        Minimax value of each root action, along with whether the value is exact
+        (always, without pruning). `shared_alpha` is only used by alpha-beta search.
+        '''
+        board = self._start_search(env, board)
+        score_difference = env.get_score(board, root_current_player) - env.get_score(board, root_next_player)
+        results = []
+        for a in actions:
+            gain = self._make_move(env, board, root_current_player, a)
+            # The next player will want to minimise the minimax value..
+            mm_value = self.get_minimax_value(env, board, current_player=root_next_player, next_player=root_current_player, current_role='min', next_role='max', depth=1,
+                                              score_difference=score_difference + gain)
+            self._unmake_move(env, board, root_current_player, a)
+            results.append((mm_value, True))
+        return results
+
+    def _search_root_actions_in_parallel(self, env: Any, board: np.ndarray, root_current_player: int, root_next_player: int,
+                                         actions: np.ndarray) -> list[tuple[float, bool]]:
+        if self._pool is None:
+            # Workers get a serial copy of this agent with an empty transposition table
+            worker_agent = copy.copy(self)
+            worker_agent.workers = 0
+            if self.transposition_table is not None:
+                worker_agent.transposition_table = TranspositionTable(self.transposition_table.size, self.transposition_table.policy)
+            self._pool = RootSplitPool(worker_agent, self.workers, env)
+        results, stats = self._pool.search(env, board, root_current_player, root_next_player, actions)
+        self.nodes_searched += stats["nodes_searched"]
+        self.cache_hits += stats["cache_hits"]
+        self.cache_misses += stats["cache_misses"]
+        self.cutoffs += stats["cutoffs"]
+        self.max_depth = max(self.max_depth, stats["max_depth"])
+        return results
+
+    def _select_root_action(self, results: list[tuple[float, bool]]) -> int:
+        '''
+        Index of the first root action with the greatest exact value.
+        (The first best action is always searched exactly, the values of
+        later actions might only be bounds equal to it.)
+        '''
+        values = np.array([value for value, _ in results])
+        exact = np.array([is_exact for _, is_exact in results])
+        return int(np.flatnonzero(exact & (values == values[exact].max()))[0])
+
+    def close(self) -> None:
+        '''
+        Shuts down the worker pool, if any.
+        '''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def __getstate__(self) -> dict:
+        # The worker pool stays with the agent that started it
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
         
-    def get_minimax_value(self, env: Any, observation: dict,
+    def get_minimax_value(self, env: Any, board: np.ndarray,
                           current_player: int, next_player: int, 
                           current_role: str, next_role: str, 
-                          depth: int) -> float:
+                          depth: int, score_difference: Optional[float] = None) -> float:
         '''
-        Compute the minimax value of `observation`, where "board" represents the board position.
+        Compute the minimax value of the position `board`.
         Search is carried out until the agent's specified search depth is reached.
         The final evaluation is based on the score difference between the players.
         The root player always wants to maixmise their score.
 
+        `board` is a search buffer: moves are made and unmade on it in place,
+        and it is left unchanged when the method returns.
+
         `env` is used to gain access to environment dynamics, i.e. the rules of the game.
         This is needed to perform search.
+
+        `score_difference` is the score of the root player minus their opponent's on `board`.
+        It is passed down with the points of every move added, so that the scores are only
+        counted on the whole board when it is not given.
         '''
         self.nodes_searched += 1
-        if depth == self.search_depth or env.terminal_state(observation["board"]):
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if score_difference is None:
+            score_difference = self._root_score_difference(env, board, current_player, next_player, current_role)
+        if depth == self._depth_limit or env.terminal_state(board):
             root_current_player = current_player if current_role == 'max' else next_player
             root_next_player = current_player if current_role == 'min' else next_player
-            leaf_value = self.evaluate_leaf(env, observation, root_current_player, root_next_player)
+            leaf_value = self.evaluate_leaf(env, self._leaf_observation(board, current_player, next_player, score_difference),
+                                            root_current_player, root_next_player)
             return leaf_value
         else:
-            dim_indices = list(np.nonzero(observation["action_mask"])) # [rows, columns] in 2D, generalises for higher dimensions
-            actions = np.stack(dim_indices).T # (num_valid_actions, num_dimensions)
-            new_observations = [env.simulate_step(observation["board"], current_player, a)[0] for a in actions]
-            minimax_values = np.array([self.get_minimax_value(
-                                                env, o, 
-                                                current_player=next_player, next_player=current_player, 
-                                                current_role=next_role, next_role=current_role,
-                                                depth=depth + 1
-                                            ) for o in new_observations])
+            key = None
+            if self.transposition_table is not None:
+                key = self._position_key(env, board, current_player, current_role, depth)
+                entry = self._probe(key)
+                if entry is not None:
+                    return entry[0] # Without pruning every entry is exact
+
+            actions = np.argwhere(env.get_action_mask(board)) # (num_valid_actions, num_dimensions)
+            if self.batch_leaves and depth + 1 == self._depth_limit:
+                minimax_values = self._leaf_child_values(env, board, current_player, next_player, current_role, actions, depth)
+            else:
+                minimax_values = []
+                for a in actions:
+                    gain = self._make_move(env, board, current_player, a)
+                    minimax_values.append(self.get_minimax_value(
+                                                    env, board, 
+                                                    current_player=next_player, next_player=current_player, 
+                                                    current_role=next_role, next_role=current_role,
+                                                    depth=depth + 1,
+                                                    score_difference=score_difference + (gain if current_role == 'max' else -gain)
+                                                ))
+                    self._unmake_move(env, board, current_player, a)
+                minimax_values = np.array(minimax_values)
             if current_role == 'max':
-                return np.max(minimax_values)
+                value = np.max(minimax_values)
             elif current_role == 'min':
-                return np.min(minimax_values)
+                value = np.min(minimax_values)
+
+            if key is not None:
+                self.transposition_table.store(key, value, EXACT, self._depth_limit - depth)
+            return value
+
+    def _root_score_difference(self, env: Any, board: np.ndarray, current_player: int, next_player: int,
+                               current_role: str) -> float:
+        '''
+        Score of the root player minus their opponent's, counted on the whole board.
+        '''
+        root_current_player = current_player if current_role == 'max' else next_player
+        root_next_player = current_player if current_role == 'min' else next_player
+        return env.get_score(board, root_current_player) - env.get_score(board, root_next_player)
+
+    def _start_search(self, env: Any, board: np.ndarray) -> np.ndarray:
+        '''
+        Returns a copy of the root board to be used as the search buffer,
+        and hashes it if a transposition table is used.
+        This is the only board allocation of a search.
+        '''
+        board = np.array(board, copy=True)
+        self._board_hash = None
+        if self.transposition_table is not None:
+            if self._hasher is None or self._hasher.num_cells != board.size:
+                # New board geometry, stored entries are meaningless for it
+                self._hasher = ZobristHasher(board.size, random_seed=self.random_seed)
+                self.transposition_table.clear()
+            if not self.tt_symmetry:
+                self._board_hash = self._hasher.hash_board(board)
+        return board
+
+    def _make_move(self, env: Any, board: np.ndarray, player: int, action: np.ndarray) -> int:
+        reward = env.apply_action(board, player, action)
+        if self._board_hash is not None:
+            cell = np.ravel_multi_index(tuple(action), board.shape)
+            self._board_hash = self._hasher.toggle(self._board_hash, cell, player)
+        return reward
+
+    def _unmake_move(self, env: Any, board: np.ndarray, player: int, action: np.ndarray) -> None:
+        env.undo_action(board, action)
+        if self._board_hash is not None:
+            cell = np.ravel_multi_index(tuple(action), board.shape)
+            self._board_hash = self._hasher.toggle(self._board_hash, cell, player)
+
+    def _position_key(self, env: Any, board: np.ndarray, current_player: int, current_role: str, depth: int) -> int:
+        '''
+        Transposition table key of a search node: Zobrist hash of the board,
+        the side to move, its role and the remaining search depth.
+        The role fixes who the root player is, which the values depend on.
+        '''
+        if self.tt_symmetry:
+            # Symmetric hashes cannot be updated incrementally
+            board_hash = self._hasher.hash_symmetric(board, get_symmetry(env))
+        else:
+            board_hash = self._board_hash
+        return self._hasher.position_key(board_hash, current_player, current_role, self._depth_limit - depth)
+
+    def _probe(self, key: int) -> Optional[tuple[float, int]]:
+        entry = self.transposition_table.probe(key)
+        if entry is None:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return entry
+            
+    def _leaf_child_values(self, env: Any, board: np.ndarray, current_player: int, next_player: int,
+                           current_role: str, actions: np.ndarray, depth: int) -> np.ndarray:
+        '''
+        Values of the children of a node at depth `depth`, all leaves of the search,
+        evaluated together on a stack of the child boards.
+        '''
+        self.nodes_searched += len(actions)
+        if depth + 1 > self.max_depth:
+            self.max_depth = depth + 1
+        children = np.repeat(board[None], len(actions), axis=0) # (num_valid_actions, *board_shape)
+        children[(np.arange(len(actions)), *actions.T)] = current_player
+        root_current_player = current_player if current_role == 'max' else next_player
+        root_next_player = current_player if current_role == 'min' else next_player
+        return self.evaluate_leaves(env, children, root_current_player, root_next_player)
             
+    def _leaf_observation(self, board: np.ndarray, current_player: int, next_player: int,
+                          score_difference: float) -> dict:
+        '''
+        Observation passed to evaluate_leaf. Its "board" is the search buffer,
+        which changes once the method returns, and it has no action mask.
+        "score_difference" is the score of the root player minus their opponent's.
+        '''
+        return {"board": board, "current_player": current_player, "next_player": next_player,
+                "score_difference": score_difference}
+
     def evaluate_leaf(self, env: Any, observation: dict, root_current_player: int, root_next_player: int) -> float:
         '''
         Evaluate an observation representing an environment state that is a leaf node of the search.
         This method is added for modularity and clarity.
 
-        Implementing: score difference between players.
+        Implementing: score difference between players, kept up to date by the search.
         '''
+        if "score_difference" in observation:
+            return observation["score_difference"]
         return env.get_score(observation["board"], root_current_player) - env.get_score(observation["board"], root_next_player)
 
+    def evaluate_leaves(self, env: Any, boards: np.ndarray, root_current_player: int, root_next_player: int) -> np.ndarray:
+        '''
+        Batched counterpart of evaluate_leaf over a stack of boards (N, *board_shape),
+        used with `batch_leaves`. Both have to be overridden together.
+        '''
+        return env.get_scores(boards, root_current_player) - env.get_scores(boards, root_next_player)
+
@@ -0,0 +1,126 @@
+'''
+Opening book of precomputed minimax values.
+
+The book holds every position reachable within a number of plies from the
+empty board, up to symmetry: one entry per canonical form (see
+src.environments.symmetry). Each entry stores the exact minimax value, at the
+book's search depth, of every move of the canonical board, for the player to
+move. Looking a position up maps these values back to the frame of the
+board, so that the move chosen is the one a search at that depth would make.
+'''
+from pathlib import Path
+from typing import Any, Optional
+import numpy as np
+
+from src.enums.game import BoardEnum, RoleEnum
+from src.environments.symmetry import get_symmetry
+
+
+class OpeningBook:
+    def __init__(self, boards: np.ndarray, players: np.ndarray, values: np.ndarray,
+                 board_shape: tuple[int, ...], search_depth: int, max_ply: int) -> None:
+        '''
+        `boards` (num_entries, num_cells) are the canonical boards, `players`
+        the player to move on each and `values` (num_entries, num_cells) the
+        value of every move, NaN for occupied squares.
+        '''
+        self.boards = boards
+        self.players = players
+        self.values = values
+        self.board_shape = tuple(board_shape)
+        self.search_depth = search_depth
+        self.max_ply = max_ply
+        self._entries = {(board.astype(np.uint8).tobytes(), int(player)): i
+                         for i, (board, player) in enumerate(zip(boards, players))}
+
+    def __len__(self) -> int:
+        return len(self.boards)
+
+    def save(self, path: str | Path) -> None:
+        np.savez_compressed(path, boards=self.boards, players=self.players, values=self.values,
+                            board_shape=np.array(self.board_shape), search_depth=self.search_depth,
+                            max_ply=self.max_ply)
+
+    @classmethod
+    def load(cls, path: str | Path) -> 'OpeningBook':
+        with np.load(path) as book:
+            return cls(book['boards'], book['players'], book['values'], tuple(book['board_shape']),
+                       int(book['search_depth']), int(book['max_ply']))
+
+    def get_move_values(self, env: Any, board: np.ndarray, player: int) -> Optional[np.ndarray]:
+        '''
+        Values of the moves on `board` for `player` (NaN for occupied squares),
+        in the frame of the board, or None if the position is not in the book.
+        '''
+        if board.shape != self.board_shape:
+            return None
+        symmetry = get_symmetry(env)
+        canonical, g = symmetry.canonicalize(board)
+        entry = self._entries.get((canonical.astype(np.uint8).tobytes(), int(player)))
+        if entry is None:
+            return None
+        # Square c of the board is square images[g][c] of the canonical board
+        return self.values[entry][symmetry.images[g]].reshape(self.board_shape)
+
+    def get_action(self, env: Any, board: np.ndarray, player: int) -> Optional[np.ndarray]:
+        '''
+        The first move (in row-major order) with the greatest value, or None
+        if the position is not in the book.
+        '''
+        values = self.get_move_values(env, board, player)
+        if values is None:
+            return None
+        actions = np.argwhere(board == BoardEnum.EMPTY.value)
+        action_values = values[tuple(actions.T)]
+        return actions[int(np.argmax(action_values))]
+
+
+def build_opening_book(env: Any, agent: Any, max_ply: int) -> OpeningBook:
+    '''
+    Searches every position within `max_ply` plies of the empty board, up
+    to symmetry, with `agent` (an AlphaBetaMinimaxAgent). Every move is
+    searched with a full window, so that all values are exact.
+    '''
+    symmetry = get_symmetry(env)
+    players = [RoleEnum.X.value, RoleEnum.O.value] # X moves first
+    env.reset()
+    empty = env.get_board_state().copy()
+
+    boards, to_move, values = [], [], []
+    positions = {empty.astype(np.uint8).tobytes(): empty}
+    for ply in range(max_ply + 1):
+        player, opponent = players[ply % 2], players[(ply + 1) % 2]
+        children = {}
+        for board in positions.values():
+            if env.terminal_state(board):
+                continue
+            boards.append(board.reshape(-1))
+            to_move.append(player)
+            values.append(search_move_values(env, agent, board, player, opponent).reshape(-1))
+            if ply < max_ply:
+                for action in np.argwhere(board == BoardEnum.EMPTY.value):
+                    child = board.copy()
+                    child[tuple(action)] = player
+                    canonical, _ = symmetry.canonicalize(child)
+                    children.setdefault(canonical.astype(np.uint8).tobytes(), canonical)
+        positions = children
+
+    return OpeningBook(np.array(boards), np.array(to_move), np.array(values, dtype=np.float64),
+                       empty.shape, agent.search_depth, max_ply)
+
+
+def search_move_values(env: Any, agent: Any, board: np.ndarray, player: int, opponent: int) -> np.ndarray:
+    '''
+    Exact value of every move on `board` for `player`, NaN for occupied squares.
+    '''
+    move_values = np.full(board.shape, np.nan)
+    search_board = agent._start_search(env, board)
+    score_difference = env.get_score(board, player) - env.get_score(board, opponent)
+    for action in np.argwhere(board == BoardEnum.EMPTY.value):
+        gain = agent._make_move(env, search_board, player, action)
+        move_values[tuple(action)] = agent.get_minimax_value(env, search_board, current_player=opponent, next_player=player,
+                                                             current_role='min', next_role='max', depth=1,
+                                                             alpha=-np.inf, beta=np.inf,
+                                                             score_difference=score_difference + gain)
+        agent._unmake_move(env, search_board, player, action)
+    return move_values
@@ -0,0 +1,95 @@
+'''
+Persistent process pool splitting the root moves of a minimax search
+across workers.
+
+Every worker holds its own copy of the agent (with its own transposition
+table) and of the env, created once when the pool starts. For each move, the
+root actions are submitted one per task along with the board only, so idle
+workers pick up the remaining actions. The env is sent again, by restarting
+the workers, only when the search is given another env.
+Alpha-beta workers share the best root value found so far through a
+shared double, which they use as alpha for the actions they search next.
+'''
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+import numpy as np
+
+# Per-worker state, set by the pool initializer
+_worker_agent = None
+_worker_env = None
+_shared_alpha = None
+
+
+def _init_worker(agent: Any, env: Any, shared_alpha: Any) -> None:
+    global _worker_agent, _worker_env, _shared_alpha
+    _worker_agent = agent
+    _worker_env = env
+    _shared_alpha = shared_alpha
+
+
+def _search_root_actions(board: np.ndarray, root_current_player: int,
+                         root_next_player: int, actions: np.ndarray) -> tuple[list, dict]:
+    agent = _worker_agent
+    agent._reset_counters()
+    results = agent._search_root_actions(_worker_env, board, root_current_player, root_next_player,
+                                         actions, shared_alpha=_shared_alpha)
+    stats = {
+        "nodes_searched": agent.nodes_searched,
+        "cache_hits": agent.cache_hits,
+        "cache_misses": agent.cache_misses,
+        "cutoffs": agent.cutoffs,
+        "max_depth": agent.max_depth
+    }
+    return results, stats
+
+
+class RootSplitPool:
+    def __init__(self, agent: Any, workers: int, env: Any) -> None:
+        '''
+        `agent` is the serial copy of the searching agent sent to every worker,
+        along with `env`, the env the searches are run with.
+        '''
+        if workers < 2:
+            raise ValueError(f"A root split pool needs at least 2 workers, got {workers}")
+        self.workers = workers
+        self.agent = agent
+        self._context = mp.get_context()
+        self.shared_alpha = self._context.Value('d', -np.inf)
+        self._start(env)
+
+    def _start(self, env: Any) -> None:
+        self.env = env
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context,
+                                             initializer=_init_worker,
+                                             initargs=(self.agent, env, self.shared_alpha))
+
+    def search(self, env: Any, board: np.ndarray, root_current_player: int,
+               root_next_player: int, actions: np.ndarray) -> tuple[list, dict]:
+        '''
+        Searches every root action, returns the (value, is_exact) pair of each action
+        in the order of `actions`, along with the search counters summed over workers
+        (the maximum depth reached by any of them).
+        '''
+        if env is not self.env:
+            # Workers keep the env they were started with
+            self.close()
+            self._start(env)
+        self.shared_alpha.value = -np.inf
+        futures = [self._executor.submit(_search_root_actions, board, root_current_player,
+                                         root_next_player, actions[i:i + 1])
+                   for i in range(len(actions))]
+        results = []
+        stats = {"nodes_searched": 0, "cache_hits": 0, "cache_misses": 0, "cutoffs": 0, "max_depth": 0}
+        for future in futures:
+            action_results, action_stats = future.result()
+            results.extend(action_results)
+            for name in stats:
+                if name == "max_depth":
+                    stats[name] = max(stats[name], action_stats[name])
+                else:
+                    stats[name] += action_stats[name]
+        return results, stats
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,59 @@
+'''
+Agent playing TwoDims perfectly, by looking its moves up in the
+solution table of the retrograde solver (see solver.py).
+'''
+import time
+from pathlib import Path
+from typing import Any, Optional
+import numpy as np
+from .base import BaseAgent
+from .solver import UNREACHABLE, board_index, load_table, side_to_move, solve
+
+class PerfectAgent(BaseAgent):
+    def __init__(self, table_path: Optional[str | Path] = None, epsilon: float = 0, random_seed: int = 42) -> None:
+        '''
+        `table_path` is a solution table saved by scripts/lab/solve_two_dims.py,
+        memory-mapped. Without it, the game is solved when the agent is created
+        (which takes well under a second).
+        The table assumes the dense reward without bonus.
+        '''
+        super().__init__(random_seed=random_seed)
+        if not (0 <= epsilon <= 1):
+            raise ValueError(f"epsilon must be in [0, 1], got {epsilon}")
+        self.epsilon = epsilon
+        self.table_path = table_path
+        self.table = load_table(table_path) if table_path is not None else solve()
+
+    def choose_action(self, env: Any, history: list[dict]) -> np.array:
+        '''
+        With probability epsilon:
+            - choose a random action
+        and probability (1 - epsilon):
+            - choose the best action, the first one in row-major order among
+              equally good ones (the choice of a full-depth MinimaxAgent)
+        '''
+        start = time.perf_counter()
+        observation = history[-1]
+        board = observation["board"]
+        if board.shape != (3, 3):
+            raise Exception(f"PerfectAgent only plays on 3x3 boards, got a board of shape {board.shape}")
+        random_move = self.rng.random() < self.epsilon
+        if random_move:
+            actions = np.argwhere(observation["action_mask"])
+            action = actions[self.rng.integers(0, len(actions))]
+        else:
+            if side_to_move(board) != observation["current_player"]:
+                raise Exception(f"PerfectAgent assumes X moves first, but player {observation['current_player']} is to move")
+            cell = self.table[1, board_index(board)]
+            if cell == UNREACHABLE:
+                raise Exception("Board not reachable in a game")
+            action = np.array(np.unravel_index(cell, board.shape))
+        self.move_stats = {"wall_time": time.perf_counter() - start,
+                           "solved_exactly": int(not random_move)}
+        return action
+
+    def get_value(self, board: np.ndarray) -> int:
+        '''
+        Best score difference the player to move can still secure on `board`.
+        '''
+        return int(self.table[0, board_index(board)])
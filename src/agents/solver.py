@@ -0,0 +1,102 @@
+'''
+Exact retrograde solver for TwoDims (3x3 boards).
+
+Every board is indexed in base 3, cell i (row-major) being digit i, with
+EMPTY = 0, X = 1 and O = 2. X moves first, so the player to move follows
+from the number of marks on the board.
+
+The solution table is an int8 array of shape (2, 3^9):
+    table[0, index] : value of the board for the player to move, i.e. the best
+                      score difference (own points - opponent's points) they
+                      can still secure until the board is full, under the
+                      dense reward without bonus.
+    table[1, index] : flat index of the cell of the best move (the first one
+                      among equally good moves), -1 for full boards.
+Boards that cannot be reached in a game hold UNREACHABLE in both rows.
+It is saved as a .npy file, which can be memory-mapped when loaded.
+'''
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+from src.enums.game import BoardEnum, RoleEnum
+from src.environments.two_dims import TwoDims
+
+NUM_CELLS = 9
+NUM_BOARDS = 3 ** NUM_CELLS
+UNREACHABLE = np.iinfo(np.int8).min
+
+# Base 3 digit of each board value
+DIGITS = {BoardEnum.EMPTY.value: 0, BoardEnum.X.value: 1, BoardEnum.O.value: 2}
+POWERS = 3 ** np.arange(NUM_CELLS)
+
+
+def board_index(board: np.ndarray) -> int:
+    '''
+    Base 3 index of a 3x3 board.
+    '''
+    digits = np.zeros(NUM_CELLS, dtype=np.int64)
+    flat = np.asarray(board).reshape(-1)
+    for value, digit in DIGITS.items():
+        digits[flat == value] = digit
+    return int(digits @ POWERS)
+
+
+def solve(line_indices: Optional[np.ndarray] = None) -> np.ndarray:
+    '''
+    Solves the game by backward induction over the number of marks,
+    with `line_indices` (num_lines, 3) the flat cells of the scoring lines,
+    those of TwoDims by default.
+    Returns the solution table described in the module docstring.
+    '''
+    if line_indices is None:
+        line_indices = TwoDims()._line_indices
+    indices = np.arange(NUM_BOARDS)
+    digits = (indices[:, None] // POWERS) % 3 # (NUM_BOARDS, NUM_CELLS)
+    num_x, num_o = (digits == 1).sum(axis=1), (digits == 2).sum(axis=1)
+    reachable = (num_x - num_o == 0) | (num_x - num_o == 1)
+    # Digit of the player to move
+    side = np.where(num_x == num_o, 1, 2)
+
+    # Points the player to move scores by marking each cell
+    gains = np.zeros((NUM_BOARDS, NUM_CELLS), dtype=np.int64)
+    for line in line_indices:
+        for k, cell in enumerate(line):
+            others = np.delete(line, k)
+            gains[:, cell] += (digits[:, others] == side[:, None]).all(axis=1)
+
+    values = np.full(NUM_BOARDS, UNREACHABLE, dtype=np.int64)
+    best_cells = np.full(NUM_BOARDS, UNREACHABLE, dtype=np.int64)
+    full = reachable & (num_x + num_o == NUM_CELLS)
+    values[full], best_cells[full] = 0, -1
+
+    for marks in range(NUM_CELLS - 1, -1, -1):
+        boards = np.flatnonzero(reachable & (num_x + num_o == marks))
+        empty = digits[boards] == 0
+        children = boards[:, None] + side[boards, None] * POWERS[None, :]
+        # Negamax: the gain of the move minus the value of the board for the opponent
+        move_values = np.where(empty, gains[boards] - values[np.where(empty, children, 0)], np.iinfo(np.int64).min)
+        best_cells[boards] = np.argmax(move_values, axis=1)
+        values[boards] = move_values[np.arange(len(boards)), best_cells[boards]]
+
+    return np.stack((values, best_cells)).astype(np.int8)
+
+
+def side_to_move(board: np.ndarray) -> int:
+    '''
+    Player to move on a 3x3 board, X moving first.
+    '''
+    num_x = int((board == BoardEnum.X.value).sum())
+    num_o = int((board == BoardEnum.O.value).sum())
+    return RoleEnum.X.value if num_x == num_o else RoleEnum.O.value
+
+
+def save_table(table: np.ndarray, path: str | Path) -> None:
+    np.save(path, table)
+
+
+def load_table(path: str | Path, mmap: bool = True) -> np.ndarray:
+    table = np.load(path, mmap_mode='r' if mmap else None)
+    if table.shape != (2, NUM_BOARDS) or table.dtype != np.int8:
+        raise Exception(f"{path} does not hold a TwoDims solution table")
+    return table
@@ -0,0 +1,105 @@
+'''
+Transposition table with Zobrist hashing for the search agents.
+
+Entries are keyed by a Zobrist hash of the board, the side to move,
+the role (max/min) of the side to move and the remaining search depth.
+Alongside the value, each entry stores whether it is exact or only a
+lower/upper bound, so that it can be used under alpha-beta pruning.
+'''
+from typing import Any, Optional
+import numpy as np
+
+# Entry flags
+EXACT = 0
+LOWER = 1 # value is a lower bound (search failed high)
+UPPER = 2 # value is an upper bound (search failed low)
+
+ROLES = ['max', 'min']
+
+
+class ZobristHasher:
+    def __init__(self, num_cells: int, num_values: int = 4, num_players: int = 2,
+                 max_depth: int = 128, random_seed: int = 0) -> None:
+        '''
+        Draws one random 64-bit key per (square, value) pair, side to move,
+        role and remaining depth. Empty squares hash to 0, so placing or
+        removing a mark is a single XOR.
+        '''
+        rng = np.random.default_rng(random_seed)
+
+        def draw(*shape: int) -> np.ndarray:
+            return rng.integers(0, np.iinfo(np.uint64).max, size=shape, dtype=np.uint64, endpoint=True)
+
+        self.num_cells = num_cells
+        self.square_keys = draw(num_cells, num_values)
+        self.square_keys[:, 2] = 0 # BoardEnum.EMPTY
+        self.player_keys = [int(k) for k in draw(num_players)]
+        self.role_keys = {role: int(k) for role, k in zip(ROLES, draw(len(ROLES)))}
+        self.depth_keys = [int(k) for k in draw(max_depth + 1)]
+
+        self._cells = np.arange(num_cells)
+
+    def hash_board(self, board: np.ndarray) -> int:
+        values = np.ravel(board).astype(np.intp)
+        return int(np.bitwise_xor.reduce(self.square_keys[self._cells, values]))
+
+    def hash_symmetric(self, board: np.ndarray, symmetry: Any) -> int:
+        '''
+        Hash shared by all symmetric images of the board: the smallest
+        hash among the images under `symmetry` (a BoardSymmetry).
+        '''
+        images = symmetry.transform_all(board).astype(np.intp) # (G, num_cells)
+        hashes = np.bitwise_xor.reduce(self.square_keys[self._cells, images], axis=1)
+        return int(hashes.min())
+
+    def toggle(self, board_hash: int, cell: int, value: int) -> int:
+        '''
+        Hash of the board after placing (or removing) `value` at `cell`.
+        '''
+        return board_hash ^ int(self.square_keys[cell, value])
+
+    def position_key(self, board_hash: int, player: int, role: str, remaining_depth: int) -> int:
+        return board_hash ^ self.player_keys[player] ^ self.role_keys[role] ^ self.depth_keys[remaining_depth]
+
+
+class TranspositionTable:
+    '''
+    Fixed-size, direct-mapped table: a key can only live in slot `key % size`.
+
+    Eviction policies when two keys compete for a slot:
+        - "always": the newest entry replaces the old one
+        - "depth": the entry searched with the larger remaining depth is kept
+    '''
+    policies = ["always", "depth"]
+
+    def __init__(self, size: int, policy: str = "depth") -> None:
+        if size < 1:
+            raise ValueError(f"Transposition table size must be >= 1, got {size}")
+        if policy not in self.policies:
+            raise ValueError(f"Eviction policy must be one of {self.policies}, got {policy}")
+        self.size = size
+        self.policy = policy
+        self.clear()
+
+    def clear(self) -> None:
+        # Each entry is a tuple (key, value, flag, remaining_depth)
+        self._entries = [None] * self.size
+        self.num_entries = 0
+
+    def probe(self, key: int) -> Optional[tuple[float, int]]:
+        '''
+        Returns (value, flag) stored for `key`, or None.
+        '''
+        entry = self._entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry[1], entry[2]
+        return None
+
+    def store(self, key: int, value: float, flag: int, remaining_depth: int) -> None:
+        slot = key % self.size
+        entry = self._entries[slot]
+        if entry is None:
+            self.num_entries += 1
+        elif self.policy == "depth" and entry[0] != key and entry[3] > remaining_depth:
+            return
+        self._entries[slot] = (key, value, flag, remaining_depth)
@@ -1,42 +1,297 @@
 import h5py
+import numpy as np
 from pathlib import Path
+from src.logging.reader import episode_index, get_telemetry_fields, iter_episodes, iter_step_chunks, num_episodes
+
+OUTCOMES = ["win", "draw", "loss"]
+TELEMETRY_STATISTICS = ["mean", "median", "p95", "max"]
 
 class BaseAnalyzer:
-    def __init__(self, overwrite: bool = False) -> None:
+    engines = ["vectorized", "loop"]
+
+    def __init__(self, overwrite: bool = False, engine: str = "vectorized", chunk_size: int = 1 << 20) -> None:
+        """
+        The "vectorized" engine streams the steps in chunks of about `chunk_size`
+        steps and reduces them with numpy. The "loop" engine goes through
+        every step in Python. Both give the same results.
+
+        Every analysis records in its `episodes_covered` attribute how many
+        episodes it covers. When episodes were logged since, only those are
+        analysed and merged into the stored result, unless `overwrite` is set,
+        in which case analyses are recomputed from scratch.
+        """
+        if engine not in self.engines:
+            raise ValueError(f"engine must be one of {self.engines}, got {engine}")
         self.overwrite = overwrite
+        self.engine = engine
+        self.chunk_size = chunk_size
 
     def open_hdf5(self, file_path: str | Path) -> h5py.File:
         """Open an HDF5 file and return the file object."""
         return h5py.File(file_path, 'r')
-    
+
     def make_analysis_group(self, hdf5_file: h5py.File) -> h5py.Group:
         """Create a new analysis group in the HDF5 file."""
         if hdf5_file.get("analysis") is not None:
             return hdf5_file["analysis"]
         return hdf5_file.create_group("analysis")
-    
+
     def compute_mean_undiscounted_return_per_episode(self, experiment: h5py.File) -> dict:
         """
         Compute the mean undiscounted return per episode from the experiment data.
         """
-        if experiment.get("analysis/mean_undiscounted_return_per_episode") is not None and not self.overwrite:
+        name = 'mean_undiscounted_return_per_episode'
+        if experiment.get(f"analysis/{name}") is not None and not self.overwrite \
+                and self._episodes_covered(experiment, name) == num_episodes(experiment):
             print("Mean undiscounted return per episode already exists. Skipping computation.")
-            return experiment['analysis']['mean_undiscounted_return_per_episode'][:]
         else:
-            analysis_group = self.make_analysis_group(experiment)
-            if analysis_group.get('mean_undiscounted_return_per_episode') is not None:
-                del analysis_group['mean_undiscounted_return_per_episode']
-
-            mean_reward_per_player_per_episode = {id: [] for id in experiment.attrs['player_ids']}
-            for episode in experiment['episodes']:
-                rewards_per_player = {id: [] for id in experiment.attrs['player_ids']}
-                for reward, player in zip(experiment['episodes'][episode]['rewards'], 
-                                        experiment['episodes'][episode]['players']):
-                    rewards_per_player[player].append(reward)
-                for id in mean_reward_per_player_per_episode:
-                    mean_reward_per_player_per_episode[id].append(sum(rewards_per_player[id]) / len(rewards_per_player[id]))
-            
-            analysis_group.create_dataset('mean_undiscounted_return_per_episode', 
-                                        data=[mean_reward_per_player_per_episode[id] for id in experiment.attrs['player_ids']],
-                                        compression=None)
-            return mean_reward_per_player_per_episode
\ No newline at end of file
+            self._update_episode_returns(experiment)
+        means = experiment['analysis']['mean_undiscounted_return_per_episode'][:]
+        return {id: list(means[i]) for i, id in enumerate(experiment.attrs['player_ids'])}
+
+    def compute_undiscounted_return_per_episode(self, experiment: h5py.File) -> np.ndarray:
+        """
+        Sum of the rewards of every player in every episode, (num_players, num_episodes).
+        With dense rewards, these are the final scores of the players.
+        """
+        self._update_episode_returns(experiment)
+        return experiment['analysis']['undiscounted_return_per_episode'][:]
+
+    def compute_outcome_rates(self, experiment: h5py.File) -> dict:
+        """
+        Win, draw and loss rates of every player. The players with the
+        greatest return of an episode draw if there are several, else the one wins.
+        """
+        start, returns, _ = self._new_episode_returns(experiment, 'outcome_counts')
+        counts = np.zeros((len(experiment.attrs['player_ids']), len(OUTCOMES)), dtype=np.int64)
+        if start > 0:
+            counts += experiment['analysis']['outcome_counts'][:]
+        if returns.shape[1] > 0:
+            best = returns == returns.max(axis=0)
+            shared = best.sum(axis=0) > 1
+            counts[:, 0] += (best & ~shared).sum(axis=1)
+            counts[:, 1] += (best & shared).sum(axis=1)
+            counts[:, 2] += (~best).sum(axis=1)
+        self._store_summary(experiment, 'outcome_counts', counts)
+
+        rates = counts / max(num_episodes(experiment), 1)
+        return {id: dict(zip(OUTCOMES, rates[i])) for i, id in enumerate(experiment.attrs['player_ids'])}
+
+    def compute_final_score_distribution(self, experiment: h5py.File) -> dict:
+        """
+        Number of episodes ending with each undiscounted return (final score
+        with dense rewards), for every player: {player_id: {score: count}}.
+        """
+        name = 'final_score_distribution'
+        start, returns, _ = self._new_episode_returns(experiment, name)
+        scores = np.unique(returns)
+        if start > 0:
+            scores = np.union1d(scores, experiment['analysis'][name]['scores'][:])
+        counts = np.zeros((len(experiment.attrs['player_ids']), len(scores)), dtype=np.int64)
+        if start > 0:
+            stored = experiment['analysis'][name]
+            counts[:, np.searchsorted(scores, stored['scores'][:])] += stored['counts'][:]
+        for i, player_returns in enumerate(returns):
+            counts[i] += np.bincount(np.searchsorted(scores, player_returns), minlength=len(scores))
+
+        group = self._replace(experiment, name, group=True)
+        group.create_dataset('scores', data=scores)
+        group.create_dataset('counts', data=counts)
+        group.attrs['episodes_covered'] = num_episodes(experiment)
+        return {id: dict(zip(scores, counts[i])) for i, id in enumerate(experiment.attrs['player_ids'])}
+
+    def compute_first_player_advantage(self, experiment: h5py.File) -> dict:
+        """
+        Win, draw and loss rates of the player moving first in each episode
+        against the other player, and the mean difference of their returns.
+        """
+        player_ids = list(experiment.attrs['player_ids'])
+        if len(player_ids) != 2:
+            raise ValueError(f"First player advantage is only defined for 2 players, got {len(player_ids)}")
+        name = 'first_player_outcome_counts'
+        start, returns, first_players = self._new_episode_returns(experiment, name)
+        counts = np.zeros(len(OUTCOMES), dtype=np.int64)
+        difference_sum = 0.0
+        if start > 0:
+            counts += experiment['analysis'][name][:]
+            difference_sum = experiment['analysis'][name].attrs['score_difference_sum']
+
+        first = self._player_indices(np.array(player_ids), first_players)
+        columns = np.arange(returns.shape[1])
+        differences = returns[first, columns] - returns[1 - first, columns]
+        counts += [(differences > 0).sum(), (differences == 0).sum(), (differences < 0).sum()]
+        difference_sum += differences.sum()
+        self._store_summary(experiment, name, counts, score_difference_sum=difference_sum)
+
+        total = max(num_episodes(experiment), 1)
+        rates = {f"{outcome}_rate": count / total for outcome, count in zip(OUTCOMES, counts)}
+        return {**rates, "mean_score_difference": difference_sum / total}
+
+    def compute_move_telemetry_summary(self, experiment: h5py.File) -> dict:
+        """
+        Mean, median, 95th percentile and maximum of every move statistic logged as
+        telemetry (wall time, nodes searched, ...), for every player:
+        {player_id: {stat: {statistic: value}}}. Percentiles cannot be merged,
+        so the summary is recomputed over all episodes when some were added.
+        """
+        name = 'move_telemetry'
+        fields = get_telemetry_fields(experiment)
+        if not fields:
+            raise ValueError("The experiment has no telemetry")
+        stats = [field.split('/')[-1] for field in fields]
+        player_ids = np.array(experiment.attrs['player_ids'])
+
+        if experiment.get(f"analysis/{name}") is not None and not self.overwrite \
+                and self._episodes_covered(experiment, name) == num_episodes(experiment):
+            summary = experiment['analysis'][name][:]
+        else:
+            chunks = list(iter_step_chunks(experiment, ['players', *fields], self.chunk_size))
+            players = self._player_indices(player_ids, np.concatenate([steps['players'] for _, _, steps in chunks]))
+            summary = np.full((len(player_ids), len(fields), len(TELEMETRY_STATISTICS)), np.nan)
+            for j, field in enumerate(fields):
+                values = np.concatenate([steps[field] for _, _, steps in chunks]).astype(np.float64)
+                for i in range(len(player_ids)):
+                    player_values = values[players == i]
+                    if len(player_values) > 0:
+                        summary[i, j] = [player_values.mean(), np.median(player_values),
+                                         np.percentile(player_values, 95), player_values.max()]
+            self._store_summary(experiment, name, summary, stats=stats, statistics=TELEMETRY_STATISTICS)
+
+        return {id: {stat: dict(zip(TELEMETRY_STATISTICS, summary[i, j])) for j, stat in enumerate(stats)}
+                for i, id in enumerate(experiment.attrs['player_ids'])}
+
+    def get_slowest_moves(self, experiment: h5py.File, count: int = 10, stat: str = "wall_time") -> list[dict]:
+        """
+        The `count` moves with the greatest telemetry `stat`, greatest first,
+        located by episode and step within the episode.
+        """
+        field = f"telemetry/{stat}"
+        if field not in get_telemetry_fields(experiment):
+            raise ValueError(f"The experiment has no telemetry {stat}")
+        indices, values = np.zeros(0, dtype=np.int64), np.zeros(0)
+        offsets, _ = episode_index(experiment)
+        for first, _, steps in iter_step_chunks(experiment, [field], self.chunk_size):
+            chunk_values = steps[field].astype(np.float64)
+            top = np.argsort(-chunk_values, kind='stable')[:count]
+            indices = np.concatenate((indices, offsets[first] + top))
+            values = np.concatenate((values, chunk_values[top]))
+            keep = np.argsort(-values, kind='stable')[:count]
+            indices, values = indices[keep], values[keep]
+
+        episodes = np.searchsorted(offsets, indices, side='right') - 1
+        return [{"episode": int(episode), "step": int(index - offsets[episode]), stat: value}
+                for episode, index, value in zip(episodes, indices, values)]
+
+    def _episodes_covered(self, experiment: h5py.File, name: str) -> int:
+        """
+        Episodes covered by a stored analysis, 0 if it must be computed from scratch.
+        """
+        analysis = experiment.get(f"analysis/{name}")
+        if analysis is None or self.overwrite:
+            return 0
+        return int(analysis.attrs.get('episodes_covered', 0))
+
+    def _replace(self, experiment: h5py.File, name: str, group: bool = False) -> h5py.Group | None:
+        analysis_group = self.make_analysis_group(experiment)
+        if analysis_group.get(name) is not None:
+            del analysis_group[name]
+        return analysis_group.create_group(name) if group else None
+
+    def _store_summary(self, experiment: h5py.File, name: str, data: np.ndarray, **attrs) -> None:
+        self._replace(experiment, name)
+        dataset = experiment['analysis'].create_dataset(name, data=data)
+        dataset.attrs['episodes_covered'] = num_episodes(experiment)
+        for key, value in attrs.items():
+            dataset.attrs[key] = value
+
+    def _new_episode_returns(self, experiment: h5py.File, name: str) -> tuple[int, np.ndarray, np.ndarray]:
+        """
+        First episode not covered by the analysis `name`, and the returns
+        (num_players, new_episodes) and first players of the episodes from there on.
+        """
+        start = self._episodes_covered(experiment, name)
+        self._update_episode_returns(experiment)
+        analysis_group = experiment['analysis']
+        return (start, analysis_group['undiscounted_return_per_episode'][:, start:],
+                analysis_group['first_player_per_episode'][start:])
+
+    def _update_episode_returns(self, experiment: h5py.File) -> None:
+        """
+        Brings the per-episode analyses (returns, mean returns and first players)
+        up to date, going through the steps of the episodes they do not cover yet.
+        """
+        names = ['undiscounted_return_per_episode', 'mean_undiscounted_return_per_episode', 'first_player_per_episode']
+        analysis_group = self.make_analysis_group(experiment)
+        start = min(self._episodes_covered(experiment, name) for name in names)
+        # Results stored before they could be extended are recomputed
+        if any(analysis_group.get(name) is not None and analysis_group[name].maxshape[-1] is not None for name in names):
+            start = 0
+        if start == num_episodes(experiment) and start > 0:
+            return
+
+        player_ids = np.array(experiment.attrs['player_ids'])
+        if self.engine == "vectorized":
+            returns, counts, first_players = self._episode_returns_vectorized(experiment, player_ids, start)
+        else:
+            returns, counts, first_players = self._episode_returns_loop(experiment, player_ids, start)
+        if not counts.all():
+            episode = start + int(np.flatnonzero(counts.all(axis=0) == 0)[0])
+            raise ValueError(f"Episode {episode} has no steps for one of the players {list(player_ids)}")
+
+        for name, data in zip(names, [returns, returns / counts, first_players]):
+            if start == 0:
+                self._replace(experiment, name)
+                analysis_group.create_dataset(name, data=data, maxshape=(*data.shape[:-1], None),
+                                              chunks=(*data.shape[:-1], 1024))
+            else:
+                dataset = analysis_group[name]
+                dataset.resize(start + data.shape[-1], axis=dataset.ndim - 1)
+                dataset[..., start:] = data
+            analysis_group[name].attrs['episodes_covered'] = num_episodes(experiment)
+
+    def _episode_returns_loop(self, experiment: h5py.File, player_ids: np.ndarray,
+                              start: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        returns, counts, first_players = [], [], []
+        for episode in iter_episodes(experiment, fields=['rewards', 'players'], start_episode=start):
+            rewards_per_player = {id: [] for id in player_ids}
+            # Compact files store float32 rewards, which are summed in float64 like raw ones
+            for reward, player in zip(episode['rewards'].astype(np.float64), episode['players']):
+                rewards_per_player[player].append(reward)
+            returns.append([sum(rewards_per_player[id]) for id in player_ids])
+            counts.append([len(rewards_per_player[id]) for id in player_ids])
+            first_players.append(episode['players'][0])
+        return (np.array(returns, dtype=np.float64).reshape(-1, len(player_ids)).T,
+                np.array(counts, dtype=np.int64).reshape(-1, len(player_ids)).T,
+                np.array(first_players, dtype=player_ids.dtype))
+
+    def _episode_returns_vectorized(self, experiment: h5py.File, player_ids: np.ndarray,
+                                    start: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Per-player sums and counts of every episode, grouped with bincount.
+        Chunks hold whole episodes and bincount adds the rewards of a group in
+        step order, so the sums are the same as those of the loop engine.
+        """
+        returns, counts, first_players = [], [], []
+        for _, lengths, steps in iter_step_chunks(experiment, ['rewards', 'players'], self.chunk_size, start):
+            episodes = np.repeat(np.arange(len(lengths)), lengths)
+            players = self._player_indices(player_ids, steps['players'])
+            groups = episodes * len(player_ids) + players
+            num_groups = len(lengths) * len(player_ids)
+            returns.append(np.bincount(groups, weights=steps['rewards'].astype(np.float64), minlength=num_groups))
+            counts.append(np.bincount(groups, minlength=num_groups))
+            first_players.append(steps['players'][np.cumsum(lengths) - lengths])
+        if not returns:
+            return (np.zeros((len(player_ids), 0)), np.zeros((len(player_ids), 0), dtype=np.int64),
+                    np.zeros(0, dtype=player_ids.dtype))
+        return (np.concatenate(returns).reshape(-1, len(player_ids)).T,
+                np.concatenate(counts).reshape(-1, len(player_ids)).T,
+                np.concatenate(first_players).astype(player_ids.dtype))
+
+    def _player_indices(self, player_ids: np.ndarray, players: np.ndarray) -> np.ndarray:
+        """Index of every step's player in `player_ids`."""
+        order = np.argsort(player_ids)
+        positions = np.minimum(np.searchsorted(player_ids, players, sorter=order), len(player_ids) - 1)
+        indices = order[positions]
+        if not np.array_equal(player_ids[indices], players):
+            raise ValueError(f"Steps of players not in {list(player_ids)}")
+        return indices
@@ -0,0 +1,3 @@
+from .suite import run_benchmarks, compare_results, save_results, load_results
+
+__all__ = ['run_benchmarks', 'compare_results', 'save_results', 'load_results']
\ No newline at end of file
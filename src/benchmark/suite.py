@@ -0,0 +1,289 @@
+'''
+Performance benchmarks of the env, search, logging and analysis hot paths,
+and of the startup of the processes running them.
+
+Every benchmark produces named records of the form
+    {"value": float, "unit": str, "higher_is_better": bool}
+Results are saved as JSON along with some metadata, and can be compared
+against a saved baseline to flag regressions.
+'''
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+import h5py
+import numpy as np
+
+from src.agents import MinimaxAgent, AlphaBetaMinimaxAgent, MCTSAgent
+from src.analyzer import BaseAnalyzer
+from src.config.factory import make_env
+from src.environments import TwoDims, ThreeDims
+from src.logging.logger import Logger
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+# Programs timed from the start of a fresh interpreter, see benchmark_startup.
+# "worker" is what a worker process of the generation script runs.
+STARTUP_PROGRAMS = {
+    "python": "pass",
+    "import_factory": "import src.config.factory",
+    "worker": """
+from src.config.factory import make_env, make_agent
+make_env({"name": "4CE-ThreeDims", "max_timesteps": 27, "kwargs": {}})
+make_agent({"name": "AlphaBetaMinimaxAgent", "kwargs": {"search_depth": 4, "tt_size": 1 << 16}})
+make_agent({"name": "RandomAgent", "kwargs": {}})
+""",
+    "build_from_configs": """
+from src.config.factory import build_env, build_agent
+build_env("configs/games/twodims_default.yml")
+build_agent("configs/agents/alphabeta.yml")
+build_agent("configs/agents/random.yml")
+"""
+}
+
+
+def measure(fn: Callable[[], Any], number: int, repeat: int = 3) -> float:
+    '''
+    Seconds per call of `fn`, the best of `repeat` runs of `number` calls.
+    '''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def _record(value: float, unit: str, higher_is_better: bool) -> dict:
+    return {"value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _random_games(env: Any, num_games: int, rng: np.random.Generator) -> list[np.ndarray]:
+    '''
+    Orders in which the cells are played in `num_games` random full games.
+    '''
+    cells = np.argwhere(env.get_action_mask(env.get_board_state()))
+    return [cells[rng.permutation(len(cells))] for _ in range(num_games)]
+
+
+def _midgame_board(env: Any, rng: np.random.Generator) -> np.ndarray:
+    env.reset()
+    for action in _random_games(env, 1, rng)[0][:env.get_board_state().size // 2]:
+        env.step(action)
+    return env.get_board_state().copy()
+
+
+def benchmark_env(env_class: type, quick: bool) -> dict[str, dict]:
+    rng = np.random.default_rng(0)
+    env = env_class()
+    name = f"env.{env_class.__name__}"
+    scale = 1 if quick else 10
+    records = {}
+
+    games = _random_games(env, 20 * scale, rng)
+    def play_games():
+        for game in games:
+            env.reset()
+            for action in game:
+                env.step(action)
+    seconds = measure(play_games, number=1)
+    records[f"{name}.step"] = _record(sum(len(game) for game in games) / seconds, "steps/s", True)
+
+    env.reset()
+    board, action = env.get_board_state(), games[0][0]
+    seconds = measure(lambda: env.simulate_step(board, 0, action), number=200 * scale)
+    records[f"{name}.simulate_step"] = _record(1 / seconds, "calls/s", True)
+
+    board = _midgame_board(env, rng)
+    seconds = measure(lambda: env.get_score(board, 0), number=200 * scale)
+    records[f"{name}.get_score"] = _record(1 / seconds, "calls/s", True)
+    seconds = measure(lambda: env.get_action_mask(board), number=1000 * scale)
+    records[f"{name}.get_action_mask"] = _record(1 / seconds, "calls/s", True)
+    return records
+
+
+def benchmark_search(agent_class: type, env_class: type, depths: list[int], repeat: int = 3,
+                     **agent_kwargs) -> dict[str, dict]:
+    '''
+    Time and nodes per second of the first move of a game, at every depth,
+    the best of `repeat` searches by fresh agents.
+    '''
+    records = {}
+    for depth in depths:
+        env = env_class()
+        observation, _ = env.reset()
+        seconds = np.inf
+        for _ in range(repeat):
+            agent = agent_class(search_depth=depth, **agent_kwargs)
+            start = time.perf_counter()
+            agent.choose_action(env, [observation])
+            seconds = min(seconds, time.perf_counter() - start)
+        name = f"search.{agent_class.__name__}.{env_class.__name__}.depth{depth}"
+        records[f"{name}.time_per_move"] = _record(seconds, "s", False)
+        records[f"{name}.nodes_per_s"] = _record(agent.nodes_searched / seconds, "nodes/s", True)
+    return records
+
+
+def benchmark_mcts(env_class: type, num_simulations: list[int], repeat: int = 3) -> dict[str, dict]:
+    '''
+    Time and simulations per second of the first move of a game, for every
+    number of simulations, the best of `repeat` searches by fresh agents.
+    '''
+    records = {}
+    for simulations in num_simulations:
+        env = env_class()
+        observation, _ = env.reset()
+        seconds = np.inf
+        for _ in range(repeat):
+            agent = MCTSAgent(num_simulations=simulations)
+            start = time.perf_counter()
+            agent.choose_action(env, [observation])
+            seconds = min(seconds, time.perf_counter() - start)
+        name = f"search.MCTSAgent.{env_class.__name__}.simulations{simulations}"
+        records[f"{name}.time_per_move"] = _record(seconds, "s", False)
+        records[f"{name}.simulations_per_s"] = _record(simulations / seconds, "simulations/s", True)
+    return records
+
+
+def benchmark_startup(quick: bool) -> dict[str, dict]:
+    '''
+    Wall time of fresh interpreter processes running each of STARTUP_PROGRAMS
+    (the best of several runs), and the rate of env creation in this process.
+    '''
+    repeat = 3 if quick else 10
+    records = {}
+    for name, program in STARTUP_PROGRAMS.items():
+        code = f"import sys; sys.path.insert(0, {str(PROJECT_ROOT)!r})\n{program}"
+        seconds = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=PROJECT_ROOT)
+            seconds = min(seconds, time.perf_counter() - start)
+        records[f"startup.{name}.time"] = _record(seconds, "s", False)
+
+    config = {"name": "4CE-ThreeDims", "max_timesteps": 27, "kwargs": {}}
+    seconds = measure(lambda: make_env(config), number=100 if quick else 1000)
+    records["startup.make_env.ThreeDims"] = _record(1 / seconds, "envs/s", True)
+    return records
+
+
+def _random_episodes(env: Any, num_episodes: int, rng: np.random.Generator) -> list[tuple]:
+    '''
+    Random full games in the format of Logger.log_episode.
+    '''
+    episodes = []
+    for game in _random_games(env, num_episodes, rng):
+        env.reset()
+        steps = []
+        for action in game:
+            player = env.get_current_player()
+            observation, reward, _, _, _ = env.step(action)
+            steps.append((env.get_board_state().copy(), player, observation["board"].copy(), action, reward))
+        episodes.append(tuple(np.array(column) for column in zip(*steps)))
+    return episodes
+
+
+def benchmark_logging(quick: bool) -> dict[str, dict]:
+    rng = np.random.default_rng(0)
+    episodes = _random_episodes(ThreeDims(), 200 if quick else 2000, rng)
+    records = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        for profile in ["raw", "compact"]:
+            start = time.perf_counter()
+            with Logger(log_dir, profile, storage_profile=profile) as logger:
+                logger.log_player_ids([0, 1])
+                for episode in episodes:
+                    logger.log_episode(*episode)
+            seconds = time.perf_counter() - start
+            records[f"logging.Logger.{profile}.episodes_per_s"] = _record(len(episodes) / seconds, "episodes/s", True)
+
+        with h5py.File(Path(log_dir) / "raw.h5", 'a') as experiment:
+            for engine in BaseAnalyzer.engines:
+                analyzer = BaseAnalyzer(overwrite=True, engine=engine)
+                seconds = measure(lambda: analyzer.compute_mean_undiscounted_return_per_episode(experiment), number=1)
+                records[f"analysis.BaseAnalyzer.{engine}.episodes_per_s"] = _record(len(episodes) / seconds, "episodes/s", True)
+    return records
+
+
+def get_benchmarks(quick: bool) -> dict[str, Callable[[], dict[str, dict]]]:
+    '''
+    Benchmark groups by name, each returning its records when called.
+    '''
+    minimax_depths = [1, 2] if quick else [1, 2, 3, 4]
+    alphabeta_depths = [1, 2, 3] if quick else [1, 2, 3, 4, 5, 6]
+    return {
+        "env.TwoDims": lambda: benchmark_env(TwoDims, quick),
+        "env.ThreeDims": lambda: benchmark_env(ThreeDims, quick),
+        "search.MinimaxAgent.TwoDims": lambda: benchmark_search(MinimaxAgent, TwoDims, minimax_depths),
+        "search.AlphaBetaMinimaxAgent.TwoDims": lambda: benchmark_search(AlphaBetaMinimaxAgent, TwoDims, alphabeta_depths),
+        "search.AlphaBetaMinimaxAgent.ThreeDims": lambda: benchmark_search(AlphaBetaMinimaxAgent, ThreeDims, [1, 2] if quick else [1, 2, 3]),
+        "search.MCTSAgent.ThreeDims": lambda: benchmark_mcts(ThreeDims, [100] if quick else [100, 1000]),
+        "logging": lambda: benchmark_logging(quick),
+        "startup": lambda: benchmark_startup(quick)
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(quick: bool = False, pattern: Optional[str] = None) -> dict:
+    '''
+    Runs the benchmark groups whose name contains `pattern` (all by default).
+    '''
+    results = {}
+    for name, benchmark in get_benchmarks(quick).items():
+        if pattern is None or pattern in name:
+            results.update(benchmark())
+    return {
+        "metadata": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "quick": quick
+        },
+        "results": results
+    }
+
+
+def save_results(results: dict, path: str | Path) -> None:
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str | Path) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float = 0.2) -> list[dict]:
+    '''
+    Records of `current` that are more than `tolerance` (relative) slower than
+    in `baseline`. The slowdown is baseline/current for throughputs and
+    current/baseline for times. Records missing from either side are skipped.
+    '''
+    regressions = []
+    for name, record in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or base["value"] <= 0 or record["value"] <= 0:
+            continue
+        if record["higher_is_better"]:
+            slowdown = base["value"] / record["value"]
+        else:
+            slowdown = record["value"] / base["value"]
+        if slowdown > 1 + tolerance:
+            regressions.append({"name": name, "baseline": base["value"], "current": record["value"],
+                                "unit": record["unit"], "slowdown": slowdown})
+    return regressions
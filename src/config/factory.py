@@ -3,22 +3,21 @@ Factory functions for creating
     - env
     - agent (?)
 objects.
+
+build_env and build_agent read a config file, make_env and make_agent take
+an already parsed config (a dict, e.g. `env.config`). The latter need neither
+yaml nor pydantic, which makes them the cheap path for worker processes.
+Environment and agent modules are only imported when first built
+(see src/environments/registry.py and src/agents/__init__.py).
 '''
 from typing import Any
 from pathlib import Path
-from yaml import safe_load
-import gymnasium as gym
-
-from .schemas import GameConfig, AgentConfig, GenerationConfig
-
-import src.agents.random
-import src.agents.minimax
-import src.agents.alphabeta
 
-CONFIG_SCHEMAS   = [GameConfig, AgentConfig, GenerationConfig]
-AGENT_SUBMODULES = [src.agents.random, src.agents.minimax, src.agents.alphabeta]
+import src.agents
+from src.environments.registry import make_env as make_registered_env
 
 def parse_config(path: str | Path, config_schema: Any) -> Any | Exception:
+    from yaml import safe_load
     if type(path) == str:
         path = Path(path)
     if path.is_file():
@@ -30,20 +29,26 @@ def parse_config(path: str | Path, config_schema: Any) -> Any | Exception:
         raise Exception(f"Invalid filepath provided: {path}")
 
 def build_env(path: str | Path) -> Any:
-    config = parse_config(path, GameConfig)
-    env = gym.make(config.name, max_episode_steps=config.max_timesteps, **config.kwargs)
-    env = env.unwrapped
+    from .schemas import GameConfig
+    return make_env(dict(parse_config(path, GameConfig)))
+
+def make_env(config: dict) -> Any:
+    kwargs = config.get("kwargs") or {}
+    env = make_registered_env(config["name"], max_timesteps=config.get("max_timesteps"), **kwargs)
     env.set_config(dict(config))
     return env
 
 def build_agent(path: str | Path) -> Any | Exception:
-    config = parse_config(path, AgentConfig)
-    for submodule in AGENT_SUBMODULES:
-            if hasattr(submodule, config.name):
-                try:
-                    agent = getattr(submodule, config.name)(**config.kwargs)
-                    agent.set_config(dict(config))
-                except:
-                    raise Exception(f'Invalid keyword argument among {config.kwargs}')
-                return agent
-    raise Exception(f"Agent {config.name} does not exist.")
\ No newline at end of file
+    from .schemas import AgentConfig
+    return make_agent(dict(parse_config(path, AgentConfig)))
+
+def make_agent(config: dict) -> Any | Exception:
+    if config["name"] not in src.agents.__all__:
+        raise Exception(f"Agent {config['name']} does not exist.")
+    agent_class = getattr(src.agents, config["name"])
+    try:
+        agent = agent_class(**config["kwargs"])
+        agent.set_config(dict(config))
+    except:
+        raise Exception(f'Invalid keyword argument among {config["kwargs"]}')
+    return agent
@@ -9,6 +9,13 @@ class GenerationConfig(BaseModel):
     game: str | Path
     log_dir: str | Path
     experiment_name: Optional[str] = None
+    workers: int = 1
+    seed: Optional[int] = None
+    storage_profile: str = "raw"
+    compression: Optional[str] = None
+    compression_opts: Optional[int] = None
+    shuffle: bool = False
+    async_logging: bool = False
 
 class AgentConfig(BaseModel):
     name: str
@@ -17,4 +24,14 @@ class AgentConfig(BaseModel):
 class GameConfig(BaseModel):
     name: str
     max_timesteps: Optional[int] = None
-    kwargs: Optional[dict] = {}
\ No newline at end of file
+    kwargs: Optional[dict] = {}
+
+class TournamentConfig(BaseModel):
+    agents: list[str | Path]
+    game: str | Path
+    results: str | Path
+    games_per_pairing: int = 10
+    workers: int = 1
+    seed: int = 42
+    num_bootstrap: int = 200
+    confidence: float = 0.95
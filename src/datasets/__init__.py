@@ -0,0 +1,3 @@
+from .trajectory import TrajectoryDataset
+
+__all__ = ['TrajectoryDataset']
\ No newline at end of file
@@ -0,0 +1,221 @@
+'''
+Minibatches of transitions sampled from experiment files written by Logger.
+
+The steps of all episodes of all files are indexed globally, in file order.
+Boards are kept in a single buffer in which every episode is preceded by
+its initial board, so that the board before step i is at position
+i + (episode of i) and the board after it just behind. Transitions of
+one episode thus map to contiguous slices of the buffer.
+
+The buffers are either preloaded in memory or written once to .npy files
+and memory-mapped, in which case they are reused as long as the source
+files do not change.
+'''
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+import h5py
+import numpy as np
+
+from src.enums.game import BoardEnum
+from src.logging.reader import episode_index, get_field_spec, iter_step_chunks
+
+# Step fields kept in the buffers, besides the boards
+FIELDS = ['players', 'actions', 'rewards']
+
+
+class TrajectoryDataset:
+    caches = ["memory", "mmap"]
+
+    def __init__(self, paths: str | Path | list[str | Path], cache: str = "memory",
+                 cache_dir: Optional[str | Path] = None, chunk_size: int = 1 << 20,
+                 random_seed: int = 42) -> None:
+        '''
+        `paths` are one or more experiment files. With `cache` "memory" the steps
+        are loaded in memory, with "mmap" they are written to `cache_dir` once
+        and memory-mapped. Files are read in chunks of about `chunk_size` steps.
+        '''
+        if cache not in self.caches:
+            raise ValueError(f"cache must be one of {self.caches}, got {cache}")
+        if cache == "mmap" and cache_dir is None:
+            raise ValueError("The mmap cache requires a cache_dir")
+        self.paths = [Path(paths)] if isinstance(paths, (str, Path)) else [Path(path) for path in paths]
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(random_seed)
+
+        self._cdf = None # Cumulative priorities, for prioritized sampling
+
+        if cache == "mmap":
+            self.cache_path = Path(cache_dir) / self._cache_key()
+            if not (self.cache_path / "index.json").is_file():
+                self._load()
+            self._open_cache()
+        else:
+            self.cache_path = None
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.rewards)
+
+    @property
+    def num_episodes(self) -> int:
+        return len(self.episode_offsets)
+
+    def _cache_key(self) -> str:
+        '''
+        Hash of the source files' paths, sizes and modification times.
+        '''
+        sources = [(str(path.resolve()), path.stat().st_size, path.stat().st_mtime_ns) for path in self.paths]
+        return hashlib.sha256(json.dumps(sources).encode()).hexdigest()[:16]
+
+    def _allocate(self, name: str, shape: tuple, dtype: np.dtype) -> np.ndarray:
+        if self.cache_path is None:
+            return np.empty(shape, dtype=dtype)
+        return np.lib.format.open_memmap(self.cache_path / f"{name}.npy", mode='w+', dtype=dtype, shape=shape)
+
+    def _load(self) -> None:
+        '''
+        Reads every file in chunks into the (memory or memory-mapped) buffers.
+        '''
+        files = [h5py.File(path, 'r') for path in self.paths]
+        try:
+            lengths = np.concatenate([episode_index(f)[1] for f in files]).astype(np.int64)
+            num_steps = int(lengths.sum())
+            # Files of either layout, see src/logging/reader.py
+            specs = {field: [spec for spec in (get_field_spec(f, field) for f in files) if spec is not None]
+                     for field in ['states', *FIELDS]}
+            if not specs['states']:
+                raise ValueError(f"No episodes to load in {[str(path) for path in self.paths]}")
+            board_shape = specs['states'][0][0]
+            dtypes = {field: np.result_type(*[dtype for _, dtype in field_specs]) for field, field_specs in specs.items()}
+
+            if self.cache_path is not None:
+                self.cache_path.mkdir(parents=True, exist_ok=True)
+            boards = self._allocate("boards", (num_steps + len(lengths), *board_shape), dtypes['states'])
+            buffers = {field: self._allocate(field, (num_steps, *specs[field][0][0]), dtypes[field])
+                       for field in FIELDS}
+
+            step, episode = 0, 0
+            for f in files:
+                for _, chunk_lengths, chunk in iter_step_chunks(f, ['states', *FIELDS], self.chunk_size):
+                    end = step + len(chunk['rewards'])
+                    for field in FIELDS:
+                        buffers[field][step:end] = chunk[field]
+                    # Initial boards: the first board of each episode without its move
+                    firsts = np.cumsum(chunk_lengths) - chunk_lengths
+                    initial = chunk['states'][firsts].reshape(len(firsts), -1)
+                    cells = np.ravel_multi_index(tuple(chunk['actions'][firsts].T), board_shape)
+                    initial[np.arange(len(firsts)), cells] = BoardEnum.EMPTY.value
+                    # Board positions of the steps, shifted by one per episode started so far
+                    positions = step + episode + np.arange(end - step) + np.repeat(np.arange(len(chunk_lengths)), chunk_lengths)
+                    boards[positions + 1] = chunk['states']
+                    boards[step + episode + firsts + np.arange(len(firsts))] = initial.reshape(-1, *board_shape)
+                    step, episode = end, episode + len(chunk_lengths)
+        finally:
+            for f in files:
+                f.close()
+
+        self.boards = boards
+        for field in FIELDS:
+            setattr(self, field, buffers[field])
+        self.episode_offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        self.episode_lengths = lengths
+
+        if self.cache_path is not None:
+            for buffer in [boards, *buffers.values()]:
+                buffer.flush()
+            np.save(self.cache_path / "episode_lengths.npy", lengths)
+            # Written last, marks the cache as complete
+            with open(self.cache_path / "index.json", 'w') as f:
+                json.dump({"paths": [str(path) for path in self.paths], "num_steps": num_steps,
+                           "num_episodes": len(lengths)}, f)
+
+    def _open_cache(self) -> None:
+        self.boards = np.load(self.cache_path / "boards.npy", mmap_mode='r')
+        for field in FIELDS:
+            setattr(self, field, np.load(self.cache_path / f"{field}.npy", mmap_mode='r'))
+        self.episode_lengths = np.load(self.cache_path / "episode_lengths.npy")
+        self.episode_offsets = np.concatenate(([0], np.cumsum(self.episode_lengths)[:-1])).astype(np.int64)
+
+    def set_priorities(self, priorities: Optional[np.ndarray]) -> None:
+        '''
+        Sampling probabilities of the steps, proportional to `priorities` (one per step).
+        None goes back to uniform sampling.
+        '''
+        if priorities is None:
+            self._cdf = None
+            return
+        priorities = np.asarray(priorities, dtype=np.float64)
+        if priorities.shape != (len(self),):
+            raise ValueError(f"Expected {len(self)} priorities, got shape {priorities.shape}")
+        if (priorities < 0).any() or priorities.sum() <= 0:
+            raise ValueError("Priorities must be non-negative with a positive sum")
+        self._cdf = np.cumsum(priorities)
+
+    def sample(self, batch_size: int) -> dict[str, np.ndarray]:
+        '''
+        Batch of `batch_size` transitions drawn with replacement, uniformly or
+        according to the priorities. Also holds the sampled `indices`, and their
+        sampling `probabilities` when sampling by priority.
+        '''
+        if self._cdf is None:
+            indices = self.rng.integers(0, len(self), size=batch_size)
+            batch = self.get_batch(indices)
+        else:
+            total = self._cdf[-1]
+            indices = np.searchsorted(self._cdf, self.rng.random(batch_size) * total, side='right')
+            indices = np.minimum(indices, len(self) - 1)
+            batch = self.get_batch(indices)
+            previous = np.where(indices > 0, self._cdf[np.maximum(indices - 1, 0)], 0.0)
+            batch["probabilities"] = (self._cdf[indices] - previous) / total
+        return batch
+
+    def get_batch(self, indices: np.ndarray | slice) -> dict[str, np.ndarray]:
+        '''
+        Transitions of the steps `indices`:
+            state        : board before the step
+            player       : player moving
+            action       : action played
+            reward       : reward of the action
+            next_state   : board after the step
+            mask         : valid actions of `state`
+            done         : whether the step is the last of its episode
+        With a slice of steps, the fields are views of the buffers, boards included
+        if the slice lies within one episode.
+        '''
+        if isinstance(indices, slice):
+            start, stop, step = indices.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported")
+            episode = self._episodes_of(np.array([start, max(stop - 1, start)]))
+            if stop > start and episode[0] == episode[1]:
+                position = start + episode[0]
+                states = self.boards[position:position + stop - start]
+                next_states = self.boards[position + 1:position + 1 + stop - start]
+                return self._batch(indices, np.arange(start, stop), states, next_states)
+            indices = np.arange(start, stop)
+
+        indices = np.asarray(indices, dtype=np.int64)
+        positions = indices + self._episodes_of(indices)
+        return self._batch(indices, indices, self.boards[positions], self.boards[positions + 1])
+
+    def _batch(self, selection: np.ndarray | slice, indices: np.ndarray,
+               states: np.ndarray, next_states: np.ndarray) -> dict[str, np.ndarray]:
+        episodes = self._episodes_of(indices)
+        last_steps = self.episode_offsets[episodes] + self.episode_lengths[episodes] - 1
+        return {
+            "indices": indices,
+            "state": states,
+            "player": self.players[selection],
+            "action": self.actions[selection],
+            "reward": self.rewards[selection],
+            "next_state": next_states,
+            "mask": states == BoardEnum.EMPTY.value,
+            "done": indices == last_steps
+        }
+
+    def _episodes_of(self, indices: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.episode_offsets, indices, side='right') - 1
@@ -1,26 +1,24 @@
-import sys
-from pathlib import Path
+'''
+The game environments, built by name through the registry (see registry.py).
 
-project_root = Path(__file__).parent.parent.parent.parent
-sys.path.insert(0, str(project_root))
+The environment classes are imported from their modules on first access,
+so that building one env does not import the others.
+'''
+from importlib import import_module
+from .registry import ENV_REGISTRY, make_env, register_envs
 
-from gymnasium.envs.registration import register
-from .two_dims import TwoDims
-from .three_dims import ThreeDims
+_ENV_MODULES = {
+    'TwoDims': '.two_dims',
+    'ThreeDims': '.three_dims',
+    'NDims': '.n_dims',
+    'BatchedTwoDims': '.batched',
+    'BatchedThreeDims': '.batched',
+    'BatchedNDims': '.batched'
+}
 
-def register_envs():
-    register(
-        id='4CE-TwoDims',
-        entry_point='4CE-Reloaded.src.environments.two_dims:TwoDims',
-        max_episode_steps=9
-    )
+def __getattr__(name: str) -> type:
+    if name in _ENV_MODULES:
+        return getattr(import_module(_ENV_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__} has no attribute {name}")
 
-    register(
-        id='4CE-ThreeDims',
-        entry_point='4CE-Reloaded.src.environments.three_dims:ThreeDims',
-        max_episode_steps=27
-    )
-
-register_envs()
-
-__all__ = ['TwoDims', 'ThreeDims']
+__all__ = [*_ENV_MODULES, 'ENV_REGISTRY', 'make_env', 'register_envs']
\ No newline at end of file
@@ -5,6 +5,7 @@ from gymnasium import spaces
 import numpy as np
 from typing import Optional
 from src.enums.game import RoleEnum, BoardEnum
+from src.environments.lines import LineTables, get_line_tables
 from src.environments.render.printing import (
     clear_terminal,
     print_board
@@ -16,15 +17,26 @@ class BaseEnv(gym.Env, ABC):
 
     size = 3
 
+    # Board representations get_score can run on:
+    #   - "ndarray": fancy-indexes the board array with the scoring cases
+    #   - "bitboard": each player's marks are an integer bitmask, and
+    #                 scoring lines are precomputed line masks
+    backends = ["ndarray", "bitboard"]
+
     def __init__(self, render_mode: Optional[str] = None, 
                  max_timesteps: Optional[int] = None,
                  reward_type: Optional[str] = "dense",
                  bonus: Optional[bool] = False,
-                 bonus_value: Optional[float] = 100, **kwargs) -> None:
+                 bonus_value: Optional[float] = 100,
+                 backend: Optional[str] = "ndarray", **kwargs) -> None:
         super().__init__()
 
         self.config = None
 
+        if backend not in self.backends:
+            raise Exception(f"Backend {backend} is not supported, choose one of {self.backends}.")
+        self.backend = backend
+
         self.render_mode = render_mode
         self.max_timesteps = np.inf if max_timesteps is None else max_timesteps
         self.reward_type = reward_type
@@ -114,6 +126,11 @@ class BaseEnv(gym.Env, ABC):
             RoleEnum.O.value: 0
         }
 
+        self._bitboards = {
+            RoleEnum.X.value: 0,
+            RoleEnum.O.value: 0
+        }
+
         observation = self._get_obs()
         info = self._get_info()
 
@@ -147,6 +164,24 @@ class BaseEnv(gym.Env, ABC):
         }
         return observation, reward
 
+    def apply_action(self, state: np.array, player: int, action: np.array) -> int | Exception:
+        '''
+        In-place counterpart of simulate_step, meant for search: places the mark
+        of `player` on `state` itself (not on the internal board of the env)
+        and returns the points the move scores, i.e. the change in the player's score.
+        Pair every call with undo_action to restore the board.
+        '''
+        action = tuple(action)
+        if state[action] != BoardEnum.EMPTY.value:
+            raise Exception(f"Invalid action {action} encountered.")
+        state[action] = player
+        return self.get_score_gain(state, player, action)
+
+    def undo_action(self, state: np.array, action: np.array) -> None:
+        '''
+        Reverts apply_action by emptying the square of `action` on `state`.
+        '''
+        state[tuple(action)] = BoardEnum.EMPTY.value
 
     def step(self, 
              action: np.array) -> tuple[dict, float, bool, bool, dict] | Exception:
@@ -167,7 +202,14 @@ class BaseEnv(gym.Env, ABC):
 
         reward = self._get_reward(ground_state, self._current_player, action, self._board_state)
 
-        self._score[self._current_player] = self.get_score(self._board_state, self._current_player)
+        # Only lines through the square just played can change the score
+        if self.backend == "bitboard":
+            cell = np.ravel_multi_index(tuple(action), self._board_state.shape)
+            self._bitboards[self._current_player] |= 1 << int(cell)
+            score_gain = self._count_lines(self._bitboards[self._current_player], self._cell_line_masks[cell])
+        else:
+            score_gain = self.get_score_gain(self._board_state, self._current_player, action)
+        self._score[self._current_player] += score_gain
 
         terminated = self.terminal_state(self._board_state)
         truncated = self.timestep >= self.max_timesteps
@@ -217,6 +259,8 @@ class BaseEnv(gym.Env, ABC):
         Calculating total score of a player according to
         standard rules of Tic-Tac-Toe, 3-in-a-row scores a point.
         '''
+        if self.backend == "bitboard":
+            return self._count_lines(self.to_bitboard(state, player))
 
         # Bring the last axis to the front. This is where we can index into the array
         scoring_positions = np.transpose(self._scoring_cases, axes=(2, 0, 1)) # (N, 3, size) -> (N, size, 3)
@@ -232,7 +276,81 @@ class BaseEnv(gym.Env, ABC):
 
         total_score = scores.sum()
         return total_score
+
+    def get_scores(self, states: np.array, player: int) -> np.array:
+        '''
+        Batched get_score: the score of `player` on each of the N boards
+        of `states` (N, *board_shape), computed at once over the line table.
+        '''
+        flat_states = np.reshape(states, (len(states), -1))
+        return np.all(flat_states[:, self._line_indices] == player, axis=2).sum(axis=1) # (N)
+
+    def _build_line_tables(self) -> None:
+        '''
+        Precompute lookup tables derived from the scoring cases.
+        Must be called by the subclass once `_scoring_cases` is set.
+
+            - _line_indices: (N, 3) flat indices of the cells of each line
+            - _line_masks: the same lines as integer bitmasks over the flattened board
+            - _cell_lines: for each flat square, the indices of the lines through it
+            - _cell_line_table: padded (num_cells, max_k, 3) version of the above
+
+        The tables are built once per board and set of lines, and shared
+        by all envs (see src/environments/lines.py).
+        '''
+        board_shape = tuple(self.dimensions * [self.size])
+        self._set_line_tables(get_line_tables(board_shape, self._scoring_cases))
+
+    def _set_line_tables(self, tables: LineTables) -> None:
+        self._line_indices = tables.line_indices
+        self._line_masks = tables.line_masks
+        self._cell_lines = tables.cell_lines
+        self._cell_line_indices = tables.cell_line_indices
+        self._cell_line_masks = tables.cell_line_masks
+        self._cell_line_table = tables.cell_line_table
+
+    def to_bitboard(self, state: np.array, player: int) -> int:
+        '''
+        Encode the marks of `player` as an integer bitmask, where bit i
+        is set iff the i-th square of the flattened board belongs to the player.
+        '''
+        bits = np.packbits(np.ravel(state == player), bitorder="little")
+        return int.from_bytes(bits.tobytes(), "little")
+
+    def _count_lines(self, bitboard: int, line_masks: Optional[list[int]] = None) -> int:
+        '''
+        Number of scoring lines (all of them, or only `line_masks`)
+        fully covered by the bitboard.
+        '''
+        if line_masks is None:
+            line_masks = self._line_masks
+        return sum(1 for line_mask in line_masks if bitboard & line_mask == line_mask)
+
+    def get_score_gain(self, state: np.array, player: int, action: np.array) -> int:
+        '''
+        Points scored by `player` by placing a mark at `action`,
+        where `state` is the board *after* the move.
+        Since only the lines through the square just played can be
+        completed by the move, only those are checked.
+        '''
+        cell = np.ravel_multi_index(tuple(action), state.shape)
+        lines = self._cell_line_indices[cell] # (k, 3)
+        return int(np.all(np.ravel(state)[lines] == player, axis=1).sum())
     
+    def get_move_gains(self, state: np.array, player: int) -> np.array:
+        '''
+        Points `player` would score by playing each square of `state`,
+        as a flat array over the squares (0 for occupied squares).
+        A move scores a line iff it fills the last empty square of
+        a line otherwise owned by the player.
+        '''
+        line_values = np.ravel(state)[self._line_indices] # (N, 3)
+        owned = (line_values == player).sum(axis=1)
+        empty = line_values == BoardEnum.EMPTY.value
+        completing = (owned == self._line_indices.shape[1] - 1) & (empty.sum(axis=1) == 1)
+        cells = self._line_indices[completing][empty[completing]]
+        return np.bincount(cells, minlength=state.size)
+
     def get_board_state(self) -> np.array:
         return self._board_state
     
@@ -0,0 +1,165 @@
+'''
+Vectorized versions of the environments, holding N boards of the same game
+and stepping all of them at once with an array of actions.
+'''
+from typing import Optional
+import numpy as np
+from src.enums.game import RoleEnum, BoardEnum
+from .two_dims import TwoDims
+from .three_dims import ThreeDims
+from .n_dims import NDims
+
+
+class BatchedEnv:
+    '''
+    Steps `num_envs` boards in lockstep. Observations, rewards and
+    terminal flags are returned as stacked numpy arrays, there is no
+    per-board Python loop.
+
+    The rules of the game (scoring lines, board shape) are taken from
+    an instance of `env_class`. Only the dense reward is supported.
+    '''
+
+    env_class = None
+
+    def __init__(self, num_envs: int, max_timesteps: Optional[int] = None,
+                 reward_type: Optional[str] = "dense",
+                 bonus: Optional[bool] = False, **kwargs) -> None:
+        if num_envs < 1:
+            raise ValueError(f"num_envs must be >= 1, got {num_envs}")
+        if reward_type != "dense":
+            raise Exception(f"Reward type {reward_type} is not supported in this environment.")
+        if bonus:
+            raise Exception("Bonus rewards are not supported in batched environments.")
+
+        self.num_envs = num_envs
+        self.max_timesteps = np.inf if max_timesteps is None else max_timesteps
+
+        # Single-board env providing the line tables
+        self._env = self.env_class(**kwargs)
+        self.dimensions = self._env.dimensions
+        self.size = self._env.size
+        self.board_shape = tuple(self.dimensions * [self.size])
+        self.num_cells = int(np.prod(self.board_shape))
+
+        self._cell_line_table = self._env._cell_line_table # (num_cells, max_k, 3)
+        self._env_indices = np.arange(num_envs)
+
+        self._players = np.array([RoleEnum.X.value, RoleEnum.O.value])
+
+        self.reset()
+
+    def reset(self, seed: Optional[int] = None,
+              indices: Optional[np.ndarray] = None) -> tuple[dict, dict]:
+        '''
+        Resets all boards, or only the boards at `indices`.
+        '''
+        if seed is not None:
+            self.np_random = np.random.default_rng(seed)
+        elif not hasattr(self, "np_random"):
+            self.np_random = np.random.default_rng()
+
+        if indices is None:
+            # Boards are stored flattened with one extra sentinel square at
+            # the end, which is never owned by a player. Padded rows of the
+            # cell-to-lines table point there and can never score.
+            self._boards = np.full((self.num_envs, self.num_cells + 1), BoardEnum.EMPTY.value, dtype=np.int8)
+            self._boards[:, -1] = BoardEnum.INVALID.value
+            self.timesteps = np.zeros(self.num_envs, dtype=np.int64)
+            self._current_players = np.full(self.num_envs, self._players[0])
+            self._next_players = np.full(self.num_envs, self._players[1])
+            self._scores = np.zeros((self.num_envs, len(self._players)), dtype=np.int64)
+        else:
+            self._boards[indices, :-1] = BoardEnum.EMPTY.value
+            self.timesteps[indices] = 0
+            self._current_players[indices] = self._players[0]
+            self._next_players[indices] = self._players[1]
+            self._scores[indices] = 0
+
+        return self._get_obs(), self._get_info()
+
+    def get_boards(self) -> np.ndarray:
+        '''
+        View of the boards, of shape (num_envs, *board_shape).
+        '''
+        return self._boards[:, :-1].reshape(self.num_envs, *self.board_shape)
+
+    def get_action_masks(self) -> np.ndarray:
+        return self.get_boards() == BoardEnum.EMPTY.value
+
+    def _get_obs(self) -> dict:
+        return {
+            "current_player": self._current_players.copy(),
+            "next_player": self._next_players.copy(),
+            "board": self.get_boards(),
+            "action_mask": self.get_action_masks()
+        }
+
+    def _get_info(self) -> dict:
+        return {
+            "score": self._scores.copy() # (num_envs, num_players)
+        }
+
+    def _to_cells(self, actions: np.ndarray) -> np.ndarray:
+        '''
+        Accepts either coordinates of shape (num_envs, dimensions)
+        or flat square indices of shape (num_envs,).
+        '''
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            return np.ravel_multi_index(tuple(actions.T), self.board_shape)
+        return actions
+
+    def step(self, actions: np.ndarray) -> tuple[dict, np.ndarray, np.ndarray, np.ndarray, dict] | Exception:
+        '''
+        Places the current player's mark on every board, computes
+        the dense rewards through the lines passing the squares played,
+        updates the scores and switches players.
+        '''
+        cells = self._to_cells(actions)
+        boards = self._boards
+        env_indices = self._env_indices
+
+        invalid = boards[env_indices, cells] != BoardEnum.EMPTY.value
+        if np.any(invalid):
+            raise Exception(f"Invalid actions encountered on boards {np.nonzero(invalid)[0].tolist()}.")
+
+        boards[env_indices, cells] = self._current_players
+
+        lines = self._cell_line_table[cells] # (num_envs, max_k, 3)
+        owned = boards[env_indices[:, None, None], lines] == self._current_players[:, None, None]
+        rewards = np.all(owned, axis=2).sum(axis=1)
+
+        self._scores[env_indices, self._current_players] += rewards
+        self.timesteps += 1
+
+        terminated = ~np.any(boards[:, :-1] == BoardEnum.EMPTY.value, axis=1)
+        truncated = self.timesteps >= self.max_timesteps
+
+        self._current_players, self._next_players = self._next_players, self._current_players
+
+        return self._get_obs(), rewards.astype(float), terminated, truncated, self._get_info()
+
+    def sample_actions(self, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        '''
+        Uniformly random valid flat actions, one per board.
+        Boards without empty squares get action -1.
+        '''
+        rng = self.np_random if rng is None else rng
+        empty = self._boards[:, :-1] == BoardEnum.EMPTY.value
+        keys = np.where(empty, rng.random(empty.shape), -1)
+        actions = np.argmax(keys, axis=1)
+        actions[~np.any(empty, axis=1)] = -1
+        return actions
+
+
+class BatchedTwoDims(BatchedEnv):
+    env_class = TwoDims
+
+
+class BatchedThreeDims(BatchedEnv):
+    env_class = ThreeDims
+
+
+class BatchedNDims(BatchedEnv):
+    env_class = NDims
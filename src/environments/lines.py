@@ -0,0 +1,146 @@
+'''
+Scoring lines of n-dimensional boards and the lookup tables derived from them.
+
+A line is `line_length` consecutive squares along a direction of {-1, 0, 1}^dimensions
+(rows, columns, diagonals, ..., space diagonals). Every direction is counted once,
+together with its opposite, which gives ((size + 2)^dimensions - size^dimensions) / 2
+lines when `line_length` equals `size`: 8 for 3x3, 49 for 3x3x3, 76 for 4x4x4
+and 272 for 3x3x3x3.
+
+Tables are built once per board and set of lines and shared by every env
+using them. Tables of enumerated lines are also saved to disk, see load_line_tables.
+'''
+import os
+import tempfile
+from itertools import product
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+# Where load_line_tables saves the tables it builds, unless told otherwise
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent.parent / "cache" / "lines"
+
+_line_table_cache = {}
+
+
+def enumerate_lines(dimensions: int, size: int, line_length: int) -> np.ndarray:
+    '''
+    Coordinates of the squares of every line on a board of `size`^`dimensions`
+    squares, of shape (num_lines, line_length, dimensions).
+    Lines are ordered by direction, then by starting square in row-major order.
+    '''
+    if dimensions < 1 or size < 1:
+        raise ValueError(f"The board needs at least one dimension and one square, got {dimensions} and {size}")
+    if not (1 < line_length <= size):
+        raise ValueError(f"line_length must be in [2, {size}], got {line_length}")
+    steps = np.arange(line_length)
+    starts = np.indices(dimensions * [size]).reshape(dimensions, -1).T # (num_cells, dimensions)
+    lines = []
+    for direction in product([-1, 0, 1], repeat=dimensions):
+        direction = np.array(direction)
+        nonzero = np.flatnonzero(direction)
+        # A direction and its opposite give the same lines, keep the one whose first step is positive
+        if len(nonzero) == 0 or direction[nonzero[0]] < 0:
+            continue
+        ends = starts + (line_length - 1) * direction
+        valid = np.all((ends >= 0) & (ends < size), axis=1)
+        lines.append(starts[valid][:, None, :] + steps[None, :, None] * direction) # (num_starts, line_length, dimensions)
+    return np.concatenate(lines, axis=0)
+
+
+class LineTables:
+    '''
+    Lookup tables of a set of scoring lines (see BaseEnv._build_line_tables):
+
+        - scoring_cases: (N, L, dimensions) coordinates of the squares of each line
+        - line_indices: (N, L) flat indices of the squares of each line
+        - line_masks: the same lines as integer bitmasks over the flattened board
+        - cell_lines: for each flat square, the indices of the lines through it
+        - cell_line_indices: for each flat square, the (k, L) squares of those lines
+        - cell_line_masks: for each flat square, the bitmasks of those lines
+        - cell_line_table: padded (num_cells, max_k, L) version of cell_line_indices
+
+    `cell_line_numbers` (num_cells, max_k) holds the lines through each square,
+    padded with -1. It is derived from the lines when not given.
+    '''
+    def __init__(self, board_shape: tuple[int, ...], scoring_cases: np.ndarray,
+                 cell_line_numbers: Optional[np.ndarray] = None) -> None:
+        self.board_shape = tuple(board_shape)
+        self.scoring_cases = scoring_cases
+        num_cells = int(np.prod(board_shape))
+        self.line_indices = np.ravel_multi_index(tuple(np.moveaxis(scoring_cases, 2, 0)), board_shape) # (N, L)
+        self.line_masks = [sum(1 << int(cell) for cell in line) for line in self.line_indices]
+
+        if cell_line_numbers is None:
+            cell_line_numbers = self._get_cell_line_numbers(num_cells)
+        self.cell_line_numbers = cell_line_numbers
+        counts = (cell_line_numbers >= 0).sum(axis=1)
+        self.cell_lines = [numbers[:count] for numbers, count in zip(cell_line_numbers, counts)]
+        self.cell_line_masks = [[self.line_masks[line] for line in lines] for lines in self.cell_lines]
+
+        # Rows are padded with lines made of the sentinel square `num_cells`,
+        # i.e. one past the last square of the flattened board.
+        padding = cell_line_numbers < 0
+        self.cell_line_table = np.where(padding[:, :, None], num_cells, self.line_indices[cell_line_numbers])
+        self.cell_line_indices = [table[:count] for table, count in zip(self.cell_line_table, counts)] # (k, L) per square
+
+    def _get_cell_line_numbers(self, num_cells: int) -> np.ndarray:
+        line_numbers = np.repeat(np.arange(len(self.line_indices)), self.line_indices.shape[1])
+        cells = self.line_indices.reshape(-1)
+        order = np.argsort(cells, kind='stable') # Lines in increasing order within each square
+        counts = np.bincount(cells, minlength=num_cells)
+        # Position of each (square, line) pair among the lines of its square
+        ranks = np.arange(len(cells)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_line_numbers = np.full((num_cells, counts.max()), -1)
+        cell_line_numbers[cells[order], ranks] = line_numbers[order]
+        return cell_line_numbers
+
+    def save(self, path: str | Path) -> None:
+        '''
+        Saves the lines and the lines through each square, through a temporary
+        file so that envs created concurrently never read a partially written file.
+        '''
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".npz", delete=False) as f:
+            np.savez(f, board_shape=np.array(self.board_shape), scoring_cases=self.scoring_cases,
+                     cell_line_numbers=self.cell_line_numbers)
+        os.replace(f.name, path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> 'LineTables':
+        with np.load(path) as tables:
+            return cls(tuple(tables['board_shape']), tables['scoring_cases'], tables['cell_line_numbers'])
+
+
+def get_line_tables(board_shape: tuple[int, ...], scoring_cases: np.ndarray) -> LineTables:
+    '''
+    Tables of the given lines, built on the first request and shared afterwards.
+    '''
+    key = (tuple(board_shape), scoring_cases.shape, np.ascontiguousarray(scoring_cases).tobytes())
+    if key not in _line_table_cache:
+        _line_table_cache[key] = LineTables(board_shape, scoring_cases)
+    return _line_table_cache[key]
+
+
+def load_line_tables(dimensions: int, size: int, line_length: int,
+                     cache_dir: Optional[str | Path] = None) -> LineTables:
+    '''
+    Tables of the lines of enumerate_lines(dimensions, size, line_length).
+    They are read from `cache_dir` (DEFAULT_CACHE_DIR by default) if they
+    were saved there before, and built and saved otherwise.
+    '''
+    key = (dimensions, size, line_length)
+    if key not in _line_table_cache:
+        cache_dir = DEFAULT_CACHE_DIR if cache_dir is None else Path(cache_dir)
+        path = cache_dir / f"lines_d{dimensions}_s{size}_l{line_length}.npz"
+        if path.is_file():
+            tables = LineTables.load(path)
+        else:
+            tables = LineTables(tuple(dimensions * [size]), enumerate_lines(dimensions, size, line_length))
+            try:
+                tables.save(path)
+            except OSError:
+                pass # The tables are still shared in memory
+        _line_table_cache[key] = tables
+    return _line_table_cache[key]
@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+from .two_dims import TwoDims
+from .lines import load_line_tables
+
+
+class NDims(TwoDims):
+    '''
+    The game on a board of `size`^`dimensions` squares, where every line of
+    `line_length` squares (the whole width of the board by default) scores a point.
+    For example, NDims(dimensions=3, size=4) is 4x4x4 Qubic with 76 lines,
+    and NDims(dimensions=4) the 3x3x3x3 board with 272 lines.
+
+    The lines are enumerated (see src/environments/lines.py) rather than
+    hand-written. Their tables are built once per (dimensions, size, line_length)
+    and saved in `line_cache_dir`, so that creating further envs is nearly free.
+    '''
+
+    def __init__(self, dimensions: int = 4, size: int = 3, line_length: Optional[int] = None,
+                 line_cache_dir: Optional[str | Path] = None,
+                 render_mode: Optional[str] = None, **kwargs) -> None:
+        if dimensions < 1:
+            raise ValueError(f"dimensions must be >= 1, got {dimensions}")
+        if size < 2:
+            raise ValueError(f"size must be >= 2, got {size}")
+        self.dimensions = dimensions
+        self.size = size
+        self.line_length = size if line_length is None else line_length
+        self.line_cache_dir = line_cache_dir
+        self._line_tables = load_line_tables(self.dimensions, self.size, self.line_length, line_cache_dir)
+        super().__init__(render_mode, **kwargs)
+
+    def _get_scoring_cases(self) -> np.array:
+        '''
+        Coordinates of the squares of every line, of shape (N, line_length, dimensions).
+        '''
+        return self._line_tables.scoring_cases
+
+    def _build_line_tables(self) -> None:
+        self._set_line_tables(self._line_tables)
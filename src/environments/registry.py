@@ -0,0 +1,37 @@
+'''
+Registry of the environments by name, the names used in game configs.
+
+Environments are created directly from their class, imported on first use,
+without going through gymnasium's registry and wrappers. register_envs makes
+the same names available to gym.make.
+'''
+from importlib import import_module
+from typing import Any
+
+# Name -> (entry point "module:Class", maximum number of steps of a game)
+ENV_REGISTRY = {
+    '4CE-TwoDims': ('src.environments.two_dims:TwoDims', 9),
+    '4CE-ThreeDims': ('src.environments.three_dims:ThreeDims', 27),
+    '4CE-NDims': ('src.environments.n_dims:NDims', None)
+}
+
+
+def get_env_class(name: str) -> type:
+    if name not in ENV_REGISTRY:
+        raise Exception(f"Environment {name} does not exist, choose one of {list(ENV_REGISTRY)}.")
+    module_name, class_name = ENV_REGISTRY[name][0].split(':')
+    return getattr(import_module(module_name), class_name)
+
+
+def make_env(name: str, **kwargs) -> Any:
+    return get_env_class(name)(**kwargs)
+
+
+def register_envs() -> None:
+    '''
+    Registers the environments with gymnasium, for gym.make.
+    '''
+    from gymnasium.envs.registration import register, registry
+    for name, (entry_point, max_episode_steps) in ENV_REGISTRY.items():
+        if name not in registry:
+            register(id=name, entry_point=entry_point, max_episode_steps=max_episode_steps)
@@ -0,0 +1,113 @@
+'''
+Symmetries of the game boards.
+
+The symmetry group of a board is derived from its scoring cases: every
+combination of axis permutation and axis reflection (the symmetries of the
+hypercube) that maps the set of scoring lines onto itself is kept.
+This gives 8 symmetries for the 3x3 board and 48 for the 3x3x3 cube.
+
+Symmetries are stored as index permutations over the flattened board, so
+transforming a board under the whole group is a single fancy-indexing
+operation.
+'''
+from itertools import permutations, product
+from typing import Any
+import numpy as np
+
+
+class BoardSymmetry:
+    def __init__(self, board_shape: tuple[int, ...], line_indices: np.ndarray) -> None:
+        '''
+        `line_indices` is the (N, 3) array of flat indices of the squares
+        of each scoring line (see BaseEnv._build_line_tables).
+        '''
+        self.board_shape = tuple(board_shape)
+        self.num_cells = int(np.prod(board_shape))
+        dimensions = len(board_shape)
+
+        coordinates = np.indices(board_shape).reshape(dimensions, -1).T # (num_cells, dimensions)
+        lines = {tuple(line) for line in np.sort(line_indices, axis=1)}
+
+        # images[g][c] is the square that square c is sent to by symmetry g
+        images = []
+        for axes in permutations(range(dimensions)):
+            for flips in product([False, True], repeat=dimensions):
+                mapped = coordinates[:, axes]
+                mapped[:, flips] = np.array(board_shape)[list(axes)][list(flips)] - 1 - mapped[:, flips]
+                image = np.ravel_multi_index(tuple(mapped.T), board_shape)
+                mapped_lines = np.sort(image[line_indices], axis=1)
+                if {tuple(line) for line in mapped_lines} == lines:
+                    images.append(image)
+
+        # Gathering a flat board with permutations[g] applies symmetry g:
+        # transformed[images[g][c]] = board[c]  <=>  transformed = board[permutations[g]]
+        self.images = np.array(images) # (G, num_cells)
+        self.permutations = np.argsort(self.images, axis=1) # (G, num_cells)
+        self.num_symmetries = len(images)
+
+        # Boards with values in {0, 1, 2, 3} can be compared lexicographically
+        # through a base-4 code when it fits in 64 bits
+        if self.num_cells <= 31:
+            self._code_weights = 4 ** np.arange(self.num_cells - 1, -1, -1, dtype=np.int64)
+        else:
+            self._code_weights = None
+
+    def transform_all(self, board: np.ndarray) -> np.ndarray:
+        '''
+        All symmetric images of the board, flattened: (G, num_cells).
+        '''
+        return np.ravel(board)[self.permutations]
+
+    def transform(self, board: np.ndarray, symmetry: int) -> np.ndarray:
+        return np.ravel(board)[self.permutations[symmetry]].reshape(self.board_shape)
+
+    def canonicalize(self, board: np.ndarray) -> tuple[np.ndarray, int]:
+        '''
+        Returns the canonical form of the board, i.e. its lexicographically
+        smallest symmetric image, along with the symmetry mapping the board to it.
+        '''
+        images = self.transform_all(board)
+        if self._code_weights is not None:
+            symmetry = int(np.argmin(images.astype(np.int64) @ self._code_weights))
+        else:
+            symmetry = int(np.lexsort(images.T[::-1])[0])
+        return images[symmetry].reshape(self.board_shape), symmetry
+
+    def canonical_key(self, board: np.ndarray) -> bytes:
+        '''
+        Hashable key shared by all boards of the same equivalence class.
+        '''
+        canonical, _ = self.canonicalize(board)
+        return canonical.astype(np.uint8).tobytes()
+
+    def to_canonical_cell(self, cell: int, symmetry: int) -> int:
+        return int(self.images[symmetry, cell])
+
+    def from_canonical_cell(self, cell: int, symmetry: int) -> int:
+        return int(self.permutations[symmetry, cell])
+
+    def to_canonical_action(self, action: np.ndarray, symmetry: int) -> np.ndarray:
+        cell = np.ravel_multi_index(tuple(action), self.board_shape)
+        return np.array(np.unravel_index(self.to_canonical_cell(cell, symmetry), self.board_shape))
+
+    def from_canonical_action(self, action: np.ndarray, symmetry: int) -> np.ndarray:
+        '''
+        Maps an action expressed in the canonical frame back to the frame
+        of the original board.
+        '''
+        cell = np.ravel_multi_index(tuple(action), self.board_shape)
+        return np.array(np.unravel_index(self.from_canonical_cell(cell, symmetry), self.board_shape))
+
+
+_symmetry_cache = {}
+
+def get_symmetry(env: Any) -> BoardSymmetry:
+    '''
+    Symmetry group of the env's board. Groups are computed once per
+    board shape and set of scoring lines.
+    '''
+    board_shape = tuple(env.dimensions * [env.size])
+    key = (board_shape, env._line_indices.tobytes())
+    if key not in _symmetry_cache:
+        _symmetry_cache[key] = BoardSymmetry(board_shape, env._line_indices)
+    return _symmetry_cache[key]
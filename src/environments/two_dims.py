@@ -20,6 +20,7 @@ class TwoDims(BaseEnv):
         self._board_state = deepcopy(self._initial_state)
 
         self._scoring_cases = self._get_scoring_cases()
+        self._build_line_tables()
 
 
     def _get_reward(self, state: np.array, player: int, 
@@ -47,9 +48,13 @@ class TwoDims(BaseEnv):
         '''
         Reward equals the immediate score received due to the action.
         '''
-        previous_score = self.get_score(state, player)
-        new_score = self.get_score(new_state, player)
-        return new_score - previous_score
+        if state[tuple(action)] != BoardEnum.EMPTY.value:
+            # Not a regular move onto an empty square, lines not through
+            # the square might have changed as well
+            previous_score = self.get_score(state, player)
+            new_score = self.get_score(new_state, player)
+            return new_score - previous_score
+        return self.get_score_gain(new_state, player, action)
     
     def _get_bonus(self, state: np.array, player: int) -> float:
         '''
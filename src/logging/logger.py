@@ -1,7 +1,25 @@
 '''
 Main class for logging information about runs of environments.
+
+Layout of the HDF5 file ("columnar"):
+    /configs                attributes holding the JSON configs
+    /steps/<field>          one resizable, chunked dataset per step field
+                            (states, players, observations, actions, rewards),
+                            the steps of all episodes concatenated
+    /episodes/offsets       index of the first step of each episode in /steps
+    /episodes/lengths       number of steps of each episode
+    /steps/telemetry/<stat> per-move statistics of the agents (wall time,
+                            nodes searched, ...), if logged
+
+With the "compact" storage profile, boards and players are stored as uint8,
+actions as int8 and rewards as float32. Any chunk compression is lossless.
+
+Files written before this layout store one group per episode under
+/episodes ("episodic" layout), see src.logging.reader for reading both.
 '''
 import os
+import queue
+import threading
 from pathlib import Path
 from typing import Optional
 import uuid
@@ -9,9 +27,57 @@ import json
 import h5py
 import numpy as np
 
+STEP_FIELDS = ['states', 'players', 'observations', 'actions', 'rewards']
+
+# dtype each step field is stored with, fields missing from a profile keep their own
+STORAGE_PROFILES = {
+    'raw': {},
+    'compact': {
+        'states': np.uint8,
+        'players': np.uint8,
+        'observations': np.uint8,
+        'actions': np.int8,
+        'rewards': np.float32
+    }
+}
+COMPRESSIONS = [None, 'gzip', 'lzf']
+
+# Queue messages to the writer thread, besides episodes
+_FLUSH = 'flush'
+_STOP = 'stop'
+
 class Logger:
-    def __init__(self, log_dir: str | Path, experiment_name: Optional[str]
-                 ) -> None:
+    def __init__(self, log_dir: str | Path, experiment_name: Optional[str],
+                 buffer_size: int = 4096, chunk_size: int = 1024,
+                 storage_profile: str = 'raw', compression: Optional[str] = None,
+                 compression_opts: Optional[int] = None, shuffle: bool = False,
+                 asynchronous: bool = False, queue_size: int = 64) -> None:
+        '''
+        Episodes are buffered in memory and appended to the file in bulk
+        once `buffer_size` steps are pending. `chunk_size` is the number of
+        steps per HDF5 chunk. The file stays open until `close()`.
+
+        `storage_profile` sets the dtypes of the stored step fields (see STORAGE_PROFILES).
+        Values that the profile's dtype cannot hold exactly raise a ValueError.
+        `compression` ("gzip" or "lzf") compresses the chunks, with level
+        `compression_opts` for gzip. `shuffle` adds the byte shuffle filter.
+
+        With `asynchronous`, logged episodes are put on a queue of at most
+        `queue_size` episodes and written by a background thread, so logging
+        only blocks when the queue is full. Arrays given to `log_episode` must
+        not be modified afterwards. Once the writer thread fails, its error is
+        raised by every later call to `log_episode`, `flush()` and `close()`.
+
+        After `close()`, `log_episode` and `flush()` raise an error.
+        '''
+        if storage_profile not in STORAGE_PROFILES:
+            raise ValueError(f"storage_profile must be one of {list(STORAGE_PROFILES)}, got {storage_profile}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {COMPRESSIONS}, got {compression}")
+        if compression_opts is not None and compression != 'gzip':
+            raise ValueError("compression_opts is only supported with gzip compression")
+        if queue_size < 1:
+            raise ValueError(f"queue_size must be >= 1, got {queue_size}")
         self.log_dir = log_dir
         self.unique_id = str(uuid.uuid4())
         if experiment_name is None:
@@ -24,11 +90,30 @@ class Logger:
 
         self.filepath = os.path.join(self.log_dir, f"{self.experiment_name}.h5")
         self.episode_count = 0
-        
-        with h5py.File(self.filepath, 'w') as f:
-            f.create_group('configs')
-            f.create_group('episodes')
-            f.attrs['experiment_name'] = self.experiment_name
+        self.step_count = 0
+        self._written_episodes = 0
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self.storage_profile = storage_profile
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+
+        self.file = h5py.File(self.filepath, 'w')
+        self.file.create_group('configs')
+        self.file.create_group('steps')
+        self.file.create_group('episodes')
+        self.file.attrs['experiment_name'] = self.experiment_name
+        self.file.attrs['layout'] = 'columnar'
+        self.file.attrs['storage_profile'] = storage_profile
+
+        # Episodes logged but not written yet
+        self._pending = {field: [] for field in STEP_FIELDS}
+        self._pending_lengths = []
+        self._pending_steps = 0
+        self._pending_telemetry = []
+        # Telemetry statistics of the episodes, set by the first episode buffered
+        self._telemetry_stats = None
 
         # Internal storage for current episode data
         self.states = []
@@ -36,52 +121,195 @@ class Logger:
         self.observations = []
         self.actions = []
         self.rewards = []
+        self.telemetry = []
+
+        # Guards the file, which the writer thread and the caller both use
+        self._file_lock = threading.Lock()
+        self.asynchronous = asynchronous
+        self._queue = None
+        self._writer = None
+        self._writer_error = None
+        self._closed = False
+        if asynchronous:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._writer = threading.Thread(target=self._write_loop, name=f"Logger-{self.experiment_name}", daemon=True)
+            self._writer.start()
+
+    def __enter__(self) -> 'Logger':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def log_config(self, config: dict, name: str) -> None:
-        with h5py.File(self.filepath, 'a') as f:
-            f['configs'].attrs[name] = json.dumps(config)
+        with self._file_lock:
+            self.file['configs'].attrs[name] = json.dumps(config)
 
     def log_player_ids(self, player_ids: list) -> None:
-        with h5py.File(self.filepath, 'a') as f:
-            f.attrs['player_ids'] = player_ids
+        with self._file_lock:
+            self.file.attrs['player_ids'] = player_ids
 
-    def log_step(self, state: np.ndarray, player: np.ndarray, 
-                    observation: np.ndarray, action: np.ndarray, 
-                    reward: np.ndarray) -> None:
-        self.states.append(state)
+    def log_step(self, state: np.ndarray, player: np.ndarray,
+                    observation: np.ndarray, action: np.ndarray,
+                    reward: np.ndarray, telemetry: Optional[dict] = None) -> None:
+        '''
+        `telemetry` holds statistics of the move (see BaseAgent.get_move_stats).
+        It must be given for every step or for none.
+        '''
+        # Boards are copied, as envs update them in place
+        self.states.append(np.array(state))
         self.players.append(player)
-        self.observations.append(observation)
+        self.observations.append(np.array(observation))
         self.actions.append(action)
         self.rewards.append(reward)
+        if telemetry is not None:
+            self.telemetry.append(telemetry)
 
-    def log_episode(self, states: np.ndarray, players: np.ndarray, 
-                    observations: np.ndarray, actions: np.ndarray, 
-                    rewards: np.ndarray) -> None:
+    def log_episode(self, states: np.ndarray, players: np.ndarray,
+                    observations: np.ndarray, actions: np.ndarray,
+                    rewards: np.ndarray, telemetry: Optional[dict[str, np.ndarray]] = None) -> None:
         """
-        Log a complete episode.
-        
+        Log a complete episode. It is written to the file with the next
+        bulk append, by the writer thread in asynchronous mode.
+
         Args:
             states: (num_steps, *state_shape)
             players: (num_steps,) - scalar per step
             observations: (num_steps, *obs_shape)
             actions: (num_steps, *action_shape)
             rewards: (num_steps,) - scalar per step
+            telemetry: optional, {stat: (num_steps,)} - move statistics, the same
+                       stats for every episode of the file
         """
-        with h5py.File(self.filepath, 'a') as f:
-            episode_group = f['episodes'].create_group(f'episode_{self.episode_count}')
-            
-            # Store all data without compression for perfect recovery
-            episode_group.create_dataset('states', data=states, compression=None)
-            episode_group.create_dataset('players', data=players, compression=None)
-            episode_group.create_dataset('observations', data=observations, compression=None)
-            episode_group.create_dataset('actions', data=actions, compression=None)
-            episode_group.create_dataset('rewards', data=rewards, compression=None)
-            
-            # Store metadata as attributes
-            episode_group.attrs['num_steps'] = len(states)
-            episode_group.attrs['episode_id'] = self.episode_count
-            
+        self._check_open()
+        episode = (states, players, observations, actions, rewards, telemetry)
         self.episode_count += 1
+        if self.asynchronous:
+            self._raise_writer_error()
+            self._queue.put(episode)
+        else:
+            self._buffer_episode(episode)
+
+    def _buffer_episode(self, episode: tuple) -> None:
+        *steps, telemetry = episode
+        if isinstance(telemetry, list):
+            # Per-step dicts logged by log_step
+            telemetry = {stat: np.array([step[stat] for step in telemetry]) for stat in telemetry[0]}
+        stats = sorted(telemetry) if telemetry is not None else []
+        if self._telemetry_stats is None:
+            self._telemetry_stats = stats
+        elif stats != self._telemetry_stats:
+            raise ValueError(f"Episode telemetry {stats} differs from the telemetry {self._telemetry_stats} "
+                             f"of the episodes logged before")
+
+        for field, data in zip(STEP_FIELDS, steps):
+            self._pending[field].append(np.asarray(data))
+        if telemetry is not None:
+            self._pending_telemetry.append({stat: np.asarray(telemetry[stat]) for stat in stats})
+        self._pending_lengths.append(len(steps[0]))
+        self._pending_steps += len(steps[0])
+
+        if self._pending_steps >= self.buffer_size:
+            self._write_pending()
+
+    def _write_loop(self) -> None:
+        '''
+        Body of the writer thread: buffers queued episodes and writes them in bulk.
+        After an error, remaining episodes are dropped so that logging never blocks.
+        '''
+        while True:
+            message = self._queue.get()
+            try:
+                if self._writer_error is None:
+                    if message is _FLUSH or message is _STOP:
+                        self._write_pending()
+                    else:
+                        self._buffer_episode(message)
+            except Exception as error:
+                self._writer_error = error
+            finally:
+                self._queue.task_done()
+            if message is _STOP:
+                return
+
+    def _check_open(self) -> None:
+        # The writer thread is gone after close(), waiting on it would block forever
+        if self._closed:
+            raise Exception(f"Logger of {self.filepath} is closed.")
+
+    def _raise_writer_error(self) -> None:
+        if self._writer_error is not None:
+            raise self._writer_error
+
+    def _to_storage_dtype(self, field: str, data: np.ndarray) -> np.ndarray:
+        dtype = STORAGE_PROFILES[self.storage_profile].get(field)
+        if dtype is None:
+            return data
+        stored = data.astype(dtype)
+        if not np.array_equal(stored, data):
+            raise ValueError(f"{field} cannot be stored exactly as {np.dtype(dtype)} "
+                             f"with the '{self.storage_profile}' storage profile")
+        return stored
+
+    def _append(self, group: h5py.Group, name: str, data: np.ndarray) -> None:
+        '''
+        Appends rows to a resizable dataset, creating it on first use.
+        '''
+        if name not in group:
+            group.create_dataset(name, shape=(0, *data.shape[1:]), dtype=data.dtype,
+                                 maxshape=(None, *data.shape[1:]),
+                                 chunks=(self.chunk_size, *data.shape[1:]),
+                                 compression=self.compression,
+                                 compression_opts=self.compression_opts,
+                                 shuffle=self.shuffle)
+        dataset = group[name]
+        start = dataset.shape[0]
+        dataset.resize(start + len(data), axis=0)
+        dataset[start:] = data
+
+    def flush(self) -> None:
+        """
+        Write all pending episodes to the file.
+        In asynchronous mode, waits for the writer thread to write them.
+        """
+        self._check_open()
+        if self.asynchronous:
+            self._raise_writer_error()
+            self._queue.put(_FLUSH)
+            self._queue.join()
+            self._raise_writer_error()
+        else:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        if not self._pending_lengths:
+            return
+
+        # Converted first, so that an invalid episode leaves the file unchanged
+        steps = {field: self._to_storage_dtype(field, np.concatenate(self._pending[field]))
+                 for field in STEP_FIELDS}
+        telemetry = {stat: np.concatenate([episode[stat] for episode in self._pending_telemetry])
+                     for stat in self._telemetry_stats}
+        lengths = np.array(self._pending_lengths, dtype=np.int64)
+        offsets = self.step_count + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+        with self._file_lock:
+            for field in STEP_FIELDS:
+                self._append(self.file['steps'], field, steps[field])
+            for stat, data in telemetry.items():
+                self._append(self.file['steps'].require_group('telemetry'), stat, data)
+            self._append(self.file['episodes'], 'offsets', offsets)
+            self._append(self.file['episodes'], 'lengths', lengths)
+
+            self.step_count += int(lengths.sum())
+            self._written_episodes += len(lengths)
+            self.file.attrs['num_episodes'] = self._written_episodes
+            self.file.flush()
+
+        self._pending = {field: [] for field in STEP_FIELDS}
+        self._pending_lengths = []
+        self._pending_steps = 0
+        self._pending_telemetry = []
 
     def end_episode(self) -> None:
         """
@@ -89,18 +317,37 @@ class Logger:
         """
         if not self.states:
             return  # No data to log
+        if self.telemetry and len(self.telemetry) != len(self.states):
+            raise ValueError(f"Telemetry was logged for {len(self.telemetry)} of {len(self.states)} steps")
 
-        states_array = np.array(self.states)
-        players_array = np.array(self.players)
-        observations_array = np.array(self.observations)
-        actions_array = np.array(self.actions)
-        rewards_array = np.array(self.rewards)
-
-        self.log_episode(states_array, players_array, observations_array, actions_array, rewards_array)
+        # The step lists are stacked into arrays when the episode is buffered,
+        # by the writer thread in asynchronous mode
+        self.log_episode(self.states, self.players, self.observations, self.actions, self.rewards,
+                         self.telemetry or None)
 
-        # Reset internal storage for next episode
+        # Reset internal storage for next episode (new lists, the old ones may still be queued)
         self.states = []
         self.players = []
         self.observations = []
         self.actions = []
-        self.rewards = []
\ No newline at end of file
+        self.rewards = []
+        self.telemetry = []
+
+    def close(self) -> None:
+        """
+        Write pending episodes and close the file.
+        In asynchronous mode, stops the writer thread first and raises its error, if any.
+        """
+        self._closed = True
+        if self._writer is not None:
+            if self._writer.is_alive():
+                self._queue.put(_STOP)
+                self._writer.join()
+            if self.file.id.valid:
+                self.file.close()
+            self._raise_writer_error()
+        elif self.file.id.valid:
+            try:
+                self._write_pending()
+            finally:
+                self.file.close()
@@ -0,0 +1,111 @@
+'''
+Reading episodes back from experiment files written by Logger,
+for both the columnar layout and the older one-group-per-episode layout.
+'''
+from typing import Iterator, Optional
+import h5py
+import numpy as np
+
+from .logger import STEP_FIELDS
+
+
+def get_layout(experiment: h5py.File) -> str:
+    '''
+    "columnar" for files written by the current Logger,
+    "episodic" for files with one group per episode.
+    '''
+    return experiment.attrs.get('layout', 'episodic')
+
+def get_telemetry_fields(experiment: h5py.File) -> list[str]:
+    '''
+    Step fields of the move statistics logged along with the steps, e.g.
+    "telemetry/wall_time", to be read like the other step fields.
+    '''
+    if get_layout(experiment) != 'columnar' or 'telemetry' not in experiment['steps']:
+        return []
+    return [f"telemetry/{stat}" for stat in experiment['steps/telemetry']]
+
+def num_episodes(experiment: h5py.File) -> int:
+    if get_layout(experiment) == 'columnar':
+        if 'lengths' not in experiment['episodes']:
+            return 0
+        return len(experiment['episodes/lengths'])
+    return len(experiment['episodes'])
+
+def get_field_spec(experiment: h5py.File, field: str) -> Optional[tuple[tuple, np.dtype]]:
+    '''
+    Shape of one step and dtype of a step field, None if the file has no episodes.
+    '''
+    if num_episodes(experiment) == 0:
+        return None
+    if get_layout(experiment) == 'columnar':
+        dataset = experiment['steps'][field]
+    else:
+        dataset = experiment['episodes/episode_0'][field]
+    return dataset.shape[1:], dataset.dtype
+
+def episode_index(experiment: h5py.File) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Offsets and lengths of every episode in the concatenated steps
+    (for the episodic layout, as if its episodes were concatenated in order).
+    '''
+    if get_layout(experiment) == 'columnar':
+        if num_episodes(experiment) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return experiment['episodes/offsets'][:], experiment['episodes/lengths'][:]
+    lengths = np.array([experiment[f'episodes/episode_{i}'].attrs['num_steps']
+                        for i in range(num_episodes(experiment))], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    return offsets, lengths
+
+def read_episode(experiment: h5py.File, episode: int,
+                 fields: Optional[list[str]] = None) -> dict[str, np.ndarray]:
+    '''
+    Step fields (all by default) of one episode.
+    '''
+    fields = STEP_FIELDS if fields is None else fields
+    if get_layout(experiment) == 'columnar':
+        offset = int(experiment['episodes/offsets'][episode])
+        length = int(experiment['episodes/lengths'][episode])
+        return {field: experiment['steps'][field][offset:offset + length] for field in fields}
+    group = experiment['episodes'][f'episode_{episode}']
+    return {field: group[field][:] for field in fields}
+
+def iter_episodes(experiment: h5py.File, fields: Optional[list[str]] = None,
+                  start_episode: int = 0) -> Iterator[dict[str, np.ndarray]]:
+    fields = STEP_FIELDS if fields is None else fields
+    if get_layout(experiment) == 'columnar':
+        offsets, lengths = episode_index(experiment)
+        steps = experiment['steps']
+        for offset, length in zip(offsets[start_episode:], lengths[start_episode:]):
+            yield {field: steps[field][offset:offset + length] for field in fields}
+    else:
+        for episode in range(start_episode, num_episodes(experiment)):
+            yield read_episode(experiment, episode, fields)
+
+def iter_step_chunks(experiment: h5py.File, fields: Optional[list[str]] = None,
+                     chunk_size: int = 1 << 20,
+                     start_episode: int = 0) -> Iterator[tuple[int, np.ndarray, dict[str, np.ndarray]]]:
+    '''
+    Streams the steps of the episodes from `start_episode` on in chunks of whole episodes, of about
+    `chunk_size` steps (more if a single episode is longer).
+    Yields the index of the first episode of the chunk, the lengths of
+    its episodes and the concatenated step fields.
+    '''
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be >= 1, got {chunk_size}")
+    fields = STEP_FIELDS if fields is None else fields
+    offsets, lengths = episode_index(experiment)
+    columnar = get_layout(experiment) == 'columnar'
+    first = start_episode
+    while first < len(lengths):
+        # Episodes whose steps start within chunk_size steps of the first one, at least one
+        last = max(int(np.searchsorted(offsets, offsets[first] + chunk_size, side='left')), first + 1)
+        if columnar:
+            start, end = offsets[first], offsets[last - 1] + lengths[last - 1]
+            data = {field: experiment['steps'][field][start:end] for field in fields}
+        else:
+            episodes = [read_episode(experiment, episode, fields) for episode in range(first, last)]
+            data = {field: np.concatenate([episode[field] for episode in episodes]) for field in fields}
+        yield first, lengths[first:last], data
+        first = last
@@ -0,0 +1,3 @@
+from .game import play_game
+
+__all__ = ['play_game']
\ No newline at end of file
@@ -0,0 +1,42 @@
+'''
+The game loop shared by the scripts playing agents against each other.
+'''
+from typing import Any, Optional
+
+
+def play_game(env: Any, p0: Any, p1: Any, logger: Optional[Any] = None) -> dict:
+    '''
+    Simulate a game between two players.
+    Convention is p0 = X (first player), p1 = O
+
+    Every move is logged with the statistics of its search if a `logger`
+    (a Logger or anything with its log_step and end_episode) is given.
+    Returns the info of the last step, which holds the final scores.
+    '''
+    observation, info = env.reset()
+    done, truncated = False, False
+
+    players = [p0, p1]
+    histories = [[observation], []]
+
+    while not (done or truncated):
+        current_player = env.get_current_player()
+        next_player = env.get_next_player()
+        action = players[current_player].choose_action(env, histories[current_player])
+        observation, reward, done, truncated, info = env.step(action)
+        # We add the observation about the new state to the history of the next player because moves alternate
+        histories[next_player].append(observation)
+
+        if logger is not None:
+            logger.log_step(env.get_board_state(),
+                            current_player,
+                            observation['board'],
+                            action,
+                            reward,
+                            telemetry=players[current_player].get_move_stats())
+
+    if logger is not None:
+        logger.end_episode()
+    env.close()
+
+    return info
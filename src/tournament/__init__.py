@@ -0,0 +1,5 @@
+from .runner import ResultsStore, schedule_matches, play_match, run_tournament, tournament_ratings
+from .ratings import fit_bradley_terry, to_elo, compute_ratings
+
+__all__ = ['ResultsStore', 'schedule_matches', 'play_match', 'run_tournament', 'tournament_ratings',
+           'fit_bradley_terry', 'to_elo', 'compute_ratings']
\ No newline at end of file
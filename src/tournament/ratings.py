@@ -0,0 +1,107 @@
+'''
+Bradley-Terry ratings of the agents of a tournament, on the Elo scale.
+
+Agent i beats agent j with probability p_i / (p_i + p_j). A draw counts as
+half a win for each side. The strengths p are fitted by the MM iterations of
+Hunter (2004) and reported as Elo ratings, 400 * log10(p) around a mean of
+`base`. A difference of 400 points means odds of 10 to 1.
+
+Every pair of agents that met also gets `prior` virtual games, split into
+half a win each. This keeps the ratings finite for agents that won or lost
+every game. Confidence intervals come from a parametric bootstrap: the games
+of every match are redrawn from its observed win/draw/loss rates and the
+ratings are fitted again.
+'''
+from typing import Optional
+import numpy as np
+
+
+def fit_bradley_terry(wins: np.ndarray, prior: float = 1.0, max_iterations: int = 10000,
+                      tolerance: float = 1e-10) -> np.ndarray:
+    '''
+    Strengths (geometric mean 1) of the agents, given `wins` (A, A) where wins[i, j]
+    are the points agent i scored against agent j.
+    '''
+    wins = np.asarray(wins, dtype=float)
+    if wins.ndim != 2 or wins.shape[0] != wins.shape[1]:
+        raise ValueError(f"wins must be a square matrix, got shape {wins.shape}")
+    games = wins + wins.T
+    wins = wins + 0.5 * prior * (games > 0)
+    games = wins + wins.T
+    total_wins = wins.sum(axis=1)
+
+    strengths = np.ones(len(wins))
+    for _ in range(max_iterations):
+        # Pairs that never met have no games, the diagonal included
+        denominators = (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        updated = np.divide(total_wins, denominators, out=np.zeros_like(total_wins), where=denominators > 0)
+        positive = updated > 0
+        if positive.any():
+            updated /= np.exp(np.log(updated[positive]).mean())
+        converged = np.max(np.abs(updated - strengths) / np.maximum(strengths, 1e-300)) < tolerance
+        strengths = updated
+        if converged:
+            break
+    return strengths
+
+
+def to_elo(strengths: np.ndarray, base: float = 1500) -> np.ndarray:
+    with np.errstate(divide='ignore'):
+        return base + 400 * np.log10(strengths)
+
+
+def _win_matrix(num_agents: int, first: np.ndarray, second: np.ndarray, outcomes: np.ndarray) -> np.ndarray:
+    '''
+    Points each agent scored against each other, from the (M, 3) win/draw/loss
+    counts of the first agent of M matches.
+    '''
+    wins = np.zeros((num_agents, num_agents))
+    np.add.at(wins, (first, second), outcomes[:, 0] + 0.5 * outcomes[:, 1])
+    np.add.at(wins, (second, first), outcomes[:, 2] + 0.5 * outcomes[:, 1])
+    return wins
+
+
+def compute_ratings(agents: list[str], first: np.ndarray, second: np.ndarray, outcomes: np.ndarray,
+                    prior: float = 1.0, num_bootstrap: int = 200, confidence: float = 0.95,
+                    base: float = 1500, random_seed: Optional[int] = 42) -> list[dict]:
+    '''
+    Elo ratings of `agents`, best first, from M matches between agents first[m]
+    and second[m] that ended with outcomes[m] = (wins, draws, losses) of the first agent.
+
+    Each rating comes with the bounds of its `confidence` interval over
+    `num_bootstrap` resampled tournaments, the number of games played and
+    the mean points per game.
+    '''
+    if not (0 < confidence < 1):
+        raise ValueError(f"confidence must be in (0, 1), got {confidence}")
+    first, second = np.asarray(first, dtype=int), np.asarray(second, dtype=int)
+    outcomes = np.asarray(outcomes, dtype=int).reshape(-1, 3)
+    num_agents = len(agents)
+
+    wins = _win_matrix(num_agents, first, second, outcomes)
+    elo = to_elo(fit_bradley_terry(wins, prior), base)
+
+    low, high = np.full(num_agents, np.nan), np.full(num_agents, np.nan)
+    if num_bootstrap > 0 and len(outcomes):
+        rng = np.random.default_rng(random_seed)
+        num_games = outcomes.sum(axis=1)
+        rates = outcomes / np.maximum(num_games, 1)[:, None]
+        samples = np.empty((num_bootstrap, num_agents))
+        for b in range(num_bootstrap):
+            resampled = rng.multinomial(num_games, rates)
+            samples[b] = to_elo(fit_bradley_terry(_win_matrix(num_agents, first, second, resampled), prior), base)
+        low, high = np.percentile(samples, [50 * (1 - confidence), 50 * (1 + confidence)], axis=0)
+
+    num_played = (wins + wins.T).sum(axis=1)
+    points = wins.sum(axis=1)
+    # Agents without games have no rating
+    elo[num_played == 0] = np.nan
+    ratings = [{
+        "agent": agent,
+        "elo": float(elo[i]),
+        "ci_low": float(low[i]),
+        "ci_high": float(high[i]),
+        "games": int(round(num_played[i])),
+        "score": float(points[i] / num_played[i]) if num_played[i] > 0 else float('nan')
+    } for i, agent in enumerate(agents)]
+    return sorted(ratings, key=lambda rating: (np.isnan(rating["elo"]), -rating["elo"]))
@@ -0,0 +1,177 @@
+'''
+Round-robin tournaments between agents built from their configs.
+
+Every ordered pair of agents plays a match of `games_per_pairing` games, so that
+each pair meets with both colour assignments. Matches are played by worker
+processes, each building the env and the two agents of a match from the parsed
+configs, and their games are appended to a JSON lines results store as soon as
+a match ends.
+
+A match is identified by a hash of the configs of both agents and of the game,
+of the number of games and of the base seed, and seeded from it. The games of a
+match thus do not depend on the scheduling or on the other agents, and matches
+already in the store are not played again: adding an agent to a tournament
+only plays the matches of that agent.
+'''
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Optional
+import numpy as np
+
+from src.config.factory import make_env, make_agent
+from src.enums.game import RoleEnum
+from src.simulation import play_game
+from .ratings import compute_ratings
+
+
+def config_hash(config: Any) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def schedule_matches(agents: dict[str, dict], game_config: dict, games_per_pairing: int,
+                     seed: int = 42) -> list[dict]:
+    '''
+    The matches of a round robin between `agents` (name -> parsed config),
+    both colour assignments of every pair of agents.
+    '''
+    if games_per_pairing < 1:
+        raise ValueError(f"games_per_pairing must be >= 1, got {games_per_pairing}")
+    if len(agents) < 2:
+        raise ValueError(f"A tournament needs at least two agents, got {len(agents)}")
+    matches = []
+    for player0, config0 in agents.items():
+        for player1, config1 in agents.items():
+            if player0 == player1:
+                continue
+            key = config_hash({"player0": config0, "player1": config1, "game": game_config,
+                               "games": games_per_pairing, "seed": seed})
+            matches.append({"match": key, "player0": player0, "player1": player1,
+                            "configs": [config0, config1], "games": games_per_pairing})
+    return matches
+
+
+class ResultsStore:
+    '''
+    Results of the games of all matches played, one JSON record per line:
+    the match, the names of both agents (player0 plays X), the game number,
+    the final scores and the outcome for player0 (1 win, 0.5 draw, 0 loss).
+    '''
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def load(self) -> list[dict]:
+        if not self.path.is_file():
+            return []
+        with open(self.path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def completed_matches(self) -> set[str]:
+        '''
+        Matches of which every game is in the store.
+        A match interrupted while being written is played again.
+        '''
+        counts, expected = {}, {}
+        for record in self.load():
+            counts[record["match"]] = counts.get(record["match"], 0) + 1
+            expected[record["match"]] = record["games"]
+        return {match for match, count in counts.items() if count >= expected[match]}
+
+    def append(self, records: list[dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+            f.flush()
+
+
+# Per-process env, built once by the worker initializer
+_worker = {}
+
+def _init_worker(game_config: dict) -> None:
+    _worker["env"] = make_env(game_config)
+
+def play_match(match: dict) -> list[dict]:
+    '''
+    Plays the games of a match with fresh agents, seeded from the match.
+    '''
+    if "env" not in _worker:
+        raise Exception("The worker env is not built, call _init_worker first.")
+    env = _worker["env"]
+    players = [make_agent(config) for config in match["configs"]]
+    env_seed, *player_seeds = np.random.SeedSequence(int(match["match"], 16)).spawn(3)
+    env.reset(seed=int(env_seed.generate_state(1)[0]))
+    for player, player_seed in zip(players, player_seeds):
+        player.rng = np.random.default_rng(player_seed)
+
+    records = []
+    try:
+        for game in range(match["games"]):
+            score = play_game(env, *players)["score"]
+            score0, score1 = float(score[RoleEnum.X.value]), float(score[RoleEnum.O.value])
+            records.append({"match": match["match"], "player0": match["player0"], "player1": match["player1"],
+                            "games": match["games"], "game": game, "score0": score0, "score1": score1,
+                            "outcome": 1.0 if score0 > score1 else 0.5 if score0 == score1 else 0.0})
+    finally:
+        # Agents searching with worker processes would leak a pool per match
+        for player in players:
+            player.close()
+    return records
+
+
+def run_tournament(agents: dict[str, dict], game_config: dict, results: str | Path,
+                   games_per_pairing: int = 10, workers: int = 1, seed: int = 42,
+                   callback: Optional[Callable[[list[dict]], None]] = None) -> int:
+    '''
+    Plays the matches of the round robin between `agents` (name -> parsed config)
+    that are not in the `results` store yet, with `workers` processes, and appends
+    their games to the store. `callback` is called with the games of each match
+    as it ends. Returns the number of matches played.
+    '''
+    store = ResultsStore(results)
+    completed = store.completed_matches()
+    pending = [match for match in schedule_matches(agents, game_config, games_per_pairing, seed)
+               if match["match"] not in completed]
+
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(game_config,)) as executor:
+            futures = [executor.submit(play_match, match) for match in pending]
+            for future in as_completed(futures):
+                records = future.result()
+                store.append(records)
+                if callback is not None:
+                    callback(records)
+    else:
+        _init_worker(game_config)
+        for match in pending:
+            records = play_match(match)
+            store.append(records)
+            if callback is not None:
+                callback(records)
+    return len(pending)
+
+
+def tournament_ratings(agents: dict[str, dict], game_config: dict, results: str | Path,
+                       games_per_pairing: int = 10, seed: int = 42, **kwargs) -> list[dict]:
+    '''
+    Ratings (see compute_ratings, which takes the `kwargs`) of `agents` from the
+    games of the tournament in the `results` store. Games of other tournaments
+    sharing the store are left out.
+    '''
+    matches = {match["match"]: match for match in schedule_matches(agents, game_config, games_per_pairing, seed)}
+    names = list(agents)
+    index = {name: i for i, name in enumerate(names)}
+    outcomes = {key: np.zeros(3, dtype=int) for key in matches}
+    seen = set()
+    for record in ResultsStore(results).load():
+        # A match written twice, e.g. by two runs sharing the store, counts once
+        if record["match"] not in matches or (record["match"], record["game"]) in seen:
+            continue
+        seen.add((record["match"], record["game"]))
+        outcomes[record["match"]][{1.0: 0, 0.5: 1, 0.0: 2}[record["outcome"]]] += 1
+
+    keys = list(matches)
+    first = [index[matches[key]["player0"]] for key in keys]
+    second = [index[matches[key]["player1"]] for key in keys]
+    return compute_ratings(names, first, second, np.array([outcomes[key] for key in keys]).reshape(-1, 3), **kwargs)
@@ -6,10 +6,12 @@ sys.path.insert(0, str(project_root))
 
 
 import numpy as np
+import pytest
 from typing import Any
 from tqdm import tqdm
 
 from src.agents import MinimaxAgent, AlphaBetaMinimaxAgent
+from src.agents.opening_book import build_opening_book
 from src.enums.game import BoardEnum
 from src.environments import TwoDims, ThreeDims
 import pandas as pd
@@ -79,4 +81,196 @@ def test_identical_output():
         
         df = pd.DataFrame(table_data)
         print(f"\n{env.__class__.__name__}:")
-        print(df.to_string(index=False))
\ No newline at end of file
+        print(df.to_string(index=False))
+
+def test_iterative_deepening_finds_equally_good_moves():
+    env = ThreeDims()
+    np.random.seed(0)
+    for depth in [2, 3]:
+        minimax = MinimaxAgent(search_depth=depth)
+        deepening = AlphaBetaMinimaxAgent(search_depth=depth, iterative_deepening=True, tt_size=2**16)
+        for _ in range(5):
+            position = generate_board_position(env)
+            observation = dummy_observation_from_position(env, position)
+            action = deepening.choose_action(env, [observation])
+            assert deepening.completed_depth == min(depth, int(observation["action_mask"].sum()))
+
+            # The chosen move must have the best minimax value among the root moves
+            values = {}
+            for a in np.argwhere(observation["action_mask"]):
+                child = position.copy()
+                env.apply_action(child, 0, a)
+                values[tuple(a)] = minimax.get_minimax_value(env, child, current_player=1, next_player=0,
+                                                             current_role='min', next_role='max', depth=1)
+            assert values[tuple(action)] == max(values.values())
+
+
+def test_iterative_deepening_respects_node_budget():
+    env = ThreeDims()
+    agent = AlphaBetaMinimaxAgent(search_depth=27, iterative_deepening=True, node_budget=2000)
+    position = BoardEnum.EMPTY.value * np.ones(env.dimensions * [env.size])
+    agent.choose_action(env, [dummy_observation_from_position(env, position)])
+    assert agent.nodes_searched <= 2001
+    assert 1 <= agent.completed_depth < 27
+
+
+def test_parallel_root_split_matches_serial_search():
+    env = TwoDims()
+    np.random.seed(1)
+    positions = [generate_board_position(env) for _ in range(5)]
+    for agent_class, kwargs in [(MinimaxAgent, {}), (AlphaBetaMinimaxAgent, {"share_alpha": False})]:
+        serial = agent_class(search_depth=3)
+        parallel = agent_class(search_depth=3, workers=2, **kwargs)
+        try:
+            for position in positions:
+                history = [dummy_observation_from_position(env, position)]
+                assert np.all(serial.choose_action(env, history) == parallel.choose_action(env, history))
+                if agent_class is MinimaxAgent:
+                    assert serial.nodes_searched == parallel.nodes_searched
+        finally:
+            parallel.close()
+
+    # With shared alpha only the value of the chosen move is guaranteed to be optimal
+    minimax = MinimaxAgent(search_depth=3)
+    parallel = AlphaBetaMinimaxAgent(search_depth=3, workers=2)
+    try:
+        for position in positions:
+            observation = dummy_observation_from_position(env, position)
+            values = {}
+            for a in np.argwhere(observation["action_mask"]):
+                child = position.copy()
+                env.apply_action(child, 0, a)
+                values[tuple(a)] = minimax.get_minimax_value(env, child, current_player=1, next_player=0,
+                                                             current_role='min', next_role='max', depth=1)
+            action = parallel.choose_action(env, [observation])
+            assert values[tuple(action)] == max(values.values())
+    finally:
+        parallel.close()
+
+
+def test_parallel_workers_keep_their_env():
+    # The env is sent to the workers when they start, not with every root action
+    serial = AlphaBetaMinimaxAgent(search_depth=2)
+    parallel = AlphaBetaMinimaxAgent(search_depth=2, workers=2, share_alpha=False)
+    try:
+        for env in [ThreeDims(), ThreeDims(), TwoDims()]:
+            np.random.seed(4)
+            executors = set()
+            for _ in range(3):
+                history = [dummy_observation_from_position(env, generate_board_position(env))]
+                assert np.all(serial.choose_action(env, history) == parallel.choose_action(env, history))
+                assert parallel._pool.env is env
+                executors.add(id(parallel._pool._executor))
+            assert len(executors) == 1
+    finally:
+        parallel.close()
+
+
+def test_opening_book_does_not_change_play(tmp_path):
+    env = ThreeDims()
+    book = build_opening_book(env, AlphaBetaMinimaxAgent(search_depth=2, tt_size=1 << 16), max_ply=1)
+    book.save(tmp_path / "book.npz")
+    assert len(book) == 5 # the empty board and the 4 kinds of first moves
+
+    with pytest.raises(ValueError):
+        MinimaxAgent(search_depth=3, opening_book=tmp_path / "book.npz")
+
+    for agent_class in [MinimaxAgent, AlphaBetaMinimaxAgent]:
+        searching = agent_class(search_depth=2)
+        booked = agent_class(search_depth=2, opening_book=tmp_path / "book.npz")
+        positions = [env.reset()[0]]
+        for action in np.argwhere(positions[0]["action_mask"]):
+            env.reset()
+            positions.append(env.step(action)[0])
+        for observation in positions:
+            assert np.all(booked.choose_action(env, [observation]) == searching.choose_action(env, [observation]))
+            assert booked.get_move_stats()["nodes_searched"] == 0
+
+    # Moves that are not searched do not report the last search as exact
+    board = np.where(np.arange(27) % 2, BoardEnum.X.value, BoardEnum.O.value).reshape(3, 3, 3)
+    board[0, 0, :2] = BoardEnum.EMPTY.value
+    endgame = dummy_observation_from_position(env, board)
+    for agent_class in [MinimaxAgent, AlphaBetaMinimaxAgent]:
+        agent = agent_class(search_depth=2, opening_book=tmp_path / "book.npz")
+        agent.choose_action(env, [endgame])
+        assert agent.get_move_stats()["solved_exactly"] == 1
+        agent.choose_action(env, [positions[0]])
+        assert agent.get_move_stats()["solved_exactly"] == 0
+        agent.choose_action(env, [endgame])
+        agent.epsilon = 1
+        agent.choose_action(env, [endgame])
+        assert agent.get_move_stats()["solved_exactly"] == 0
+
+
+def test_endgame_solver_plays_like_full_depth_search():
+    env = ThreeDims()
+    rng = np.random.default_rng(0)
+    full_depth = AlphaBetaMinimaxAgent(search_depth=27)
+    endgame = AlphaBetaMinimaxAgent(search_depth=2, endgame_threshold=8)
+    for num_empty in [2, 5, 9]:
+        position = rng.choice([BoardEnum.X.value, BoardEnum.O.value], size=27).astype(float)
+        position[rng.choice(27, size=num_empty, replace=False)] = BoardEnum.EMPTY.value
+        history = [dummy_observation_from_position(env, position.reshape(3, 3, 3))]
+        assert np.all(endgame.choose_action(env, history) == full_depth.choose_action(env, history))
+        assert endgame.get_move_stats()["solved_exactly"] == 1
+        assert endgame.endgame_nodes > 0
+
+    with pytest.raises(ValueError):
+        AlphaBetaMinimaxAgent(search_depth=2, endgame_threshold=0)
+
+    # Far from the end of the game, the depth limit still applies
+    position = BoardEnum.EMPTY.value * np.ones(env.dimensions * [env.size])
+    endgame.choose_action(env, [dummy_observation_from_position(env, position)])
+    assert endgame.get_move_stats()["solved_exactly"] == 0
+    assert endgame.endgame_nodes == 0
+
+
+def test_batched_leaf_evaluation_does_not_change_the_search():
+    env = ThreeDims()
+    np.random.seed(2)
+    positions = [generate_board_position(env) for _ in range(5)]
+    configurations = [(MinimaxAgent, 2, {}),
+                      (AlphaBetaMinimaxAgent, 3, {}),
+                      (AlphaBetaMinimaxAgent, 3, {"tt_size": 1 << 16, "move_ordering": True}),
+                      (AlphaBetaMinimaxAgent, 3, {"iterative_deepening": True}),
+                      (AlphaBetaMinimaxAgent, 2, {"endgame_threshold": 6})]
+    for agent_class, depth, kwargs in configurations:
+        one_by_one = agent_class(search_depth=depth, **kwargs)
+        batched = agent_class(search_depth=depth, batch_leaves=True, **kwargs)
+        for position in positions:
+            history = [dummy_observation_from_position(env, position)]
+            assert np.all(one_by_one.choose_action(env, history) == batched.choose_action(env, history))
+            assert one_by_one.cutoffs == batched.cutoffs
+
+
+def test_evaluate_leaf_override_receives_observation():
+    # Subclasses evaluate leaves from an observation dict, as before make/unmake search
+    def evaluate_leaf(self, env, observation, root_current_player, root_next_player):
+        center = observation["board"][1, 1]
+        return float(center == root_current_player) - float(center == root_next_player)
+
+    env = TwoDims()
+    history = [dummy_observation_from_position(env, BoardEnum.EMPTY.value * np.ones((3, 3)))]
+    for agent_class in [MinimaxAgent, AlphaBetaMinimaxAgent]:
+        agent = type("CenterAgent", (agent_class,), {"evaluate_leaf": evaluate_leaf})(search_depth=1)
+        assert tuple(agent.choose_action(env, history)) == (1, 1)
+
+
+def test_leaves_get_the_score_difference_of_their_board():
+    # The difference passed down with the points of each move is the one counted on the board
+    def evaluate_leaf(self, env, observation, root_current_player, root_next_player):
+        board = observation["board"]
+        assert observation["score_difference"] == \
+            env.get_score(board, root_current_player) - env.get_score(board, root_next_player)
+        return observation["score_difference"]
+
+    env = ThreeDims()
+    np.random.seed(3)
+    positions = [generate_board_position(env) for _ in range(5)]
+    for agent_class, kwargs in [(MinimaxAgent, {}), (AlphaBetaMinimaxAgent, {"endgame_threshold": 4}),
+                                (AlphaBetaMinimaxAgent, {"iterative_deepening": True})]:
+        checking = type("CheckingAgent", (agent_class,), {"evaluate_leaf": evaluate_leaf})(search_depth=2, **kwargs)
+        reference = agent_class(search_depth=2, **kwargs)
+        for position in positions:
+            history = [dummy_observation_from_position(env, position)]
+            assert np.all(checking.choose_action(env, history) == reference.choose_action(env, history))
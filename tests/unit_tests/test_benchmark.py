@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+from src.benchmark import run_benchmarks, compare_results, save_results, load_results
+
+
+def test_quick_run_and_round_trip(tmp_path):
+    results = run_benchmarks(quick=True, pattern="env.TwoDims")
+    assert set(results["results"]) == {f"env.TwoDims.{name}" for name in
+                                       ["step", "simulate_step", "get_score", "get_action_mask"]}
+    assert all(record["value"] > 0 for record in results["results"].values())
+    save_results(results, tmp_path / "results.json")
+    assert load_results(tmp_path / "results.json") == results
+
+
+def test_compare_flags_regressions():
+    def results(throughput, seconds):
+        return {"results": {
+            "throughput": {"value": throughput, "unit": "calls/s", "higher_is_better": True},
+            "time": {"value": seconds, "unit": "s", "higher_is_better": False}
+        }}
+    baseline = results(100.0, 1.0)
+    assert compare_results(results(90.0, 1.1), baseline, tolerance=0.2) == []
+    regressions = compare_results(results(50.0, 1.5), baseline, tolerance=0.2)
+    assert [regression["name"] for regression in regressions] == ["throughput", "time"]
+    assert regressions[0]["slowdown"] == 2.0
+    # New benchmarks have nothing to regress against
+    assert compare_results(results(50.0, 1.5), {"results": {}}) == []
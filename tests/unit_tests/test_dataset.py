@@ -0,0 +1,98 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+import numpy as np
+import pytest
+from src.datasets import TrajectoryDataset
+from src.enums.game import BoardEnum, RoleEnum
+from src.logging.logger import Logger
+from test_logger import play_random_episodes, write_episodic_file
+
+
+def write_experiment(path, name, episodes, **kwargs):
+    with Logger(path, name, **kwargs) as logger:
+        logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+        for episode in episodes:
+            logger.log_episode(*episode)
+    return path / f"{name}.h5"
+
+
+def expected_transitions(episodes):
+    '''
+    Transitions of the episodes built step by step, in dataset order.
+    '''
+    transitions = []
+    for states, players, _, actions, rewards in episodes:
+        state = np.full(states.shape[1:], BoardEnum.EMPTY.value, dtype=states.dtype)
+        for t in range(len(states)):
+            transitions.append({"state": state, "player": players[t], "action": actions[t],
+                                "reward": rewards[t], "next_state": states[t],
+                                "mask": state == BoardEnum.EMPTY.value, "done": t == len(states) - 1})
+            state = states[t]
+    return transitions
+
+
+@pytest.mark.parametrize("cache", ["memory", "mmap"])
+def test_batches_match_episodes(tmp_path, cache):
+    first, second = play_random_episodes(15, seed=8), play_random_episodes(10, seed=9)
+    paths = [write_experiment(tmp_path, "first", first),
+             write_experiment(tmp_path, "second", second, storage_profile="compact")]
+    dataset = TrajectoryDataset(paths, cache=cache, cache_dir=tmp_path / "cache", chunk_size=20)
+    transitions = expected_transitions(first + second)
+    assert len(dataset) == len(transitions)
+    assert dataset.num_episodes == len(first) + len(second)
+
+    batch = dataset.sample(64)
+    for i, index in enumerate(batch["indices"]):
+        for field, value in transitions[index].items():
+            assert np.array_equal(batch[field][i], value)
+
+    # Steps of one episode are served as views of the buffers
+    length = len(first[0][0])
+    batch = dataset.get_batch(slice(0, length))
+    assert np.shares_memory(batch["state"], dataset.boards)
+    assert np.shares_memory(batch["next_state"], dataset.boards)
+    for i in range(length):
+        for field, value in transitions[i].items():
+            assert np.array_equal(batch[field][i], value)
+
+    if cache == "mmap":
+        # A second dataset reuses the cache
+        cached = TrajectoryDataset(paths, cache=cache, cache_dir=tmp_path / "cache")
+        assert len(list((tmp_path / "cache").iterdir())) == 1
+        assert np.array_equal(cached.boards, dataset.boards)
+
+
+def test_episodic_layout_files(tmp_path):
+    # Logs written before the columnar layout are read through src.logging.reader
+    first, second = play_random_episodes(12, seed=10), play_random_episodes(8, seed=11)
+    write_episodic_file(tmp_path / "episodic.h5", first)
+    paths = [tmp_path / "episodic.h5", write_experiment(tmp_path, "columnar", second)]
+    dataset = TrajectoryDataset(paths, chunk_size=15)
+    transitions = expected_transitions(first + second)
+    assert len(dataset) == len(transitions)
+    assert dataset.num_episodes == len(first) + len(second)
+    batch = dataset.get_batch(np.arange(len(transitions)))
+    for i, transition in enumerate(transitions):
+        for field, value in transition.items():
+            assert np.array_equal(batch[field][i], value)
+
+    write_episodic_file(tmp_path / "empty.h5", [])
+    with pytest.raises(ValueError):
+        TrajectoryDataset(tmp_path / "empty.h5")
+
+
+def test_prioritized_sampling(tmp_path):
+    path = write_experiment(tmp_path, "prioritized", play_random_episodes(10, seed=10))
+    dataset = TrajectoryDataset(path)
+    priorities = np.zeros(len(dataset))
+    priorities[[3, 7]] = [1.0, 3.0]
+    dataset.set_priorities(priorities)
+    batch = dataset.sample(1000)
+    assert set(batch["indices"]) == {3, 7}
+    assert np.allclose(batch["probabilities"][batch["indices"] == 7], 0.75)
+    assert 0.65 < np.mean(batch["indices"] == 7) < 0.85
@@ -9,7 +9,11 @@ import pytest
 import numpy as np
 from src.environments.two_dims import TwoDims
 from src.environments.three_dims import ThreeDims
-from src.enums.game import BoardEnum
+from src.environments.n_dims import NDims
+from src.environments.batched import BatchedTwoDims, BatchedThreeDims, BatchedNDims
+from src.environments.lines import LineTables, enumerate_lines, load_line_tables
+from src.environments.symmetry import get_symmetry
+from src.enums.game import BoardEnum, RoleEnum
 
 
 env2 = TwoDims()
@@ -256,4 +260,167 @@ def test_three_dims_scoring_cases():
     assert env3.get_score(state6, p) == 1
     assert env3.get_score(state7, p) == 1
     assert env3.get_score(state8, p) == 49
-    assert env3.get_score(state9, p) == 0
\ No newline at end of file
+    assert env3.get_score(state9, p) == 0
+
+def test_bitboard_backend_matches_ndarray():
+    rng = np.random.default_rng(0)
+    values = [BoardEnum.EMPTY.value, BoardEnum.X.value, BoardEnum.O.value]
+    for env_class in [TwoDims, ThreeDims]:
+        ndarray_env = env_class()
+        bitboard_env = env_class(backend="bitboard")
+        for _ in range(200):
+            state = rng.choice(values, size=ndarray_env.dimensions * [ndarray_env.size]).astype(float)
+            for player in [BoardEnum.X.value, BoardEnum.O.value]:
+                assert bitboard_env.get_score(state, player) == ndarray_env.get_score(state, player)
+
+        # Play the same random game in both envs
+        ndarray_env.reset()
+        bitboard_env.reset()
+        done = False
+        while not done:
+            actions = np.argwhere(ndarray_env.get_action_mask(ndarray_env.get_board_state()))
+            action = actions[rng.integers(len(actions))]
+            _, r1, done, _, info1 = ndarray_env.step(action)
+            _, r2, _, _, info2 = bitboard_env.step(action)
+            assert r1 == r2
+            assert info1["score"] == info2["score"]
+
+
+def test_batched_scores_match_single_scores():
+    rng = np.random.default_rng(0)
+    values = [BoardEnum.EMPTY.value, BoardEnum.X.value, BoardEnum.O.value]
+    for env_class in [TwoDims, ThreeDims]:
+        env = env_class()
+        states = rng.choice(values, size=[100] + env.dimensions * [env.size]).astype(float)
+        for player in [BoardEnum.X.value, BoardEnum.O.value]:
+            scores = env.get_scores(states, player)
+            assert scores.shape == (100,)
+            assert list(scores) == [env.get_score(state, player) for state in states]
+
+
+def test_incremental_score_matches_full_recount():
+    rng = np.random.default_rng(1)
+    for env in [TwoDims(), ThreeDims(), ThreeDims(backend="bitboard")]:
+        for _ in range(5):
+            env.reset()
+            done = False
+            while not done:
+                state = env.get_board_state().copy()
+                player = env.get_current_player()
+                actions = np.argwhere(env.get_action_mask(state))
+                action = actions[rng.integers(len(actions))]
+                _, reward, done, _, info = env.step(action)
+                new_state = env.get_board_state()
+                assert reward == env.get_score(new_state, player) - env.get_score(state, player)
+                assert info["score"][player] == env.get_score(new_state, player)
+
+
+def test_batched_env_matches_single_envs():
+    num_envs = 16
+    for batched_class in [BatchedTwoDims, BatchedThreeDims]:
+        batched = batched_class(num_envs)
+        batched.reset(seed=0)
+        envs = [batched_class.env_class() for _ in range(num_envs)]
+        done = np.zeros(num_envs, dtype=bool)
+        while not np.all(done):
+            actions = batched.sample_actions()
+            observation, rewards, done, _, info = batched.step(actions)
+            for i, env in enumerate(envs):
+                action = np.unravel_index(actions[i], batched.board_shape)
+                single_observation, reward, terminated, _, single_info = env.step(np.array(action))
+                assert reward == rewards[i]
+                assert terminated == done[i]
+                assert np.all(single_observation["board"] == observation["board"][i])
+                assert np.all(single_observation["action_mask"] == observation["action_mask"][i])
+                assert single_observation["current_player"] == observation["current_player"][i]
+                assert single_info["score"][RoleEnum.X.value] == info["score"][i, RoleEnum.X.value]
+                assert single_info["score"][RoleEnum.O.value] == info["score"][i, RoleEnum.O.value]
+
+
+def test_symmetry_canonical_forms():
+    rng = np.random.default_rng(2)
+    values = [BoardEnum.EMPTY.value, BoardEnum.X.value, BoardEnum.O.value]
+    for env, num_symmetries in [(env2, 8), (env3, 48)]:
+        symmetry = get_symmetry(env)
+        assert symmetry.num_symmetries == num_symmetries
+        for _ in range(20):
+            board = rng.choice(values, size=env.dimensions * [env.size]).astype(float)
+            canonical, g = symmetry.canonicalize(board)
+            for h in range(symmetry.num_symmetries):
+                image = symmetry.transform(board, h)
+                assert np.all(symmetry.canonicalize(image)[0] == canonical)
+                for player in [BoardEnum.X.value, BoardEnum.O.value]:
+                    assert env.get_score(image, player) == env.get_score(board, player)
+            for action in np.argwhere(board == BoardEnum.EMPTY.value):
+                canonical_action = symmetry.to_canonical_action(action, g)
+                assert canonical[tuple(canonical_action)] == BoardEnum.EMPTY.value
+                assert np.all(symmetry.from_canonical_action(canonical_action, g) == action)
+
+
+def test_apply_undo_action_matches_simulate_step():
+    rng = np.random.default_rng(3)
+    for env in [env2, env3]:
+        for _ in range(50):
+            board = rng.choice([BoardEnum.EMPTY.value, BoardEnum.X.value, BoardEnum.O.value],
+                               size=env.dimensions * [env.size]).astype(float)
+            board.ravel()[0] = BoardEnum.EMPTY.value
+            env.reset() # simulate_step checks validity against the env's own (empty) board
+            buffer = board.copy()
+            for action in np.argwhere(board == BoardEnum.EMPTY.value):
+                observation, reward = env.simulate_step(board, BoardEnum.O.value, action)
+                assert env.apply_action(buffer, BoardEnum.O.value, action) == reward
+                assert np.all(buffer == observation["board"])
+                env.undo_action(buffer, action)
+                assert np.all(buffer == board)
+
+
+def test_enumerated_lines():
+    for dimensions, size, num_lines in [(2, 3, 8), (3, 3, 49), (3, 4, 76), (4, 3, 272)]:
+        lines = enumerate_lines(dimensions, size, size)
+        assert lines.shape == (num_lines, size, dimensions)
+        assert num_lines == ((size + 2) ** dimensions - size ** dimensions) // 2
+    # Three in a row on a 4x4 board: 2 per row and column, 4 diagonals each way
+    assert len(enumerate_lines(2, 4, 3)) == 24
+    with pytest.raises(ValueError):
+        enumerate_lines(2, 3, 4)
+
+
+def test_n_dims_matches_hand_written_envs(tmp_path):
+    for env, n_dims in [(env2, NDims(dimensions=2, line_cache_dir=tmp_path)),
+                        (env3, NDims(dimensions=3, line_cache_dir=tmp_path))]:
+        assert {tuple(sorted(line)) for line in env._line_indices} == {tuple(sorted(line)) for line in n_dims._line_indices}
+        for cell in range(env._cell_line_table.shape[0]):
+            assert {tuple(line) for line in env._cell_line_indices[cell]} == {tuple(line) for line in n_dims._cell_line_indices[cell]}
+        rng = np.random.default_rng(0)
+        states = rng.choice([BoardEnum.EMPTY.value, BoardEnum.X.value, BoardEnum.O.value],
+                            size=[50] + env.dimensions * [env.size]).astype(float)
+        for player in [BoardEnum.X.value, BoardEnum.O.value]:
+            assert list(n_dims.get_scores(states, player)) == list(env.get_scores(states, player))
+
+
+def test_line_tables_saved_to_disk(tmp_path):
+    tables = load_line_tables(2, 4, 3, tmp_path)
+    loaded = LineTables.load(tmp_path / "lines_d2_s4_l3.npz")
+    assert np.array_equal(loaded.line_indices, tables.line_indices)
+    assert np.array_equal(loaded.cell_line_table, tables.cell_line_table)
+    assert loaded.line_masks == tables.line_masks
+
+    # Envs of the same board share the tables
+    qubic = NDims(dimensions=3, size=4, line_cache_dir=tmp_path)
+    assert NDims(dimensions=3, size=4, line_cache_dir=tmp_path)._cell_line_table is qubic._cell_line_table
+    assert len(qubic._line_indices) == 76
+
+
+def test_batched_n_dims_matches_single_envs():
+    batched = BatchedNDims(8, dimensions=3, size=4)
+    batched.reset(seed=0)
+    envs = [NDims(dimensions=3, size=4) for _ in range(8)]
+    done = np.zeros(8, dtype=bool)
+    while not np.all(done):
+        actions = batched.sample_actions()
+        _, rewards, done, _, info = batched.step(actions)
+        for i, env in enumerate(envs):
+            _, reward, terminated, _, single_info = env.step(np.array(np.unravel_index(actions[i], batched.board_shape)))
+            assert reward == rewards[i]
+            assert terminated == done[i]
+            assert list(single_info["score"].values()) == list(info["score"][i])
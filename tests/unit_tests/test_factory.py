@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+import subprocess
+import pytest
+from src.agents import AlphaBetaMinimaxAgent, RandomAgent
+from src.config.factory import build_agent, build_env, make_agent, make_env
+from src.environments import NDims, ThreeDims, TwoDims, register_envs
+
+
+def test_build_env_from_game_configs():
+    for name, env_class, max_timesteps in [("twodims_default", TwoDims, 9), ("twodims_bitboard", TwoDims, 9),
+                                           ("qubic", NDims, 64)]:
+        env = build_env(project_root / "configs" / "games" / f"{name}.yml")
+        assert type(env) is env_class
+        assert env.max_timesteps == max_timesteps
+        # The parsed config is enough to build the same env again
+        assert type(make_env(env.config)) is env_class
+
+    with pytest.raises(Exception):
+        make_env({"name": "4CE-FiveDims", "kwargs": {}})
+
+
+def test_make_agent_from_parsed_config():
+    agent = build_agent(project_root / "configs" / "agents" / "alphabeta.yml")
+    assert type(agent) is AlphaBetaMinimaxAgent
+    assert type(make_agent(agent.config)) is AlphaBetaMinimaxAgent
+    assert type(make_agent({"name": "RandomAgent", "kwargs": {}})) is RandomAgent
+    with pytest.raises(Exception):
+        make_agent({"name": "UnknownAgent", "kwargs": {}})
+
+
+def test_gym_registration():
+    import gymnasium as gym
+    register_envs()
+    assert type(gym.make("4CE-ThreeDims").unwrapped) is ThreeDims
+
+
+def test_worker_startup_skips_heavy_imports():
+    code = f"""
+import sys
+sys.path.insert(0, {str(project_root)!r})
+from src.config.factory import make_env, make_agent
+# Importing the factory imports no env module, building an env only the ones it needs
+assert not [name for name in sys.modules if name.startswith("src.environments.") and name != "src.environments.registry"]
+make_env({{"name": "4CE-ThreeDims", "max_timesteps": 27, "kwargs": {{}}}})
+make_agent({{"name": "AlphaBetaMinimaxAgent", "kwargs": {{"search_depth": 2}}}})
+print(" ".join(sorted(name for name in ["h5py", "matplotlib", "tqdm", "yaml", "pydantic", "src.agents.mcts",
+                                       "src.environments.n_dims", "src.environments.batched"]
+                      if name in sys.modules)))
+"""
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
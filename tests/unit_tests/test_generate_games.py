@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "scripts" / "lab"))
+
+
+from types import SimpleNamespace
+import h5py
+import numpy as np
+import json
+from generate_games import generate_games, generate_games_in_parallel, log_configs
+from src.config.factory import make_agent, make_env
+from src.logging.logger import Logger
+from src.logging.reader import iter_episodes, num_episodes
+from src.simulation import play_game
+
+GAME_CONFIG = {"name": "4CE-TwoDims", "max_timesteps": 9, "kwargs": {}}
+PLAYER_CONFIGS = [{"name": "RandomAgent", "kwargs": {"random_seed": 0}},
+                  {"name": "MinimaxAgent", "kwargs": {"search_depth": 1, "epsilon": 0.5}}]
+
+
+def read_actions(path):
+    with h5py.File(path, 'r') as experiment:
+        return num_episodes(experiment), [episode["actions"] for episode in iter_episodes(experiment, ["actions"])]
+
+
+def generate(log_dir, name, n, workers, seed, player_configs=PLAYER_CONFIGS):
+    config = SimpleNamespace(n=n, workers=workers, seed=seed)
+    with Logger(log_dir, name) as logger:
+        log_configs(logger, config, GAME_CONFIG, player_configs)
+        if workers > 1:
+            generate_games_in_parallel(config, logger, GAME_CONFIG, player_configs)
+        else:
+            generate_games(config, logger, make_env(GAME_CONFIG), *[make_agent(player_config) for player_config in player_configs])
+    return read_actions(Path(log_dir) / f"{name}.h5")
+
+
+def test_parallel_generation_is_reproducible(tmp_path):
+    count, actions = generate(tmp_path, "first", n=10, workers=2, seed=7)
+    assert count == 10
+    repeated_count, repeated_actions = generate(tmp_path, "second", n=10, workers=2, seed=7)
+    assert repeated_count == 10
+    assert all(np.array_equal(a, b) for a, b in zip(actions, repeated_actions))
+
+    _, other_actions = generate(tmp_path, "other_seed", n=10, workers=2, seed=8)
+    assert not all(np.array_equal(a, b) for a, b in zip(actions, other_actions))
+
+
+def test_serial_generation_uses_the_seed(tmp_path):
+    count, actions = generate(tmp_path, "first", n=5, workers=1, seed=7)
+    assert count == 5
+    _, repeated_actions = generate(tmp_path, "second", n=5, workers=1, seed=7)
+    assert all(np.array_equal(a, b) for a, b in zip(actions, repeated_actions))
+    _, other_actions = generate(tmp_path, "other_seed", n=5, workers=1, seed=8)
+    assert not all(np.array_equal(a, b) for a, b in zip(actions, other_actions))
+
+    with h5py.File(tmp_path / "first.h5", 'r') as f:
+        assert json.loads(f['configs'].attrs['generation_config']) == {"seed": 7, "workers": 1}
+
+
+def test_generation_without_seed_keeps_the_agent_seeds(tmp_path):
+    # Serial games are those of the agents as configured
+    _, actions = generate(tmp_path, "serial", n=3, workers=1, seed=None)
+    env, players = make_env(GAME_CONFIG), [make_agent(player_config) for player_config in PLAYER_CONFIGS]
+    logger = Logger(tmp_path, "reference")
+    with logger:
+        for _ in range(3):
+            play_game(env, *players, logger)
+    _, reference_actions = read_actions(tmp_path / "reference.h5")
+    assert all(np.array_equal(a, b) for a, b in zip(actions, reference_actions))
+
+    # Worker chunks are seeded from the agent configs
+    _, actions = generate(tmp_path, "parallel", n=10, workers=2, seed=None)
+    _, repeated_actions = generate(tmp_path, "parallel_again", n=10, workers=2, seed=None)
+    assert all(np.array_equal(a, b) for a, b in zip(actions, repeated_actions))
+    reseeded = [{"name": "RandomAgent", "kwargs": {"random_seed": 1}}, PLAYER_CONFIGS[1]]
+    _, other_actions = generate(tmp_path, "reseeded", n=10, workers=2, seed=None, player_configs=reseeded)
+    assert not all(np.array_equal(a, b) for a, b in zip(actions, other_actions))
@@ -0,0 +1,249 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+import h5py
+import pytest
+import numpy as np
+from src.agents import AlphaBetaMinimaxAgent, RandomAgent
+from src.agents.base import MOVE_STATS
+from src.analyzer import BaseAnalyzer
+from src.enums.game import RoleEnum
+from src.environments import ThreeDims, TwoDims
+from src.logging.logger import Logger
+from src.logging.reader import get_layout, get_telemetry_fields, num_episodes, read_episode
+
+
+def play_random_episodes(num_episodes, seed=0):
+    '''
+    Episodes of random play on ThreeDims, truncated at random lengths,
+    in the format of Logger.log_episode.
+    '''
+    rng = np.random.default_rng(seed)
+    env = ThreeDims()
+    episodes = []
+    for _ in range(num_episodes):
+        env.reset()
+        steps = []
+        for _ in range(rng.integers(1, 28)):
+            player = env.get_current_player()
+            actions = np.argwhere(env.get_action_mask(env.get_board_state()))
+            action = actions[rng.integers(len(actions))]
+            observation, reward, _, _, _ = env.step(action)
+            steps.append((env.get_board_state().copy(), player, observation["board"].copy(), action, reward))
+        episodes.append(tuple(np.array(column) for column in zip(*steps)))
+    return episodes
+
+
+def write_episodic_file(path, episodes):
+    '''
+    Experiment file in the layout used before the columnar Logger.
+    '''
+    with h5py.File(path, 'w') as f:
+        f.create_group('configs')
+        f.create_group('episodes')
+        f.attrs['experiment_name'] = 'episodic'
+        f.attrs['player_ids'] = [RoleEnum.X.value, RoleEnum.O.value]
+        for i, (states, players, observations, actions, rewards) in enumerate(episodes):
+            group = f['episodes'].create_group(f'episode_{i}')
+            for name, data in zip(['states', 'players', 'observations', 'actions', 'rewards'],
+                                  [states, players, observations, actions, rewards]):
+                group.create_dataset(name, data=data)
+            group.attrs['num_steps'] = len(states)
+            group.attrs['episode_id'] = i
+
+
+def test_columnar_round_trip(tmp_path):
+    episodes = play_random_episodes(25)
+    with Logger(tmp_path, "columnar", buffer_size=40, chunk_size=16) as logger:
+        logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+        for episode in episodes:
+            logger.log_episode(*episode)
+
+    with h5py.File(tmp_path / "columnar.h5", 'r') as f:
+        assert get_layout(f) == 'columnar'
+        assert num_episodes(f) == len(episodes)
+        for i, episode in enumerate(episodes):
+            logged = read_episode(f, i)
+            for field, data in zip(['states', 'players', 'observations', 'actions', 'rewards'], episode):
+                assert logged[field].dtype == data.dtype
+                assert np.array_equal(logged[field], data)
+
+
+def test_analyzer_reads_both_layouts(tmp_path):
+    episodes = play_random_episodes(10, seed=1)
+    episodes = [episode for episode in episodes if len(episode[0]) >= 2] # both players must move
+    write_episodic_file(tmp_path / "episodic.h5", episodes)
+    with Logger(tmp_path, "columnar") as logger:
+        logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+        for episode in episodes:
+            logger.log_episode(*episode)
+
+    results = []
+    for name in ["episodic.h5", "columnar.h5"]:
+        with h5py.File(tmp_path / name, 'a') as f:
+            results.append(BaseAnalyzer().compute_mean_undiscounted_return_per_episode(f))
+    assert results[0] == results[1]
+
+
+def test_compact_profile_round_trip(tmp_path):
+    episodes = play_random_episodes(25, seed=2)
+    for name, compression, compression_opts in [("gzip", "gzip", 4), ("lzf", "lzf", None)]:
+        with Logger(tmp_path, name, storage_profile="compact", compression=compression,
+                    compression_opts=compression_opts, shuffle=True) as logger:
+            logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+            for episode in episodes:
+                logger.log_episode(*episode)
+
+        with h5py.File(tmp_path / f"{name}.h5", 'r') as f:
+            assert f['steps/states'].dtype == np.uint8
+            assert f['steps/actions'].dtype == np.int8
+            assert f['steps/rewards'].dtype == np.float32
+            assert f['steps/states'].compression == compression
+            for i, episode in enumerate(episodes):
+                logged = read_episode(f, i)
+                for field, data in zip(['states', 'players', 'observations', 'actions', 'rewards'], episode):
+                    assert np.array_equal(logged[field].astype(data.dtype), data)
+
+
+def test_compact_profile_rejects_inexact_values(tmp_path):
+    states, players, observations, actions, rewards = play_random_episodes(1, seed=3)[0]
+    logger = Logger(tmp_path, "inexact", storage_profile="compact")
+    logger.log_episode(states, players, observations, actions, rewards + 0.1)
+    with pytest.raises(ValueError):
+        logger.flush()
+    logger.file.close()
+
+
+def test_asynchronous_logging(tmp_path):
+    episodes = play_random_episodes(25, seed=4)
+    with Logger(tmp_path, "async", buffer_size=40, asynchronous=True, queue_size=4) as logger:
+        logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+        for episode in episodes:
+            for step in zip(*episode):
+                logger.log_step(*step)
+            logger.end_episode()
+        logger.flush()
+        assert num_episodes(logger.file) == len(episodes)
+
+    with h5py.File(tmp_path / "async.h5", 'r') as f:
+        assert num_episodes(f) == len(episodes)
+        for i, episode in enumerate(episodes):
+            logged = read_episode(f, i)
+            for field, data in zip(['states', 'players', 'observations', 'actions', 'rewards'], episode):
+                assert np.array_equal(logged[field], data)
+
+
+def test_asynchronous_logging_raises_writer_errors(tmp_path):
+    states, players, observations, actions, rewards = play_random_episodes(1, seed=5)[0]
+    logger = Logger(tmp_path, "async_error", storage_profile="compact", asynchronous=True)
+    logger.log_episode(states, players, observations, actions, rewards + 0.1)
+    with pytest.raises(ValueError):
+        logger.close()
+    assert not logger.file.id.valid
+
+
+def test_logging_after_close_raises(tmp_path):
+    episode = play_random_episodes(1, seed=7)[0]
+    for asynchronous in [False, True]:
+        logger = Logger(tmp_path, f"closed_{asynchronous}", asynchronous=asynchronous)
+        logger.log_episode(*episode)
+        logger.close()
+        # Instead of waiting forever on the stopped writer thread
+        with pytest.raises(Exception, match="closed"):
+            logger.flush()
+        with pytest.raises(Exception, match="closed"):
+            logger.log_episode(*episode)
+        logger.close()
+        with h5py.File(tmp_path / f"closed_{asynchronous}.h5", 'r') as f:
+            assert num_episodes(f) == 1
+
+
+def test_vectorized_analyzer_matches_loop(tmp_path):
+    episodes = play_random_episodes(60, seed=6)
+    episodes = [episode for episode in episodes if len(episode[0]) >= 2] # both players must move
+    write_episodic_file(tmp_path / "episodic.h5", episodes)
+    with Logger(tmp_path, "columnar", storage_profile="compact") as logger:
+        logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+        for episode in episodes:
+            logger.log_episode(*episode)
+
+    for name in ["episodic.h5", "columnar.h5"]:
+        with h5py.File(tmp_path / name, 'a') as f:
+            expected = BaseAnalyzer(overwrite=True, engine="loop").compute_mean_undiscounted_return_per_episode(f)
+            for chunk_size in [1, 50, 1 << 20]:
+                analyzer = BaseAnalyzer(overwrite=True, chunk_size=chunk_size)
+                assert analyzer.compute_mean_undiscounted_return_per_episode(f) == expected
+
+
+def test_incremental_analysis_matches_full_analysis(tmp_path):
+    episodes = play_random_episodes(60, seed=7)
+    episodes = [episode for episode in episodes if len(episode[0]) >= 2] # both players must move
+    analyses = ["compute_mean_undiscounted_return_per_episode", "compute_outcome_rates",
+                "compute_final_score_distribution", "compute_first_player_advantage"]
+
+    logger = Logger(tmp_path, "growing")
+    logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+    for end in [10, 11, 35, len(episodes)]:
+        for episode in episodes[logger.episode_count:end]:
+            logger.log_episode(*episode)
+        logger.flush()
+        for analysis in analyses:
+            getattr(BaseAnalyzer(), analysis)(logger.file)
+        assert logger.file['analysis/outcome_counts'].attrs['episodes_covered'] == end
+    logger.close()
+
+    with Logger(tmp_path, "complete") as logger:
+        logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+        for episode in episodes:
+            logger.log_episode(*episode)
+
+    with h5py.File(tmp_path / "growing.h5", 'a') as growing, h5py.File(tmp_path / "complete.h5", 'a') as complete:
+        for analysis in analyses:
+            for engine in ["loop", "vectorized"]:
+                expected = getattr(BaseAnalyzer(overwrite=True, engine=engine), analysis)(complete)
+                assert getattr(BaseAnalyzer(), analysis)(growing) == expected
+
+        outcomes = BaseAnalyzer().compute_outcome_rates(growing)
+        returns = BaseAnalyzer().compute_undiscounted_return_per_episode(growing)
+        assert returns.shape == (2, len(episodes))
+        assert outcomes[RoleEnum.X.value]["win"] == np.mean(returns[0] > returns[1])
+        assert outcomes[RoleEnum.O.value]["draw"] == np.mean(returns[0] == returns[1])
+
+
+def test_move_telemetry(tmp_path):
+    env = TwoDims()
+    players = [AlphaBetaMinimaxAgent(search_depth=2), RandomAgent()]
+    with Logger(tmp_path, "telemetry") as logger:
+        logger.log_player_ids([RoleEnum.X.value, RoleEnum.O.value])
+        for _ in range(3):
+            observation, _ = env.reset()
+            done, stats = False, []
+            while not done:
+                player = env.get_current_player()
+                action = players[player].choose_action(env, [observation])
+                observation, reward, done, _, _ = env.step(action)
+                stats.append(players[player].get_move_stats())
+                logger.log_step(env.get_board_state(), player, observation["board"], action, reward,
+                                telemetry=stats[-1])
+            logger.end_episode()
+
+    assert all(stat["wall_time"] > 0 for stat in stats)
+    assert stats[0]["nodes_searched"] > 0 and stats[0]["max_depth"] == 2 and stats[0]["cutoffs"] > 0
+    assert stats[1]["nodes_searched"] == 0
+
+    with h5py.File(tmp_path / "telemetry.h5", 'a') as f:
+        assert len(get_telemetry_fields(f)) == len(MOVE_STATS)
+        last = read_episode(f, 2, get_telemetry_fields(f))
+        assert list(last["telemetry/nodes_searched"]) == [stat["nodes_searched"] for stat in stats]
+
+        summary = BaseAnalyzer().compute_move_telemetry_summary(f)
+        assert summary[RoleEnum.X.value]["nodes_searched"]["max"] >= stats[0]["nodes_searched"]
+        assert summary[RoleEnum.O.value]["nodes_searched"]["max"] == 0
+
+        slowest = BaseAnalyzer(chunk_size=4).get_slowest_moves(f, count=3, stat="nodes_searched")
+        assert [move["nodes_searched"] for move in slowest] == sorted(f['steps/telemetry/nodes_searched'][:])[::-1][:3]
+        assert slowest[0]["step"] == 0 # the first move has the most to search
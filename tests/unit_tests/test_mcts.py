@@ -0,0 +1,91 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+import numpy as np
+from src.agents import MCTSAgent
+from src.agents.mcts import SearchTree
+from src.config.factory import build_agent
+from src.enums.game import BoardEnum, RoleEnum
+from src.environments import TwoDims, ThreeDims
+
+
+def test_search_tree_compaction_keeps_the_subtree():
+    tree = SearchTree(max_nodes=16)
+    tree.expand(0, np.array([0, 1, 2]))   # nodes 1, 2, 3
+    tree.expand(2, np.array([0, 2]))      # nodes 4, 5
+    tree.expand(1, np.array([1, 2]))      # nodes 6, 7
+    tree.expand(4, np.array([2]))         # node 8
+    tree.visits[:9] = np.arange(9) * 10
+    tree.value_sum[:9] = np.arange(9)
+
+    tree.compact(2)
+    assert len(tree) == 4
+    assert list(tree.cell[:4]) == [-1, 0, 2, 2]
+    assert list(tree.visits[:4]) == [20, 40, 50, 80]
+    assert list(tree.value_sum[:4]) == [2, 4, 5, 8]
+    assert tree.first_child[0] == 1 and tree.num_children[0] == 2
+    assert tree.first_child[1] == 3 and tree.num_children[1] == 1
+    assert tree.first_child[2] == -1 and tree.first_child[3] == -1
+
+    # There is no room for more children than max_nodes
+    assert not tree.expand(3, np.arange(13))
+    assert tree.expand(3, np.arange(12))
+
+
+def test_mcts_finds_the_only_scoring_move():
+    env = TwoDims()
+    X, O = RoleEnum.X.value, RoleEnum.O.value
+    board = BoardEnum.EMPTY.value * np.ones((3, 3))
+    board[0, 0] = board[0, 1] = X
+    board[1, 0] = board[2, 2] = O
+    observation = {"board": board, "current_player": X, "next_player": O,
+                   "action_mask": env.get_action_mask(board)}
+    agent = MCTSAgent(num_simulations=300)
+    assert tuple(agent.choose_action(env, [observation])) == (0, 2)
+    assert agent.get_move_stats()["nodes_searched"] == 300
+
+
+
+def test_mcts_plays_randomly_when_the_root_does_not_fit():
+    env = ThreeDims()
+    observation, _ = env.reset()
+    agent = MCTSAgent(num_simulations=10, max_nodes=20) # fewer nodes than the 27 moves
+    for _ in range(3):
+        action = agent.choose_action(env, [observation])
+        assert observation["action_mask"][tuple(action)]
+
+
+def test_mcts_reuses_the_subtree_of_the_moves_played():
+    env = ThreeDims()
+    reusing = MCTSAgent(num_simulations=200)
+    fresh = MCTSAgent(num_simulations=200, reuse_tree=False)
+    observation, _ = env.reset()
+    action = reusing.choose_action(env, [observation])
+    fresh.choose_action(env, [observation])
+    assert reusing.get_move_stats()["cache_hits"] == 0
+
+    # The opponent plays the move the agent explored most
+    tree = reusing.tree
+    child = tree.find_child(0, np.ravel_multi_index(tuple(action), (3, 3, 3)))
+    replies = slice(tree.first_child[child], tree.first_child[child] + tree.num_children[child])
+    reply = tree.first_child[child] + np.argmax(tree.visits[replies])
+    expected_visits = tree.visits[reply]
+    observation, _, _, _, _ = env.step(action)
+    observation, _, _, _, _ = env.step(np.array(np.unravel_index(tree.cell[reply], (3, 3, 3))))
+
+    reusing.choose_action(env, [observation])
+    fresh.choose_action(env, [observation])
+    assert reusing.get_move_stats()["cache_hits"] > 0
+    assert fresh.get_move_stats()["cache_hits"] == 0
+    # The root keeps its visits and gains those of the new simulations
+    assert reusing.tree.visits[0] == expected_visits + 200 * reusing.rollout_batch
+
+
+def test_mcts_agent_from_config():
+    agent = build_agent(project_root / "configs" / "agents" / "mcts.yml")
+    assert isinstance(agent, MCTSAgent)
+    assert agent.num_simulations == 1000
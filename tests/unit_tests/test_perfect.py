@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+import numpy as np
+from src.agents import MinimaxAgent, PerfectAgent
+from src.agents.solver import NUM_BOARDS, UNREACHABLE, board_index, load_table, save_table, solve
+from src.enums.game import BoardEnum, RoleEnum
+from src.environments import TwoDims
+
+
+def random_position(env, rng, num_moves):
+    observation, _ = env.reset()
+    for action in np.argwhere(observation["action_mask"])[rng.permutation(9)[:num_moves]]:
+        observation, _, _, _, _ = env.step(action)
+    return observation
+
+
+def test_perfect_agent_matches_full_depth_minimax():
+    env = TwoDims()
+    rng = np.random.default_rng(0)
+    perfect = PerfectAgent()
+    minimax = MinimaxAgent(search_depth=9)
+    for _ in range(30):
+        observation = random_position(env, rng, rng.integers(3, 9))
+        assert np.all(perfect.choose_action(env, [observation]) == minimax.choose_action(env, [observation]))
+
+
+def test_self_play_reaches_the_table_value(tmp_path):
+    save_table(solve(), tmp_path / "two_dims.npy")
+    table = load_table(tmp_path / "two_dims.npy")
+    assert isinstance(table, np.memmap) and table.shape == (2, NUM_BOARDS)
+    assert board_index(TwoDims().get_board_state()) == 0 and table[0, 0] != UNREACHABLE
+
+    env = TwoDims()
+    agent = PerfectAgent(table_path=tmp_path / "two_dims.npy")
+    observation, _ = env.reset()
+    done = False
+    while not done:
+        observation, _, done, _, _ = env.step(agent.choose_action(env, [observation]))
+    board = env.get_board_state()
+    assert env.get_score(board, RoleEnum.X.value) - env.get_score(board, RoleEnum.O.value) == agent.get_value(np.full((3, 3), BoardEnum.EMPTY.value))
@@ -0,0 +1,87 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+import multiprocessing
+import numpy as np
+import pytest
+from src.tournament import ResultsStore, compute_ratings, fit_bradley_terry, run_tournament, \
+    schedule_matches, to_elo, tournament_ratings
+
+GAME_CONFIG = {"name": "4CE-TwoDims", "max_timesteps": 9, "kwargs": {}}
+AGENT_CONFIGS = {
+    "random": {"name": "RandomAgent", "kwargs": {"random_seed": 0}},
+    "minimax": {"name": "MinimaxAgent", "kwargs": {"search_depth": 2}},
+    "alphabeta": {"name": "AlphaBetaMinimaxAgent", "kwargs": {"search_depth": 3}}
+}
+
+
+def test_bradley_terry_fit():
+    # 3 wins to 1: odds of 3, i.e. 400 * log10(3) Elo points apart
+    strengths = fit_bradley_terry(np.array([[0, 3], [1, 0]]), prior=0)
+    assert strengths[0] / strengths[1] == pytest.approx(3)
+    assert np.diff(to_elo(strengths))[0] == pytest.approx(-400 * np.log10(3))
+
+    # Consistent with a known ordering, mean rating 1500
+    true_strengths = np.array([4, 2, 1])
+    games = 1000 * np.ones((3, 3)) - 1000 * np.eye(3)
+    wins = games * true_strengths[:, None] / (true_strengths[:, None] + true_strengths[None, :])
+    strengths = fit_bradley_terry(wins, prior=0)
+    assert strengths / strengths[2] == pytest.approx(true_strengths)
+    assert to_elo(strengths).mean() == pytest.approx(1500)
+
+    # The prior keeps an unbeaten agent finite
+    assert np.all(np.isfinite(to_elo(fit_bradley_terry(np.array([[0, 5], [0, 0]])))))
+
+
+def test_ratings_confidence_intervals():
+    # Matches of (first, second) with the first agent's wins, draws and losses
+    ratings = compute_ratings(["a", "b", "c"], [0, 1, 0], [1, 2, 2], [[30, 10, 10], [25, 5, 20], [40, 5, 5]])
+    assert [rating["agent"] for rating in ratings] == ["a", "b", "c"]
+    for rating in ratings:
+        assert rating["ci_low"] <= rating["elo"] <= rating["ci_high"]
+        assert rating["games"] == 100
+    assert ratings[0]["score"] == pytest.approx((30 + 5 + 40 + 2.5) / 100)
+
+
+def test_schedule_covers_both_colours():
+    matches = schedule_matches(AGENT_CONFIGS, GAME_CONFIG, games_per_pairing=2)
+    assert sorted((match["player0"], match["player1"]) for match in matches) == \
+        sorted((a, b) for a in AGENT_CONFIGS for b in AGENT_CONFIGS if a != b)
+    assert len({match["match"] for match in matches}) == 6
+
+
+def test_tournament_plays_only_new_matches(tmp_path):
+    results = tmp_path / "results.jsonl"
+    agents = {name: AGENT_CONFIGS[name] for name in ["random", "minimax"]}
+    assert run_tournament(agents, GAME_CONFIG, results, games_per_pairing=2) == 2
+    first_run = ResultsStore(results).load()
+    assert len(first_run) == 4
+    assert run_tournament(agents, GAME_CONFIG, results, games_per_pairing=2) == 0
+
+    # The new agent only plays its own matches, the others are read from the store
+    assert run_tournament(AGENT_CONFIGS, GAME_CONFIG, results, games_per_pairing=2, workers=2) == 4
+    records = ResultsStore(results).load()
+    assert len(records) == 12
+    assert records[:4] == first_run
+    assert all("alphabeta" in (record["player0"], record["player1"]) for record in records[4:])
+
+    # Matches are seeded from their configs, whatever the other agents or the scheduling
+    run_tournament(AGENT_CONFIGS, GAME_CONFIG, tmp_path / "fresh.jsonl", games_per_pairing=2)
+    key = lambda record: (record["match"], record["game"])
+    assert sorted(ResultsStore(tmp_path / "fresh.jsonl").load(), key=key) == sorted(records, key=key)
+
+    ratings = tournament_ratings(AGENT_CONFIGS, GAME_CONFIG, results, games_per_pairing=2, num_bootstrap=20)
+    assert {rating["agent"] for rating in ratings} == set(AGENT_CONFIGS)
+    assert all(rating["games"] == 8 for rating in ratings)
+
+
+def test_matches_close_their_agents(tmp_path):
+    # Agents searching in parallel must not leave a process pool behind per match
+    agents = {"random": AGENT_CONFIGS["random"],
+              "parallel": {"name": "MinimaxAgent", "kwargs": {"search_depth": 1, "workers": 2}}}
+    assert run_tournament(agents, GAME_CONFIG, tmp_path / "results.jsonl", games_per_pairing=1) == 2
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+
+import numpy as np
+from src.agents import MinimaxAgent, AlphaBetaMinimaxAgent
+from src.agents.transposition import TranspositionTable, EXACT, LOWER
+from src.environments import TwoDims, ThreeDims
+from src.enums.game import BoardEnum
+
+
+def random_position(env, num_marks, rng):
+    '''
+    Legal position with `num_marks` marks, X to move when num_marks is even.
+    '''
+    position = BoardEnum.EMPTY.value * np.ones(env.dimensions * [env.size])
+    cells = rng.permutation(position.size)[:num_marks]
+    position.ravel()[cells] = np.arange(num_marks) % 2
+    return position
+
+
+def observation_from_position(env, position, num_marks):
+    current_player = num_marks % 2
+    return {
+        "current_player": current_player,
+        "next_player": 1 - current_player,
+        "board": position,
+        "action_mask": env.get_action_mask(position)
+    }
+
+
+def test_table_eviction_policies():
+    table = TranspositionTable(size=4, policy="depth")
+    table.store(1, 1.0, EXACT, remaining_depth=3)
+    table.store(5, 2.0, LOWER, remaining_depth=1) # same slot, shallower
+    assert table.probe(1) == (1.0, EXACT)
+    assert table.probe(5) is None
+
+    table = TranspositionTable(size=4, policy="always")
+    table.store(1, 1.0, EXACT, remaining_depth=3)
+    table.store(5, 2.0, LOWER, remaining_depth=1)
+    assert table.probe(1) is None
+    assert table.probe(5) == (2.0, LOWER)
+
+
+def test_transposition_table_preserves_actions():
+    rng = np.random.default_rng(0)
+    for env, depth, num_marks in [(TwoDims(), 5, 2), (ThreeDims(), 4, 16)]:
+        for agent_class in [MinimaxAgent, AlphaBetaMinimaxAgent]:
+            plain = agent_class(search_depth=depth)
+            cached = agent_class(search_depth=depth, tt_size=2**16)
+            nodes_plain, nodes_cached = 0, 0
+            for _ in range(3):
+                position = random_position(env, num_marks, rng)
+                history = [observation_from_position(env, position, num_marks)]
+                assert np.all(plain.choose_action(env, history) == cached.choose_action(env, history))
+                nodes_plain += plain.nodes_searched
+                nodes_cached += cached.nodes_searched
+            assert nodes_cached < nodes_plain
+            assert cached.cache_hits > 0
+
+
+def test_symmetric_keys_share_entries():
+    env = TwoDims()
+    position = BoardEnum.EMPTY.value * np.ones(env.dimensions * [env.size])
+    history = [observation_from_position(env, position, 0)]
+    cached = AlphaBetaMinimaxAgent(search_depth=5, tt_size=2**16)
+    symmetric = AlphaBetaMinimaxAgent(search_depth=5, tt_size=2**16, tt_symmetry=True)
+    assert np.all(cached.choose_action(env, history) == symmetric.choose_action(env, history))
+    assert symmetric.nodes_searched < cached.nodes_searched